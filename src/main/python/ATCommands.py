@@ -1,3 +1,10 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from functools import partial
+
 AT_PING_REQ = "AT+PNG?"
 AT_PING_RES = "+PNG:"  # +PNG: <motherboard-id>
 
@@ -21,181 +28,732 @@ AT_ACC_RES = "+ACC:"  # +ACC: <0|1>
 
 AT_CLOSE = "AT+CLS"
 
+# Settings of every sensor at once, not supported by every firmware (ERROR <code>), see load_all
+AT_DUMP_REQ = "AT+DMP?"
+AT_DUMP_RES = "+DMP:"  # +DMP: <sensor-id> <poll-interval> {<enabled>,<low>,<high> per metric}[; <sensor-id> ...]
+
+AT_OK = "OK"  # acknowledgement of a command, ERROR <code> otherwise
+AT_ERROR = "ERROR"
+
+# Response line of the commands that do not answer with OK
+RESPONSES = {
+    AT_PING_REQ: AT_PING_RES,
+    AT_LIST_REQ: AT_LIST_RES,
+    AT_POLL_REQ: AT_POLL_RES,
+    AT_TH_REQ: AT_TH_RES,
+    AT_ACC_REQ: AT_ACC_RES,
+    AT_ACC_CMD: AT_ACC_RES,
+    AT_DUMP_REQ: AT_DUMP_RES,
+}
+
+# Kinds of lines sent by the motherboard
+LINE_RESPONSE = 0  # +<command>: <values>
+LINE_OK = 1  # OK
+LINE_ERROR = 2  # ERROR <code>
+LINE_UNSOLICITED = 3  # anything else, e.g. debug output of the firmware
+
+
+def classify(line) -> int:
+    if line == AT_OK:
+        return LINE_OK
+    if line == AT_ERROR or line.startswith(AT_ERROR + " "):
+        return LINE_ERROR
+    if line.startswith("+") and ":" in line:
+        return LINE_RESPONSE
+    return LINE_UNSOLICITED
+
+
+def error_code(line):
+    """Code of an ERROR <code> line, None for other lines"""
+    if classify(line) != LINE_ERROR:
+        return None
+    _code = line[len(AT_ERROR):].strip()
+    return int(_code) if _code.isdigit() else 0
+
+
+def answers(_cmd, line) -> bool:
+    """True if line can be the response to the command: ERROR or the response line the command expects"""
+    _kind = classify(line)
+    _expected = RESPONSES.get(command_type(_cmd), AT_OK)
+    if _kind == LINE_ERROR:
+        return True
+    if _expected == AT_OK:
+        return _kind == LINE_OK
+    return _kind == LINE_RESPONSE and line.startswith(_expected)
+
+
+def is_response(_str, _res) -> bool:
+    return _str is not None and _str.startswith(_res)
+
+
+def response_value(_str, _res):
+    """Values of the response line _str (+<command>: <values>) when it starts with _res, None otherwise"""
+    if not is_response(_str, _res):
+        return None
+    return _str[len(_res):].strip()
+
+
+# Longest line kept without line ending, longer output is passed on as it is [bytes]
+MAX_LINE = 1024
+
+
+class LineFramer:
+    """Cut the bytes read from the motherboard into lines, whatever the chunks they arrive in"""
 
-def remove_cmd_str(_str, _cmd) -> str:
-    return _str.replace(_cmd, "")
+    def __init__(self):
+        self.__buffer = b""
 
+    def feed(self, data) -> list:
+        """Add the bytes read, return the lines completed by them, stripped, without empty lines"""
+        self.__buffer += data
+        if b"\n" not in data and len(self.__buffer) <= MAX_LINE:
+            return []
+        *_lines, self.__buffer = self.__buffer.split(b"\n")
+        if len(self.__buffer) > MAX_LINE:
+            _lines.append(self.__buffer)
+            self.__buffer = b""
+        return [_line for _line in (_raw.decode('utf-8', errors='replace').strip() for _raw in _lines) if _line]
 
-def clean_response(_str) -> str:
-    return _str.strip()
+
+class LineReader:
+    """Lines of a serial port, read in chunks of what the port has received"""
+
+    def __init__(self, _ser):
+        self._ser = _ser
+        self._framer = LineFramer()
+        self._lines = deque()
+
+    def readline(self):
+        _deadline = None if self._ser.timeout is None else time.monotonic() + self._ser.timeout
+        while not self._lines:
+            # blocks for the first byte (at most the timeout of the port), then takes everything received
+            _data = self._ser.read(max(1, self._ser.in_waiting))
+            self._lines.extend(self._framer.feed(_data))
+            if not _data or (_deadline is not None and time.monotonic() >= _deadline):
+                break
+        return self._lines.popleft() if self._lines else None
+
+
+_readers = weakref.WeakKeyDictionary()
+_readers_lock = threading.Lock()  # the ports may be used from several threads (see Fleet)
 
 
 def readline(_ser):
-    _res = None
-    _msg = _ser.readline()
+    """Next line of the port, None when no complete line arrives within the timeout of the port"""
+    with _readers_lock:
+        _reader = _readers.get(_ser)
+        if _reader is None:
+            _reader = _readers[_ser] = LineReader(_ser)
+    return _reader.readline()
 
-    if _msg != b'':
-        _res = _msg.decode().strip()
 
-    return _res
+# Maximum number of commands that are written ahead of their responses
+PIPELINE_DEPTH = 16
 
+# Time to wait for a response to a command whose latency is not known yet [s]
+LONG_TIMEOUT = 5
+# Shortest time to wait for a response [s]
+MIN_TIMEOUT = 0.05
 
-def close(_ser, _debug):
-    _err = True
 
-    _cmd = (AT_CLOSE + "\r\n").encode('utf-8')
-    _debug.write("COM", F"TX: {_cmd}")
-    _ser.write(_cmd)
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
+def command_type(_cmd) -> str:
+    """Command without its parameters: AT+TH? 01 02 -> AT+TH?, AT+POL=01 01 60 -> AT+POL="""
+    for _idx, _char in enumerate(_cmd):
+        if _char in "?=":
+            return _cmd[:_idx + 1]
+    return _cmd
 
 
-def upload_sensor(sensor, _ser, _debug):
-    _err = True
+class TimeoutPolicy:
+    """Time to wait for the response to a command, learned from the latencies of the motherboard.
 
-    _cmd = (AT_POLL_CMD + sensor.get_addr() + " 01 " +
-            str(sensor.get_polling_interval_sec()) + "\r\n").encode('utf-8')
-    _debug.write("COM", F"TX: {_cmd}")
-    _ser.write(_cmd)
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
+    The latency of a command is the time between the moment the motherboard can start on it (the command is sent
+    and the previous response is received) and its response. The deadline of a command type is `margin` times
+    the `percentile` of its last `window` latencies, at least MIN_TIMEOUT. A command type gets LONG_TIMEOUT
+    until it has `min_samples` latencies of its own: the latencies of other commands say nothing about it (a
+    flash write takes far longer than a read). A missed response is retried `retries` times, each time with
+    twice the deadline, never more than LONG_TIMEOUT. Commands without learned deadline are not retried, they
+    have had LONG_TIMEOUT already (see learned).
+    """
 
-    # TODO de rest ook nog eh!
+    def __init__(self, percentile=0.95, margin=3.0, window=32, min_samples=5, retries=2):
+        self.percentile = percentile
+        self.margin = margin
+        self.window = window
+        self.min_samples = min_samples
+        self.retries = retries
+        self.__latencies = {}
 
-    for metric_idx in range(sensor._num_metrics):
-        AT_TH_E_CMD = "AT+TE="  # <sensor-address> <metric> <thresholds-enabled>
-        AT_TH_L_CMD = "AT+TLL="  # <sensor-address> <metric> <threshold-level-low>
-        AT_TH_H_CMD = "AT+TLH="  # <sensor-address> <metric> <threshold-level-high>
+    def record(self, _cmd, latency):
+        _type = command_type(_cmd)
+        if _type not in self.__latencies:
+            self.__latencies[_type] = deque(maxlen=self.window)
+        self.__latencies[_type].append(latency)
 
-        enabled = "1" if sensor._thresholds_enabled[metric_idx] else "0"
+    def learned(self, _cmd) -> bool:
+        """True once the command type has min_samples latencies of its own"""
+        return len(self.__latencies.get(command_type(_cmd), ())) >= self.min_samples
 
-        _cmd = (AT_TH_E_CMD + sensor.get_addr() + " " +
-                metric_str_arr[metric_idx] + " " + enabled + "\r\n").encode('utf-8')
+    def deadline(self, _cmd, attempt=0) -> float:
+        if not self.learned(_cmd):
+            return LONG_TIMEOUT
+        _latencies = self.__latencies[command_type(_cmd)]
 
-        _ser.write(_cmd)
-        _debug.write("COM", F"TX: {_cmd}")
-        response = readline(_ser)
-        _debug.write("COM", F"RX: {response}")
+        _sorted = sorted(_latencies)
+        _deadline = max(_sorted[int(self.percentile * (len(_sorted) - 1))] * self.margin, MIN_TIMEOUT)
+        return min(_deadline * 2 ** attempt, LONG_TIMEOUT)
 
-        _cmd = (AT_TH_L_CMD + sensor.get_addr() + " " +
-                metric_str_arr[metric_idx] + " " + str(sensor._thresholds_low[metric_idx]) + "\r\n").encode('utf-8')
 
-        _ser.write(_cmd)
-        _debug.write("COM", F"TX: {_cmd}")
-        response = readline(_ser)
-        _debug.write("COM", F"RX: {response}")
+# Latencies of the motherboard(s), shared by the sessions that pass no policy of their own (Fleet has one per board)
+timeouts = TimeoutPolicy()
+
+
+class PipelineStats:
+    """Round trips of the pipelines and the time they spent waiting for responses that never came (see Benchmark).
+
+    A round trip ends when no command is outstanding anymore: the pipeline window drained, or the commands in
+    flight were given up after a missed or out of order response. Refilling the window is no new round trip.
+    """
+
+    def __init__(self):
+        self.reset()
 
-        _cmd = (AT_TH_H_CMD + sensor.get_addr() + " " +
-                metric_str_arr[metric_idx] + " " + str(sensor._thresholds_high[metric_idx]) + "\r\n").encode('utf-8')
+    def reset(self):
+        self.round_trips = 0
+        self.timeouts = 0
+        self.timeout_time = 0.0
 
-        _ser.write(_cmd)
-        _debug.write("COM", F"TX: {_cmd}")
+    def missed(self, waited):
+        self.timeouts += 1
+        self.timeout_time += waited
+        self.round_trips += 1
+
+
+# Round trips of all sessions
+stats = PipelineStats()
+
+
+def write_cmd(_ser, _debug, _cmd):
+    _raw = (_cmd + "\r\n").encode('utf-8')
+    _debug.write("COM", F"TX: {_raw}")
+    _ser.write(_raw)
+
+
+def read_response(_ser, _debug, timeout=None, _cmd=None):
+    """Read the line answering _cmd (any response, OK or ERROR when None), None when it does not come.
+
+    Waits at most timeout [s] instead of the timeout of the port when given: the port is then polled every
+    MIN_TIMEOUT, so its timeout is only set once (pyserial reconfigures the port every time it is set).
+    Unsolicited lines and responses that do not fit the command (late answers to earlier commands) are skipped.
+    """
+    _deadline = None if timeout is None else time.monotonic() + timeout
+    if _deadline is not None and _ser.timeout != MIN_TIMEOUT:
+        _ser.timeout = MIN_TIMEOUT
+    while True:
         response = readline(_ser)
-        _debug.write("COM", F"RX: {response}")
+        if response is None:
+            if _deadline is not None and time.monotonic() < _deadline:
+                continue
+            break
+        if classify(response) == LINE_UNSOLICITED:
+            _debug.write("COM", F"RX (unsolicited): {response}")
+        elif _cmd is not None and not answers(_cmd, response):
+            _debug.write("COM", F"RX (stale): {response}")
+        else:
+            break
+        if _deadline is not None and time.monotonic() >= _deadline:
+            response = None
+            break
+    _debug.write("COM", F"RX: {response}")
+    return response
+
+
+def drain(_ser, _debug, quiet):
+    """Discard the lines that arrive until there is none for quiet [s], e.g. late responses after a timeout"""
+    _ser.timeout = max(quiet, MIN_TIMEOUT)
+    while readline(_ser) is not None:
+        pass
+    _debug.write("COM", "RX: input discarded")
+
+
+def doubtful(_cmds, _sent, _read, _responses) -> list:
+    """Indices of the commands of _read whose response may belong to a later command of _sent.
+
+    The responses carry no address, so after a lost line every command read takes the line of a later command
+    as long as that line answers it as well. The commands read after a lost line are the last ones read, so going
+    back from the last one read, the responses are in doubt as long as they answer a command sent after theirs;
+    the ones before are certain.
+    """
+    _doubtful = []
+    for _pos in range(len(_read) - 1, -1, -1):
+        if not any(answers(_cmds[_i], _responses[_read[_pos]]) for _i in _sent[_pos + 1:]):
+            break
+        _doubtful.insert(0, _read[_pos])
+    return _doubtful
+
+
+def pipeline_pass(_ser, _debug, _cmds, _indices, _responses, depth, policy, attempt) -> list:
+    """Send the commands _indices of _cmds, store their responses, return the indices left without response.
+
+    Reading stops at the first missed response or the first line that does not answer its command: the lines
+    after it can no longer be matched to their commands. The responses that may have shifted onto an earlier
+    command (see doubtful) are dropped and their commands are left without response as well.
+    """
+    _in_flight = deque()
+    _read = []
+    _next = 0
+    _last = time.monotonic()
+
+    while _next < len(_indices) or _in_flight:
+        if _next < len(_indices) and len(_in_flight) < depth:
+            write_cmd(_ser, _debug, _cmds[_indices[_next]])
+            _in_flight.append((_indices[_next], time.monotonic()))
+            _next += 1
+            continue
+
+        _idx, _sent = _in_flight.popleft()
+        _start = max(_sent, _last)
+        _wait = time.monotonic()
+        response = read_response(_ser, _debug, _start + policy.deadline(_cmds[_idx], attempt) - _wait)
+        if response is None or not answers(_cmds[_idx], response):
+            if response is None:
+                stats.missed(time.monotonic() - _wait)
+            else:
+                _debug.write("COM", F"RX (out of order): {response}")
+                stats.round_trips += 1
+            _doubtful = doubtful(_cmds, _indices[:_next], _read, _responses)
+            for _i in _doubtful:
+                _responses[_i] = None
+            return _doubtful + [_idx] + [_i for _i, _ in _in_flight] + _indices[_next:]
+        _last = time.monotonic()
+        policy.record(_cmds[_idx], _last - _start)
+        _responses[_idx] = response
+        _read.append(_idx)
+        if not _in_flight:
+            stats.round_trips += 1
+
+    return []
+
+
+def pipeline(_ser, _debug, _cmds, depth=PIPELINE_DEPTH, policy=None, retries=None) -> list:
+    """Send the commands back to back and return their responses in order.
+
+    The motherboard answers every command with exactly one line, so the n-th line read belongs to the n-th
+    command still in flight. At most `depth` commands are outstanding at any time so the receive buffer of the
+    motherboard cannot overflow. Every response is awaited for the deadline of the TimeoutPolicy (by default the
+    shared `timeouts`); after a missed one the late lines are discarded and the commands left are sent again
+    (retries times, by default those of the policy), one at a time so a lost line cannot shift the responses.
+    Commands of a type without learned deadline are not sent again: the wait for them is LONG_TIMEOUT in total.
+    The response of a command that stays unanswered is None.
+    """
+    policy = timeouts if policy is None else policy
+    retries = policy.retries if retries is None else retries
+    _timeout = _ser.timeout
+    _responses = [None] * len(_cmds)
+    _pending = list(range(len(_cmds)))
+
+    try:
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                if not all(policy.learned(_cmds[_idx]) for _idx in _pending):
+                    break
+                drain(_ser, _debug, policy.deadline(_cmds[_pending[0]], attempt))
+            _pending = pipeline_pass(_ser, _debug, _cmds, _pending, _responses, depth if attempt == 0 else 1,
+                                     policy, attempt)
+            if not _pending:
+                break
+    finally:
+        _ser.timeout = _timeout
+
+    return _responses
+
+
+def transact(_ser, _debug, _cmd, policy=None):
+    return pipeline(_ser, _debug, [_cmd], policy=policy)[0]
+
+
+def close(_ser, _debug, policy=None):
+    transact(_ser, _debug, AT_CLOSE, policy)
+
+
+def poll_state(sensor) -> dict:
+    """Polling setting of the sensor as {command: value}, the upload command is command + value"""
+    return {AT_POLL_CMD + sensor.get_addr() + " 01 ": str(sensor.get_polling_interval_sec())}
+
+
+def metric_state(sensor, metric_idx) -> dict:
+    """Threshold settings of one metric as {command: value}"""
+    _metric = sensor.get_addr() + " " + metric_str_arr[metric_idx] + " "
+    return {
+        AT_TH_E_CMD + _metric: "1" if sensor._thresholds_enabled[metric_idx] else "0",
+        AT_TH_L_CMD + _metric: str(sensor._thresholds_low[metric_idx]),
+        AT_TH_H_CMD + _metric: str(sensor._thresholds_high[metric_idx]),
+    }
+
+
+def upload_state(sensor) -> dict:
+    _state = poll_state(sensor)
+    for metric_idx in range(sensor._num_metrics):
+        _state.update(metric_state(sensor, metric_idx))
+    return _state
+
+
+def upload_changes(sensor) -> list:
+    """(command, value) of the settings that differ from the state last loaded from or confirmed by the board"""
+    return [(_cmd, _value) for _cmd, _value in upload_state(sensor).items() if sensor._confirmed.get(_cmd) != _value]
+
+
+def upload_cmds(sensor) -> list:
+    return [_cmd + _value for _cmd, _value in upload_changes(sensor)]
+
 
+def confirm_upload(sensor, _changes, _responses) -> bool:
+    """Record the settings acknowledged with OK, return True if one of them was not"""
+    _err = False
+    for (_cmd, _value), response in zip(_changes, _responses):
+        if is_response(response, AT_OK):
+            sensor._confirmed[_cmd] = _value
+        else:
+            _err = True
+    return _err
+
+
+def upload_sensor(sensor, _ser, _debug, policy=None):
+    _changes = upload_changes(sensor)
+    return confirm_upload(sensor, _changes, pipeline(_ser, _debug, [_cmd + _value for _cmd, _value in _changes],
+                                                     policy=policy))
 
-def handle_ping(_ser, _debug) -> (bool, str):
+
+def parse_ping(response) -> (bool, str):
     _motherboard_id = None
     _err = True
 
-    _cmd = (AT_PING_REQ + "\r\n").encode('utf-8')
-    _debug.write("COM", F"TX: {_cmd}")
-    _ser.write(_cmd)
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
-    if AT_PING_RES in response:
-        _motherboard_id = clean_response(remove_cmd_str(response, AT_PING_RES))
+    if is_response(response, AT_PING_RES):
+        _motherboard_id = response_value(response, AT_PING_RES)
         _err = False
 
     return (_err, _motherboard_id)
 
 
-def set_accumulation(_ser, _debug, enable=False):
+def handle_ping(_ser, _debug, policy=None) -> (bool, str):
+    return parse_ping(transact(_ser, _debug, AT_PING_REQ, policy))
+
+
+def accumulation_cmd(enable=False) -> str:
     if enable is True:
-        _cmd = (AT_ACC_CMD + "1" + "\r\n").encode('utf-8')
-    else:
-        _cmd = (AT_ACC_CMD + "0" + "\r\n").encode('utf-8')
+        return AT_ACC_CMD + "1"
+    return AT_ACC_CMD + "0"
+
+
+def parse_accumulation(response):
     _err = True
     _acc = 0
-    _ser.write(_cmd)
-    _debug.write("COM", F"TX: {_cmd}")
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
-    if AT_ACC_RES in response:
+    if is_response(response, AT_ACC_RES):
         _err = False
-        _acc = clean_response(remove_cmd_str(response, AT_ACC_RES))
+        _acc = response_value(response, AT_ACC_RES)
 
     return (_err, _acc)
 
 
-def request_sensors(_ser, _debug):
+def set_accumulation(_ser, _debug, enable=False, policy=None):
+    return parse_accumulation(transact(_ser, _debug, accumulation_cmd(enable), policy))
+
+
+def parse_sensors(response):
     _sensors = []
     _err = True
-    _cmd = (AT_LIST_REQ + "\r\n").encode('utf-8')
-    _ser.write(_cmd)
-    _debug.write("COM", F"TX: {_cmd}")
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
-    if AT_LIST_RES in response:
-        _clean_res = clean_response(remove_cmd_str(response, AT_LIST_RES))
-        _raw_sensor_arr = _clean_res.split(" ")
-        _sensors = [Sensor(s) for s in _raw_sensor_arr]
+    if is_response(response, AT_LIST_RES):
+        _sensors = [Sensor(s) for s in response_value(response, AT_LIST_RES).split()]
         _err = False
     return (_err, _sensors)
 
 
+def request_sensors(_ser, _debug, policy=None):
+    return parse_sensors(transact(_ser, _debug, AT_LIST_REQ, policy))
+
+
 metric_str_arr = ["01", "02", "03", "04"]
 
 
-def request_acc(_ser, _debug):
+def parse_acc(response):
     _err = True
-    _cmd = (AT_ACC_REQ + "\r\n").encode('utf-8')
-    _ser.write(_cmd)
-    _debug.write("COM", F"TX: {_cmd}")
-    response = readline(_ser)
-    response2 = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
-    _debug.write("COM", F"RX: {response2}")
     _acc_enabled = 0
-    if AT_ACC_RES in response:
-        _clean_res = clean_response(remove_cmd_str(response, AT_ACC_RES))
-        _acc_enabled = int(_clean_res)
+    _value = response_value(response, AT_ACC_RES)
+    if _value is not None and _value.isdigit():
+        _acc_enabled = int(_value)
         _err = False
     return (_err, _acc_enabled)
 
 
-def load_data(sensor, _debug, _ser):
-    _err = True
+def request_acc(_ser, _debug, policy=None):
+    # the motherboard follows +ACC: with a status line, it is not worth more than the usual deadline
+    response = transact(_ser, _debug, AT_ACC_REQ, policy)
+    if response is not None:
+        _timeout = _ser.timeout
+        read_response(_ser, _debug, (timeouts if policy is None else policy).deadline(AT_ACC_REQ))
+        _ser.timeout = _timeout
+    return parse_acc(response)
 
-    _cmd = (AT_POLL_REQ + " " + sensor.get_addr() + " 01\r\n").encode('utf-8')
-    _ser.write(_cmd)
-    _debug.write("COM", F"TX: {_cmd}")
-    response = readline(_ser)
-    _debug.write("COM", F"RX: {response}")
-    if AT_POLL_RES in response:
-        _clean_res = clean_response(remove_cmd_str(response, AT_POLL_RES))
-        sensor._polling_enabled = int(_clean_res) > 0
-        sensor._polling_interval_sec = int(_clean_res)
-        _err = False
+
+def load_cmds(sensor) -> list:
+    _cmds = [AT_POLL_REQ + " " + sensor.get_addr() + " 01"]
 
     for metric_idx in range(sensor._num_metrics):
-        _cmd = (AT_TH_REQ + " " + sensor.get_addr() + " " +
-                metric_str_arr[metric_idx] + "\r\n").encode('utf-8')
-        _ser.write(_cmd)
-        _debug.write("COM", F"TX: {_cmd}")
-        response = readline(_ser)
-        _debug.write("COM", F"RX: {response}")
-        if AT_TH_RES in response:
-            _clean_res = clean_response(remove_cmd_str(response, AT_TH_RES))
-            _raw_th_arr = _clean_res.split(" ")
+        _cmds.append(AT_TH_REQ + " " + sensor.get_addr() + " " + metric_str_arr[metric_idx])
+
+    return _cmds
+
+
+def parse_data(sensor, _responses):
+    """Store the responses to load_cmds(sensor) in the sensor object, return True if a response is missing.
+
+    The settings are only taken as the state of the board (for the delta uploads) and marked as loaded when every
+    response is there.
+    """
+    _complete = True
+    sensor._loaded_at = None
+
+    _value = response_value(_responses[0], AT_POLL_RES)
+    if _value is not None and _value.isdigit():
+        sensor._polling_enabled = int(_value) > 0
+        sensor._polling_interval_sec = int(_value)
+    else:
+        _complete = False
+
+    for metric_idx, response in enumerate(_responses[1:]):
+        _value = response_value(response, AT_TH_RES)
+        _raw_th_arr = [] if _value is None else _value.split()
+        if len(_raw_th_arr) == 3:
             sensor._thresholds_enabled[metric_idx] = _raw_th_arr[0] == "1"
             sensor._thresholds_low[metric_idx] = _raw_th_arr[1]
             sensor._thresholds_high[metric_idx] = _raw_th_arr[2]
-            _err = False
+        else:
+            _complete = False
+
+    if _complete:
+        sensor._confirmed.update(upload_state(sensor))
+        sensor._loaded_at = time.monotonic()
 
+    return not _complete
+
+
+def load_data(sensor, _debug, _ser, policy=None):
+    return parse_data(sensor, pipeline(_ser, _debug, load_cmds(sensor), policy=policy))
+
+
+def parse_dump(sensors, response) -> bool:
+    """Store the +DMP: response in the sensor objects, return True if a sensor is missing or malformed"""
+    _value = response_value(response, AT_DUMP_RES)
+    if _value is None:
+        return True
+
+    _by_id = {sensor._addr + sensor._type: sensor for sensor in sensors}
+    _found = 0
+    for _entry in _value.split(";"):
+        _fields = _entry.split()
+        sensor = _by_id.get(_fields[0]) if _fields else None
+        if sensor is None or len(_fields) != 2 + sensor._num_metrics:
+            continue
+        _metrics = [_field.split(",") for _field in _fields[2:]]
+        if not _fields[1].isdigit() or any(len(_metric) != 3 for _metric in _metrics):
+            continue
+        parse_data(sensor, [AT_POLL_RES + " " + _fields[1]]
+                   + [AT_TH_RES + " " + " ".join(_metric) for _metric in _metrics])
+        _found += 1
+
+    return _found != len(sensors)
+
+
+def load_all_cmds(sensors) -> list:
+    return [_cmd for sensor in sensors for _cmd in load_cmds(sensor)]
+
+
+def parse_all(sensors, _responses) -> bool:
+    """Store the responses to load_all_cmds(sensors) in the sensor objects"""
+    _err = False
+    _start = 0
+    for sensor in sensors:
+        _end = _start + 1 + sensor._num_metrics
+        _err = parse_data(sensor, _responses[_start:_end]) or _err
+        _start = _end
     return _err
 
 
+def dump_support(response, dump):
+    """Whether AT+DMP? is supported, after its response (dump: what was known before, None when nothing)
+
+    ERROR means it is not, a +DMP: response (even an incomplete one) that it is. No response tells nothing new.
+    """
+    if response is None:
+        return dump
+    if classify(response) == LINE_ERROR:
+        return False
+    return True if response_value(response, AT_DUMP_RES) is not None else dump
+
+
+def load_all(sensors, _debug, _ser, dump=None, policy=None) -> (bool, bool):
+    """Load the settings of every sensor at once, return (error, whether AT+DMP? is supported).
+
+    With dump True or None (not known yet) AT+DMP? is tried first, once: one round trip for the whole
+    motherboard. When it is not answered completely the per-sensor commands of all sensors are sent in one
+    pipeline, as with dump False. Only a motherboard that answers ERROR to AT+DMP? is taken not to support it (see
+    dump_support), after a missing or incomplete dump it is tried again the next time.
+    """
+    if dump is not False:
+        response = pipeline(_ser, _debug, [AT_DUMP_REQ], policy=policy, retries=0)[0]
+        if not parse_dump(sensors, response):
+            return False, True
+        dump = dump_support(response, dump)
+    return parse_all(sensors, pipeline(_ser, _debug, load_all_cmds(sensors), policy=policy)), dump
+
+
+# ---- asyncio variants, to be used with an AsyncSerial port ----
+
+# Time to wait for a response on an AsyncSerial port when no deadline is given [s]
+ASYNC_TIMEOUT = LONG_TIMEOUT
+
+
+async def wait_response(_debug, _fut, timeout=ASYNC_TIMEOUT):
+    try:
+        response = await asyncio.wait_for(_fut, timeout)
+    except asyncio.TimeoutError:
+        response = None
+    _debug.write("COM", F"RX: {response}")
+    return response
+
+
+async def pipeline_pass_async(_aser, _debug, _cmds, _indices, _responses, depth, policy, attempt) -> list:
+    """Same as pipeline_pass() on an AsyncSerial port"""
+    _in_flight = deque()
+    _read = []
+    _next = 0
+    _last = time.monotonic()
+
+    while _next < len(_indices) or _in_flight:
+        if _next < len(_indices) and len(_in_flight) < depth:
+            # any line but unsolicited output is claimed in order, it is checked against the command below
+            _fut = _aser.expect()
+            write_cmd(_aser, _debug, _cmds[_indices[_next]])
+            _in_flight.append((_indices[_next], _fut, time.monotonic()))
+            _next += 1
+            continue
+
+        _idx, _fut, _sent = _in_flight.popleft()
+        _start = max(_sent, _last)
+        _wait = time.monotonic()
+        _timeout = max(_start + policy.deadline(_cmds[_idx], attempt) - _wait, MIN_TIMEOUT)
+        response = await wait_response(_debug, _fut, _timeout)
+        if response is None or not answers(_cmds[_idx], response):
+            if response is None:
+                stats.missed(time.monotonic() - _wait)
+            else:
+                _debug.write("COM", F"RX (out of order): {response}")
+                stats.round_trips += 1
+            # the lines still to come are not claimed anymore, they go to the unsolicited callback
+            for _, _fut, _ in _in_flight:
+                _fut.cancel()
+            _doubtful = doubtful(_cmds, _indices[:_next], _read, _responses)
+            for _i in _doubtful:
+                _responses[_i] = None
+            return _doubtful + [_idx] + [_i for _i, _, _ in _in_flight] + _indices[_next:]
+        _last = time.monotonic()
+        policy.record(_cmds[_idx], _last - _start)
+        _responses[_idx] = response
+        _read.append(_idx)
+        if not _in_flight:
+            stats.round_trips += 1
+
+    return []
+
+
+async def pipeline_async(_aser, _debug, _cmds, depth=PIPELINE_DEPTH, policy=None, retries=None) -> list:
+    """Same as pipeline() but awaits the responses instead of blocking on readline.
+
+    The pipeline holds the lock of the port until it is done: the lines of two pipelines could not be told apart.
+    """
+    policy = timeouts if policy is None else policy
+    retries = policy.retries if retries is None else retries
+    _responses = [None] * len(_cmds)
+    _pending = list(range(len(_cmds)))
+
+    async with _aser.lock:
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                if not _aser.is_open or not all(policy.learned(_cmds[_idx]) for _idx in _pending):
+                    break
+                # let the late responses arrive before claiming lines again
+                await asyncio.sleep(policy.deadline(_cmds[_pending[0]], attempt))
+            _pending = await pipeline_pass_async(_aser, _debug, _cmds, _pending, _responses,
+                                                 depth if attempt == 0 else 1, policy, attempt)
+            if not _pending:
+                break
+
+    return _responses
+
+
+async def transact_async(_aser, _debug, _cmd):
+    return (await pipeline_async(_aser, _debug, [_cmd]))[0]
+
+
+async def close_async(_aser, _debug):
+    await transact_async(_aser, _debug, AT_CLOSE)
+
+
+async def upload_sensor_async(sensor, _aser, _debug):
+    _changes = upload_changes(sensor)
+    return confirm_upload(sensor, _changes,
+                          await pipeline_async(_aser, _debug, [_cmd + _value for _cmd, _value in _changes]))
+
+
+async def handle_ping_async(_aser, _debug) -> (bool, str):
+    return parse_ping(await transact_async(_aser, _debug, AT_PING_REQ))
+
+
+async def set_accumulation_async(_aser, _debug, enable=False):
+    return parse_accumulation(await transact_async(_aser, _debug, accumulation_cmd(enable)))
+
+
+async def request_sensors_async(_aser, _debug):
+    return parse_sensors(await transact_async(_aser, _debug, AT_LIST_REQ))
+
+
+async def request_acc_async(_aser, _debug):
+    # both lines must be claimed before sending, otherwise the status line is reported as unsolicited
+    response = None
+    async with _aser.lock:
+        for attempt in range(timeouts.retries + 1):
+            if attempt > 0:
+                if not _aser.is_open or not timeouts.learned(AT_ACC_REQ):
+                    break
+                await asyncio.sleep(timeouts.deadline(AT_ACC_REQ, attempt))
+            _futures = [_aser.expect(partial(answers, AT_ACC_REQ)), _aser.expect()]
+            _start = time.monotonic()
+            write_cmd(_aser, _debug, AT_ACC_REQ)
+            response = await wait_response(_debug, _futures[0], timeouts.deadline(AT_ACC_REQ, attempt))
+            if response is not None:
+                timeouts.record(AT_ACC_REQ, time.monotonic() - _start)
+                await wait_response(_debug, _futures[1], timeouts.deadline(AT_ACC_REQ))
+                stats.round_trips += 1
+                break
+            stats.missed(time.monotonic() - _start)
+            _futures[1].cancel()
+    return parse_acc(response)
+
+
+async def load_data_async(sensor, _debug, _aser):
+    return parse_data(sensor, await pipeline_async(_aser, _debug, load_cmds(sensor)))
+
+
+async def load_all_async(sensors, _debug, _aser, dump=None) -> (bool, bool):
+    """Same as load_all() on an AsyncSerial port"""
+    if dump is not False:
+        response = (await pipeline_async(_aser, _debug, [AT_DUMP_REQ], retries=0))[0]
+        if not parse_dump(sensors, response):
+            return False, True
+        dump = dump_support(response, dump)
+    return parse_all(sensors, await pipeline_async(_aser, _debug, load_all_cmds(sensors))), dump
+
+
 TH_HIGH = 0
 TH_LOW = 1
 
@@ -238,6 +796,11 @@ class Sensor:
 
         self._polling_interval_sec = 65535
 
+        # Settings last read from or acknowledged by the motherboard, only the others are uploaded (see upload_state)
+        self._confirmed = {}
+        # time.monotonic() of the last successful load_data, None as long as the settings are not known
+        self._loaded_at = None
+
     def get_name(self):
         return self._sensor_name
 
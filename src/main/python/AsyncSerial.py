@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from collections import deque
+
+from ATCommands import LINE_UNSOLICITED, LineFramer, classify
+
+# Time stop() waits for the reader thread to end [s]
+STOP_TIMEOUT = 1.0
+
+
+class AsyncSerial:
+    """Serial port wrapper that reads lines in a background thread and hands them to the asyncio event loop.
+
+    The reader takes whatever the port has received at once and cuts it into lines (LineFramer). Responses, OK
+    and ERROR lines are given to the oldest request waiting for an answer (see expect()) if it accepts them.
+    Unsolicited lines (debug output of the firmware), lines the request does not accept and lines that arrive
+    while no request is waiting are passed to the unsolicited callback, so output of the motherboard is never
+    lost and the event loop (and the GUI running on it) never blocks on the serial port.
+
+    The responses carry no address, so only one transaction may be on the wire at a time: the coroutines that
+    send commands hold `lock` until their responses are in (see ATCommands.pipeline_async).
+    """
+
+    def __init__(self, _ser, unsolicited=None):
+        self._ser = _ser
+        self._unsolicited = unsolicited
+        self._loop = None
+        self._waiting = deque()
+        self._thread = None
+        self._stopped = None  # set to stop the running reader thread, every thread has its own
+        self._lock = None
+
+    @property
+    def is_open(self):
+        return self._ser.is_open
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Lock of the transactions on the port, created on first use on the event loop"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def start(self):
+        """Start reading the (already opened) serial port"""
+        if self._stopped is not None:
+            return
+        self._loop = asyncio.get_event_loop()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, args=(self._stopped,), name="serial-reader",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop reading and wait (at most STOP_TIMEOUT) until the reader thread has ended.
+
+        A read in progress is cancelled where the port supports it, otherwise it ends when the port is closed or
+        the read times out. A reader thread still running after a new start() never hands on a line.
+        """
+        _thread, _stopped = self._thread, self._stopped
+        self._thread = self._stopped = None
+        if _stopped is not None:
+            _stopped.set()
+            _cancel_read = getattr(self._ser, 'cancel_read', None)
+            if _cancel_read is not None and self._ser.is_open:
+                _cancel_read()
+            if _thread is not threading.current_thread():
+                _thread.join(STOP_TIMEOUT)
+        while self._waiting:
+            _fut, _ = self._waiting.popleft()
+            if not _fut.done():
+                _fut.set_result(None)
+
+    def write(self, data):
+        self._ser.write(data)
+
+    def expect(self, accepts=None):
+        """Return a future for the next line that is not claimed by an earlier request.
+
+        accepts(line) tells whether a line is the answer (e.g. ATCommands.answers for a command), by default any
+        response, OK or ERROR line is.
+        """
+        _fut = self._loop.create_future()
+        self._waiting.append((_fut, accepts))
+        return _fut
+
+    def _read_loop(self, stopped):
+        _framer = LineFramer()
+        while not stopped.is_set():
+            try:
+                _data = self._ser.read(max(1, self._ser.in_waiting))
+            except Exception:
+                # port closed or unplugged
+                break
+            _lines = _framer.feed(_data) if _data else []
+            if _lines and not stopped.is_set():
+                self._loop.call_soon_threadsafe(self._dispatch, _lines, stopped)
+
+    def _dispatch(self, lines, stopped):
+        if stopped.is_set():
+            # read before stop(), the requests waiting now belong to a new session
+            return
+        for line in lines:
+            if not self._answer(line) and self._unsolicited is not None:
+                self._unsolicited(line)
+
+    def _answer(self, line) -> bool:
+        if classify(line) == LINE_UNSOLICITED:
+            return False
+        while self._waiting:
+            _fut, _accepts = self._waiting[0]
+            if _fut.done():
+                self._waiting.popleft()
+                continue
+            if _accepts is not None and not _accepts(line):
+                return False
+            self._waiting.popleft()
+            _fut.set_result(line)
+            return True
+        return False
@@ -0,0 +1,165 @@
+"""Benchmark the serial protocol of the configurator against an emulated motherboard.
+
+The flows of RemoteWidget run as they do in the GUI, with ATCommands on an AsyncSerial port, but on an
+Emulator.EmulatorSerial with the timing of a real 115200 baud connection:
+
+    connect     on_connect_btn_pressed: handle_ping, request_sensors and request_acc
+    prefetch    on_connect_btn_pressed: load_all, settings of every sensor (AT+DMP? or one pipeline)
+    load        on_sensor_btn_pressed for every sensor, without the prefetched settings: load_data
+    save        on_save_btn_pressed for every sensor, nothing changed: upload_sensor
+    save_all    on_save_btn_pressed for every sensor, every setting changed: upload_sensor
+
+For every sensor mix and flow the wall time, the round trips (the times the configurator waits until every
+command it sent is answered, or given up; see ATCommands.PipelineStats), the bytes on the wire and the time
+spent waiting for responses that never came are written as json:
+
+    python Benchmark.py -o benchmark.json
+    python Benchmark.py --mix all large --latency 0.005 --repeat 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import ATCommands as Motherboard
+from AsyncSerial import AsyncSerial
+from Emulator import EmulatedBoard, EmulatorSerial, Link
+
+# ---- Constant ----
+MIXES = {
+    'sound': ["0101"],
+    'buttons': ["0102"],
+    'environmental': ["0103"],
+    'power': ["0104"],
+    'all': ["0101", "0202", "0303", "0404"],
+    'large': ["0101", "0202", "0303", "0404", "0501", "0603", "0703", "0804"],
+}
+FLOWS = ('connect', 'prefetch', 'load', 'save', 'save_all')
+
+
+class BenchDebug:
+    """Debug output that is dropped, same interface as CustomDebug (the round trips are in Motherboard.stats)"""
+
+    def write(self, _type, text):
+        pass
+
+
+async def connect(_aser, _debug, sensors):
+    await Motherboard.handle_ping_async(_aser, _debug)
+    _err, _sensors = await Motherboard.request_sensors_async(_aser, _debug)
+    await Motherboard.request_acc_async(_aser, _debug)
+    sensors.extend(_sensors)
+
+
+async def prefetch(_aser, _debug, sensors):
+    await Motherboard.load_all_async(sensors, _debug, _aser)
+
+
+async def load(_aser, _debug, sensors):
+    for sensor in sensors:
+        await Motherboard.load_data_async(sensor, _debug, _aser)
+
+
+async def save(_aser, _debug, sensors):
+    for sensor in sensors:
+        await Motherboard.upload_sensor_async(sensor, _aser, _debug)
+
+
+def change_all(sensor):
+    sensor._polling_interval_sec += 60
+    for metric_idx in range(sensor.get_num_metrics()):
+        sensor._thresholds_enabled[metric_idx] = not sensor._thresholds_enabled[metric_idx]
+        sensor._thresholds_low[metric_idx] = int(sensor._thresholds_low[metric_idx]) + 1
+        sensor._thresholds_high[metric_idx] = int(sensor._thresholds_high[metric_idx]) + 1
+
+
+async def save_all(_aser, _debug, sensors):
+    for sensor in sensors:
+        change_all(sensor)
+    await save(_aser, _debug, sensors)
+
+
+def run_session(mix, link_options, dump=False):
+    """Run every flow once on a new emulated motherboard (with AT+DMP? when dump), return {flow: measurement}"""
+    _link = Link(**link_options)
+    _ser = EmulatorSerial(EmulatedBoard(sensors=MIXES[mix], dump=dump), _link, timeout=1)
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _aser = AsyncSerial(_ser)
+    _aser.start()
+
+    _sensors = []
+    _measurements = {}
+    try:
+        for name, flow in zip(FLOWS, (connect, prefetch, load, save, save_all)):
+            _debug = BenchDebug()
+            _stats = dict(_link.stats)
+            Motherboard.stats.reset()
+            _start = time.perf_counter()
+            _loop.run_until_complete(flow(_aser, _debug, _sensors))
+            _measurements[name] = {
+                'wall_time': time.perf_counter() - _start,
+                'round_trips': Motherboard.stats.round_trips,
+                'commands': _link.stats['commands'] - _stats['commands'],
+                'bytes_tx': _link.stats['bytes_in'] - _stats['bytes_in'],
+                'bytes_rx': _link.stats['bytes_out'] - _stats['bytes_out'],
+                'timeouts': Motherboard.stats.timeouts,
+                'timeout_time': Motherboard.stats.timeout_time,
+            }
+    finally:
+        _aser.stop()
+        _ser.close()
+        _loop.close()
+        asyncio.set_event_loop(None)
+    return _measurements
+
+
+def benchmark(mixes=tuple(MIXES), repeat=5, dump=False, **link_options) -> dict:
+    """Run the flows repeat times per sensor mix, report the median wall time and the other values of the first run"""
+    _results = []
+    for mix in mixes:
+        _runs = [run_session(mix, link_options, dump) for _ in range(repeat)]
+        _flows = {}
+        for name in FLOWS:
+            _flows[name] = dict(_runs[0][name])
+            _wall_times = [run[name]['wall_time'] for run in _runs]
+            _flows[name]['wall_time'] = statistics.median(_wall_times)
+            _flows[name]['wall_time_min'] = min(_wall_times)
+            _flows[name]['wall_time_max'] = max(_wall_times)
+        _results.append({'mix': mix, 'sensors': MIXES[mix], 'flows': _flows})
+    return {'link': link_options, 'dump': dump, 'repeat': repeat, 'results': _results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the motherboard protocol against an emulated board")
+    parser.add_argument('--mix', nargs='+', choices=list(MIXES), default=list(MIXES), help="sensor mixes")
+    parser.add_argument('--dump', action='store_true', help="emulate a firmware with the bulk dump command")
+    parser.add_argument('--baud', type=int, default=115200, help="baud rate, 0 for no throttling")
+    parser.add_argument('--latency', type=float, default=0.002, metavar='SEC',
+                        help="processing time of a command on the motherboard (default: 0.002)")
+    parser.add_argument('--drop', type=float, default=0.0, metavar='P', help="probability to lose a response line")
+    parser.add_argument('--error', type=float, default=0.0, metavar='P', help="probability of an ERROR response")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the faults")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per mix")
+    parser.add_argument('-o', '--output', metavar='FILE', help="json file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.mix, args.repeat, args.dump, baudrate=args.baud or None, latency=args.latency,
+                       drop_rate=args.drop, error_rate=args.error, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for result in report['results']:
+        print(result['mix'] + ": " + ", ".join(
+            F"{name} {flow['wall_time'] * 1000:.1f} ms/{flow['round_trips']} rt/"
+            F"{flow['bytes_tx'] + flow['bytes_rx']} B" for name, flow in result['flows'].items()), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+from collections import namedtuple
+
+import numpy as np
+
+import MeasurementTable
+
+# ---- Board configurations (= row in the measurement table, id_config in the configurator) ----
+MOTHERBOARD = 0
+BUTTONS = 1
+POWER = 2
+POWER_TH = 3
+SOUND = 4
+SOUND_TH = 5
+ENVIRONMENTAL = 6
+ENVIRONMENTAL_TH = 7
+
+# Number of metrics the firmware sends for every board configuration (see ATCommands.Sensor)
+EXPECTED_METRICS = {BUTTONS: 0, POWER: 2, POWER_TH: 2, SOUND: 1, SOUND_TH: 1, ENVIRONMENTAL: 4, ENVIRONMENTAL_TH: 4}
+# Names of the board configurations, as PowerReport recognises them
+EXPECTED_NAMES = {BUTTONS: 'Buttons', POWER: 'Power (no thresh)', POWER_TH: 'Power', SOUND: 'Sound (no thresh)',
+                  SOUND_TH: 'Sound', ENVIRONMENTAL: 'Environmental (no thresh)', ENVIRONMENTAL_TH: 'Environmental'}
+
+# ---- Measurement sections, 5 columns each starting at column 5 ----
+SECTION_STATIC = 0          # Static Power/Sleep Mode
+SECTION_WUM = 1             # Motherboard Wakes Up
+SECTION_TH_NOT_EXCEEDED = 2  # Threshold Not Exceeded
+SECTION_TH_EXCEEDED = 3     # Threshold Exceeded
+SECTION_POLLING = 4         # Polling Interrupt
+SECTION_STORE = 5           # Saving data
+NUMBER_SECTIONS = 6
+
+SECTION_FIRST_COLUMN = 5
+SECTION_WIDTH = 5
+PEAK_OFFSET = 0             # Peak current      [uA]
+AVERAGE_OFFSET = 2          # Aver. current     [uA]
+ENERGY_OFFSET = 3           # Energy            [uWh]
+INTERVAL_OFFSET = 4         # Interval time     [ms]
+
+# ---- Other columns ----
+DATE_COLUMN = 2
+NAME_COLUMN = 4
+COLUMNS = {
+    # Status LoRa castle
+    'st_wut_energy': 35,        # [uWh]
+    'st_wut_time': 36,          # [ms]
+    'st_tx_current': 37,        # [uA]
+    'st_rx_energy': 38,         # [uWh]
+    'st_rx_time': 39,           # [ms]
+    # Normal data LoRa castle
+    'wut_energy': 40,           # [uWh]
+    'wut_time': 41,             # [ms]
+    'tx_current': 42,           # [uA]
+    'rx_energy': 43,            # [uWh]
+    'rx_time': 44,              # [ms]
+    # Accumulated data LoRa castle
+    'acc_wut_energy': 45,       # [uWh]
+    'acc_wut_time': 46,         # [ms]
+    'acc_tx_current': 47,       # [uA]
+    'acc_rx_energy': 48,        # [uWh]
+    'acc_rx_time': 49,          # [ms]
+    'threshold_interval': 50,   # [ms]
+    'number_metrics': 51,
+}
+
+BoardProfile = namedtuple('BoardProfile', ['name', 'peak_current', 'average_current', 'energy', 'interval']
+                          + sorted(COLUMNS))
+
+
+class BoardProfiles(object):
+    """Measurements of every board configuration, one named array per quantity.
+
+    Every array is indexed by the board configuration (MOTHERBOARD, BUTTONS, ...); the section arrays have a
+    second axis with the measurement section (SECTION_STATIC, SECTION_WUM, ...). Missing measurements are NaN.
+    """
+
+    def __init__(self, table):
+        self.date = table.value(MOTHERBOARD, DATE_COLUMN)
+        self.names = list(table.column(NAME_COLUMN))
+
+        sections = np.stack([table.column(c) for c in range(SECTION_FIRST_COLUMN,
+                                                            SECTION_FIRST_COLUMN + NUMBER_SECTIONS * SECTION_WIDTH)],
+                            axis=1).reshape(-1, NUMBER_SECTIONS, SECTION_WIDTH)
+        self.peak_current = sections[:, :, PEAK_OFFSET]
+        self.average_current = sections[:, :, AVERAGE_OFFSET]
+        self.energy = sections[:, :, ENERGY_OFFSET]
+        self.interval = sections[:, :, INTERVAL_OFFSET]
+
+        for field, column in COLUMNS.items():
+            setattr(self, field, table.column(column))
+
+        self._validate()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, config):
+        return BoardProfile(name=self.names[config],
+                            peak_current=self.peak_current[config],
+                            average_current=self.average_current[config],
+                            energy=self.energy[config],
+                            interval=self.interval[config],
+                            **{field: getattr(self, field)[config] for field in COLUMNS})
+
+    def _validate(self):
+        """Check that the columns still hold what they are used for"""
+        for config, name in EXPECTED_NAMES.items():
+            if self.names[config] != name:
+                raise MeasurementTable.SchemaError(
+                    "Row " + str(config) + " should be the '" + name + "' board, not '" + self.names[config] + "'")
+
+        for config, number in EXPECTED_METRICS.items():
+            if self.number_metrics[config] != number:
+                raise MeasurementTable.SchemaError(
+                    "Board '" + self.names[config] + "' should have " + str(number) + " metrics, the table says "
+                    + str(self.number_metrics[config]))
+
+        with np.errstate(invalid='ignore'):
+            if np.any(self.peak_current < self.average_current):
+                raise MeasurementTable.SchemaError("Peak current below average current, columns are shifted")
+
+    # ---- Static power ----
+    @property
+    def static_current(self):
+        return self.average_current[:, SECTION_STATIC]
+
+    # ---- Motherboard wakes up ----
+    @property
+    def wum_energy(self):
+        return self.energy[:, SECTION_WUM]
+
+    @property
+    def wum_time(self):
+        return self.interval[:, SECTION_WUM]
+
+    # ---- Data storage (data accumulation) ----
+    @property
+    def store_energy(self):
+        return self.energy[:, SECTION_STORE]
+
+    @property
+    def store_time(self):
+        return self.interval[:, SECTION_STORE]
+
+
+def load_profiles():
+    """Return the profiles of the default measurement table"""
+    return BoardProfiles(MeasurementTable.load_table(validate=BoardProfiles))
@@ -0,0 +1,174 @@
+"""Apply a configuration file to the sensors of one or more motherboards, without the GUI.
+
+Only ATCommands and pyserial are imported, so the tool starts in a few tens of milliseconds and can be scripted,
+e.g. on a flashing station, one process per port or every port in one process:
+
+    python Configure.py board.json --ports COM3
+    python Configure.py board.json --ports COM3 COM4 COM5
+
+The configuration is a json file listing the settings per sensor address. The polling interval is in s, the
+thresholds are in the units of the GUI (°C, hPa, V, ...) and are converted with Sensor.convert_metric_value.
+Settings that are left out keep the value read from the motherboard:
+
+    {
+        "sensors": {
+            "01": {"poll": 600},
+            "03": {"poll": 900,
+                   "thresholds": [{"enabled": true, "low": 15, "high": 28.5},
+                                  null,
+                                  null,
+                                  {"enabled": false}]}
+        }
+    }
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+import ATCommands as Motherboard
+import Fleet
+
+# ---- Constant ----
+MAX_POLL = 65535  # the polling interval is an unsigned 16 bit value on the motherboard [s]
+METRIC_KEYS = ('enabled', 'low', 'high')
+
+
+class ConfigError(ValueError):
+    """The configuration file is not valid"""
+
+
+def check_metric(metric, where):
+    if metric is None:
+        return
+    if not isinstance(metric, dict):
+        raise ConfigError(F"{where}: a threshold is an object or null")
+    for key, value in metric.items():
+        if key not in METRIC_KEYS:
+            raise ConfigError(F"{where}: unknown setting '{key}'")
+        if key == 'enabled' and not isinstance(value, bool):
+            raise ConfigError(F"{where}: 'enabled' is true or false")
+        if key != 'enabled' and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ConfigError(F"{where}: '{key}' is a number")
+
+
+def check_config(config):
+    """Raise ConfigError when config is not a valid configuration, return config"""
+    if not isinstance(config, dict) or not isinstance(config.get('sensors'), dict):
+        raise ConfigError("the configuration needs a 'sensors' object")
+
+    for addr, settings in config['sensors'].items():
+        where = F"sensor {addr}"
+        if len(addr) != 2 or not addr.isdigit():
+            raise ConfigError(F"{where}: the address is 2 digits")
+        if not isinstance(settings, dict):
+            raise ConfigError(F"{where}: the settings are an object")
+        for key in settings:
+            if key not in ('poll', 'thresholds'):
+                raise ConfigError(F"{where}: unknown setting '{key}'")
+        poll = settings.get('poll')
+        if poll is not None and (isinstance(poll, bool) or not isinstance(poll, int) or not 0 <= poll <= MAX_POLL):
+            raise ConfigError(F"{where}: 'poll' is an interval between 0 and {MAX_POLL} s")
+        thresholds = settings.get('thresholds', [])
+        if not isinstance(thresholds, list) or len(thresholds) > len(Motherboard.metric_str_arr):
+            raise ConfigError(F"{where}: 'thresholds' is a list of at most "
+                              F"{len(Motherboard.metric_str_arr)} metrics")
+        for metric_idx, metric in enumerate(thresholds):
+            check_metric(metric, F"{where}, metric {metric_idx + 1}")
+
+    return config
+
+
+def read_config(path):
+    with open(path, encoding='utf-8') as f:
+        try:
+            return check_config(json.load(f))
+        except json.JSONDecodeError as e:
+            raise ConfigError(F"not a json file: {e}")
+
+
+def apply_settings(sensor, settings):
+    """Store the settings of the configuration in the sensor object, the thresholds in engineering units"""
+    if settings.get('poll') is not None:
+        sensor._polling_interval_sec = settings['poll']
+
+    thresholds = settings.get('thresholds', [])
+    if len(thresholds) > sensor.get_num_metrics():
+        raise ConfigError(F"sensor {sensor.get_addr()}: a {sensor.get_name()} has {sensor.get_num_metrics()} "
+                          F"metric(s)")
+    for metric_idx, metric in enumerate(thresholds):
+        if metric is None:
+            continue
+        if 'enabled' in metric:
+            sensor._thresholds_enabled[metric_idx] = metric['enabled']
+        if 'low' in metric:
+            sensor.set_threshold(metric['low'], metric_idx=metric_idx, to_machine=True, which_th=Motherboard.TH_LOW)
+        if 'high' in metric:
+            sensor.set_threshold(metric['high'], metric_idx=metric_idx, to_machine=True,
+                                 which_th=Motherboard.TH_HIGH)
+
+
+def configurator(config):
+    """configure(sensor) callback for Fleet.provision, raises ConfigError when the sensor does not match"""
+    def configure(sensor):
+        settings = config['sensors'].get(sensor.get_addr())
+        if settings is not None:
+            apply_settings(sensor, settings)
+    return configure
+
+
+def missing_sensors(config, result) -> list:
+    """Addresses of the configuration that are not connected to the motherboard"""
+    _connected = {sensor.get_addr() for sensor in result.sensors}
+    return sorted(addr for addr in config['sensors'] if addr not in _connected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a configuration file to the sensors of motherboards")
+    parser.add_argument('config', help="json configuration file")
+    parser.add_argument('--ports', nargs='+', metavar='PORT', help="serial ports (default: all)")
+    parser.add_argument('--check', action='store_true', help="only check the configuration file")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every AT command")
+    args = parser.parse_args(argv)
+
+    try:
+        config = read_config(args.config)
+    except (OSError, ConfigError) as e:
+        print(F"{args.config}: {e}", file=sys.stderr)
+        return 2
+    if args.check:
+        return 0
+
+    _lock = threading.Lock()
+
+    def progress(device, message):
+        if args.verbose:
+            with _lock:
+                print(F"[{device}] {message}", file=sys.stderr)
+
+    _start = time.time()
+    results = Fleet.provision_all(args.ports, configurator(config), progress, args.verbose)
+    if not results:
+        print("No serial port found", file=sys.stderr)
+        return 1
+
+    _ok = True
+    for result in results:
+        _missing = missing_sensors(config, result) if result.ok else []
+        if result.ok and not _missing:
+            status = "OK"
+        elif result.ok:
+            status = "FAILED (sensor(s) " + " ".join(_missing) + " not connected)"
+        else:
+            status = "FAILED (" + result.error + ")"
+        _ok = _ok and status == "OK"
+        print(F"{result.device}\t{result.motherboard_id}\t{result.uploaded}/{len(result.sensors)} sensor(s)\t"
+              F"{result.duration:.2f} s\t{status}")
+    if args.verbose:
+        print(F"{len(results)} motherboard(s) in {time.time() - _start:.2f} s", file=sys.stderr)
+    return 0 if _ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,75 @@
+import logging
+import os
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from PyQt5.QtCore import QTimer
+
+# ---- Constant ----
+MAX_LINES = 5000  # lines kept in the debug pane, older lines are dropped
+FLUSH_INTERVAL = 100  # in ms, the lines written in the mean time are added to the pane at once
+# IWAST_DEBUG_LOG=<file> mirrors the debug output to a log file, rotated when it reaches LOG_MAX_BYTES
+ENV_DEBUG_LOG = 'IWAST_DEBUG_LOG'
+LOG_MAX_BYTES = 1000000
+LOG_BACKUPS = 3
+LOGGER_NAME = 'iwast.debug'
+
+
+def file_logger(path) -> logging.Logger:
+    """Logger that writes the debug output to path (the first path it is called with)"""
+    _logger = logging.getLogger(LOGGER_NAME)
+    if not _logger.handlers:
+        _handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(_handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+    return _logger
+
+
 class CustomDebug():
-    def __init__(self, _text_field):
+    """Debug output in a QPlainTextEdit, may only be used from the GUI thread.
+
+    Lines are kept in a ring buffer of max_lines and added to the pane in one batch every interval [ms], so a
+    session costs one layout per interval however many commands it sends. The pane keeps max_lines as well.
+    """
+
+    def __init__(self, _text_field, max_lines=MAX_LINES, interval=FLUSH_INTERVAL, log_file=None):
         self._text_field = _text_field
+        self._text_field.setMaximumBlockCount(max_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._dropped = 0  # lines pushed out of the ring buffer before they were shown
+        self._timer = QTimer(_text_field)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.flush)
+
+        log_file = log_file or os.environ.get(ENV_DEBUG_LOG)
+        self._log = None if not log_file else file_logger(log_file)
+        self._log_pending = []
 
     def write(self, prefix, msg):
-        self._text_field.appendPlainText(F"{prefix}\t{msg}")
\ No newline at end of file
+        _line = F"{prefix}\t{msg}"
+        if len(self._pending) == self._pending.maxlen:
+            self._dropped += 1
+        self._pending.append(_line)
+        if self._log is not None:
+            self._log_pending.append(time.strftime("%Y-%m-%d %H:%M:%S\t") + _line)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Add the buffered lines to the pane (and the log file) now"""
+        if self._log_pending:
+            self._log.info("\n".join(self._log_pending))
+            self._log_pending = []
+        if not self._pending:
+            return
+        _lines = list(self._pending)
+        self._pending.clear()
+        if self._dropped:
+            _lines.insert(0, F"GUI\t{self._dropped} line(s) not shown")
+            self._dropped = 0
+        # one block per line, the oldest blocks are removed beyond the maximum block count
+        self._text_field.appendPlainText("\n".join(_lines))
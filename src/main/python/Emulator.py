@@ -0,0 +1,370 @@
+"""Software motherboard speaking the AT dialect of ATCommands, to test and benchmark without hardware.
+
+EmulatedBoard keeps the state of a motherboard (sensors, polling intervals, thresholds, data accumulation) and
+answers one command line at a time. Link models the serial connection: baud rate (10 bits a byte), processing
+latency per command, dropped response lines and injected errors, all reproducible with a seed.
+
+The board is reachable in two ways:
+
+- EmulatorSerial, a pyserial port living in the process (like loop://), usable wherever a serial.Serial is:
+
+      ser = EmulatorSerial(EmulatedBoard(sensors=["0103", "0204"]), Link(latency=0.002), timeout=5)
+      Motherboard.handle_ping(ser, debug)
+
+- PtyEmulator, a pseudo terminal for other processes (Linux, macOS), e.g. for the GUI or Configure.py:
+
+      python Emulator.py --sensors 0103 0204 --latency 0.002
+"""
+import argparse
+import os
+import random
+import select
+import sys
+import threading
+import time
+from collections import deque
+
+from serial.serialutil import SerialBase, PortNotOpenError
+
+import ATCommands as Motherboard
+
+# ---- Constant ----
+ERROR_UNKNOWN_CMD = 1   # ERROR <code> of the emulated motherboard
+ERROR_PARAMETER = 2
+ERROR_INJECTED = 3
+DEFAULT_SENSORS = ("0101", "0202", "0303", "0404")
+
+
+class EmulatedBoard(object):
+    """State of a motherboard and its answers to the AT commands"""
+
+    def __init__(self, motherboard_id="EMU-0001", sensors=DEFAULT_SENSORS, accumulation=False, poll=600,
+                 thresholds=(0, 0, 0), dump=False):
+        self.motherboard_id = motherboard_id
+        self.accumulation = accumulation
+        self.closed = False
+        # address -> [sensor id, polling interval, [[enabled, low, high] per metric]]
+        self.sensors = {}
+        for _id in sensors:
+            _metrics = Motherboard.Sensor(_id).get_num_metrics()
+            self.sensors[_id[:2]] = [_id, poll, [list(thresholds) for _ in range(_metrics)]]
+
+        self.__handlers = [
+            (Motherboard.AT_PING_REQ, self.ping),
+            (Motherboard.AT_LIST_REQ, self.list_sensors),
+            (Motherboard.AT_POLL_REQ, self.get_poll),
+            (Motherboard.AT_POLL_CMD, self.set_poll),
+            (Motherboard.AT_TH_REQ, self.get_thresholds),
+            (Motherboard.AT_TH_E_CMD, self.set_threshold_field(0)),
+            (Motherboard.AT_TH_L_CMD, self.set_threshold_field(1)),
+            (Motherboard.AT_TH_H_CMD, self.set_threshold_field(2)),
+            (Motherboard.AT_ACC_REQ, self.get_accumulation),
+            (Motherboard.AT_ACC_CMD, self.set_accumulation),
+            (Motherboard.AT_CLOSE, self.close),
+        ]
+        if dump:
+            # firmware with the bulk dump command, the others answer it with ERROR
+            self.__handlers.append((Motherboard.AT_DUMP_REQ, self.dump))
+
+    @staticmethod
+    def error(code):
+        return ["ERROR " + str(code)]
+
+    def handle(self, line) -> list:
+        """Return the response lines to one command line"""
+        for _cmd, _handler in self.__handlers:
+            if line.startswith(_cmd):
+                try:
+                    return _handler(line[len(_cmd):].split())
+                except (ValueError, IndexError, KeyError):
+                    return self.error(ERROR_PARAMETER)
+        return self.error(ERROR_UNKNOWN_CMD)
+
+    def metric(self, args):
+        """[enabled, low, high] of the metric addressed by <sensor-address> <metric>"""
+        return self.sensors[args[0]][2][int(args[1]) - 1]
+
+    def ping(self, args):
+        self.closed = False
+        return [Motherboard.AT_PING_RES + " " + self.motherboard_id]
+
+    def list_sensors(self, args):
+        return [Motherboard.AT_LIST_RES + " " + " ".join(_sensor[0] for _sensor in self.sensors.values())]
+
+    def get_poll(self, args):
+        return [Motherboard.AT_POLL_RES + " " + str(self.sensors[args[0]][1])]
+
+    def set_poll(self, args):
+        _interval = int(args[2])
+        if not 0 <= _interval <= 65535:
+            raise ValueError(args[2])
+        self.sensors[args[0]][1] = _interval
+        return [Motherboard.AT_OK]
+
+    def get_thresholds(self, args):
+        return [Motherboard.AT_TH_RES + " " + " ".join(str(_value) for _value in self.metric(args))]
+
+    def set_threshold_field(self, field):
+        def handler(args):
+            _value = int(args[2])
+            if field == 0 and _value not in (0, 1):
+                raise ValueError(args[2])
+            self.metric(args)[field] = _value
+            return [Motherboard.AT_OK]
+        return handler
+
+    def get_accumulation(self, args):
+        return [Motherboard.AT_ACC_RES + " " + ("1" if self.accumulation else "0"), Motherboard.AT_OK]
+
+    def set_accumulation(self, args):
+        if args[0] not in ("0", "1"):
+            raise ValueError(args[0])
+        self.accumulation = args[0] == "1"
+        return [Motherboard.AT_ACC_RES + " " + args[0]]
+
+    def dump(self, args):
+        return [Motherboard.AT_DUMP_RES + " " + "; ".join(
+            " ".join([_id, str(_poll)] + [",".join(str(_value) for _value in _metric) for _metric in _metrics])
+            for _id, _poll, _metrics in self.sensors.values())]
+
+    def close(self, args):
+        self.closed = True
+        return [Motherboard.AT_OK]
+
+
+class Link(object):
+    """Timing and faults of the serial connection to an emulated board.
+
+    latency is the processing time of every command [s], latencies overrides it per command prefix (e.g.
+    {"AT+TH?": 0.01}). baudrate None means no throttling. drop_rate and error_rate are the probabilities that a
+    response line is lost or replaced by ERROR <error_code>.
+    """
+
+    def __init__(self, baudrate=115200, latency=0.0, latencies=None, drop_rate=0.0, error_rate=0.0,
+                 error_code=ERROR_INJECTED, seed=None):
+        self.baudrate = baudrate
+        self.latency = latency
+        self.latencies = dict(latencies or {})
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.__random = random.Random(seed)
+        self.stats = {'commands': 0, 'bytes_in': 0, 'bytes_out': 0, 'dropped': 0, 'errors': 0}
+
+    def byte_time(self):
+        """Time on the wire of one byte (start bit, 8 data bits, stop bit) [s]"""
+        return 10.0 / self.baudrate if self.baudrate else 0.0
+
+    def latency_of(self, line):
+        for _prefix, _latency in self.latencies.items():
+            if line.startswith(_prefix):
+                return _latency
+        return self.latency
+
+    def respond(self, board, line) -> list:
+        """Response lines of the board to a command line, after dropping and error injection, as bytes"""
+        self.stats['commands'] += 1
+        self.stats['bytes_in'] += len(line) + 2
+        _lines = []
+        for _response in board.handle(line):
+            if self.drop_rate and self.__random.random() < self.drop_rate:
+                self.stats['dropped'] += 1
+                continue
+            if self.error_rate and self.__random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                _response = "ERROR " + str(self.error_code)
+            _raw = (_response + "\r\n").encode('utf-8')
+            self.stats['bytes_out'] += len(_raw)
+            _lines.append(_raw)
+        return _lines
+
+
+def split_lines(buffer, data):
+    """Append data to the bytearray buffer and return the complete lines in it (without line ending)"""
+    buffer += data
+    *_lines, _rest = bytes(buffer).split(b"\n")
+    del buffer[:len(buffer) - len(_rest)]
+    return [_line.rstrip(b"\r").decode('utf-8', errors='replace') for _line in _lines]
+
+
+class EmulatorSerial(SerialBase):
+    """pyserial port connected to an emulated board, with the timing of the Link.
+
+    The board handles a command once it is completely on the wire and it is not busy with the previous one. Its
+    response lines are readable once they are completely transmitted, one after the other.
+    """
+
+    def __init__(self, board=None, link=None, **kwargs):
+        self.board = board if board is not None else EmulatedBoard()
+        self.link = link if link is not None else Link()
+        self.__condition = threading.Condition()
+        self.__pending = deque()        # (time at which it is received, response line)
+        self.__rx = bytearray()         # received and not read yet
+        self.__tx = bytearray()         # part of a command line
+        self.__tx_free = 0.0            # time at which the wires and the board are free again
+        self.__rx_free = 0.0
+        self.__board_free = 0.0
+        kwargs.setdefault('port', 'emulator')
+        super().__init__(**kwargs)
+
+    def open(self):
+        self.is_open = True
+        self.reset_input_buffer()
+
+    def close(self):
+        with self.__condition:
+            self.is_open = False
+            self.__condition.notify_all()
+
+    def _reconfigure_port(self, *args, **kwargs):
+        pass
+
+    def reset_input_buffer(self):
+        with self.__condition:
+            self.__pending.clear()
+            del self.__rx[:]
+
+    def reset_output_buffer(self):
+        del self.__tx[:]
+
+    @property
+    def in_waiting(self):
+        with self.__condition:
+            self.__receive(time.monotonic())
+            return len(self.__rx)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        _byte_time = self.link.byte_time()
+        _now = time.monotonic()
+        _start = max(_now, self.__tx_free)
+        _end = -1
+        with self.__condition:
+            for line in split_lines(self.__tx, data):
+                _end = data.find(b"\n", _end + 1)
+                _arrival = _start + (_end + 1) * _byte_time
+                self.__board_free = max(_arrival, self.__board_free) + self.link.latency_of(line)
+                for _raw in self.link.respond(self.board, line):
+                    self.__rx_free = max(self.__board_free, self.__rx_free) + len(_raw) * _byte_time
+                    self.__pending.append((self.__rx_free, _raw))
+            self.__condition.notify_all()
+        self.__tx_free = _start + len(data) * _byte_time
+        return len(data)
+
+    def __receive(self, now):
+        while self.__pending and self.__pending[0][0] <= now:
+            self.__rx += self.__pending.popleft()[1]
+
+    def __wait(self, enough):
+        """Wait until enough() or the timeout, return the received bytes"""
+        _deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self.__condition:
+            while True:
+                if not self.is_open:
+                    raise PortNotOpenError()
+                _now = time.monotonic()
+                self.__receive(_now)
+                if enough() or (_deadline is not None and _now >= _deadline):
+                    return
+                _wake = _deadline
+                if self.__pending and (_wake is None or self.__pending[0][0] < _wake):
+                    _wake = self.__pending[0][0]
+                self.__condition.wait(None if _wake is None else _wake - _now)
+
+    def read(self, size=1):
+        self.__wait(lambda: len(self.__rx) >= size)
+        _data = bytes(self.__rx[:size])
+        del self.__rx[:size]
+        return _data
+
+    def readline(self, size=-1):
+        self.__wait(lambda: b"\n" in self.__rx)
+        _end = self.__rx.find(b"\n") + 1 or len(self.__rx)
+        if 0 <= size < _end:
+            _end = size
+        _line = bytes(self.__rx[:_end])
+        del self.__rx[:_end]
+        return _line
+
+
+class PtyEmulator(object):
+    """Emulated board behind a pseudo terminal, device is the path to open with pyserial"""
+
+    def __init__(self, board=None, link=None):
+        self.board = board if board is not None else EmulatedBoard()
+        self.link = link if link is not None else Link()
+        self.device = None
+        self.__master = None
+        self.__slave = None
+        self.__thread = None
+        self.__running = False
+
+    def start(self):
+        import tty
+
+        self.__master, self.__slave = os.openpty()
+        tty.setraw(self.__slave)
+        self.device = os.ttyname(self.__slave)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__serve, name="emulator", daemon=True)
+        self.__thread.start()
+        return self.device
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        for _fd in (self.__master, self.__slave):
+            if _fd is not None:
+                os.close(_fd)
+        self.__master = self.__slave = None
+
+    def __serve(self):
+        _buffer = bytearray()
+        _byte_time = self.link.byte_time()
+        while self.__running:
+            _readable, _, _ = select.select([self.__master], [], [], 0.1)
+            if not _readable:
+                continue
+            try:
+                _data = os.read(self.__master, 4096)
+            except OSError:
+                break
+            for line in split_lines(_buffer, _data):
+                time.sleep(self.link.latency_of(line))
+                for _raw in self.link.respond(self.board, line):
+                    time.sleep(len(_raw) * _byte_time)
+                    os.write(self.__master, _raw)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate a motherboard behind a pseudo terminal")
+    parser.add_argument('--id', default="EMU-0001", help="motherboard id")
+    parser.add_argument('--sensors', nargs='+', default=list(DEFAULT_SENSORS), metavar='ID',
+                        help="sensor ids, address and type (01 Sound, 02 Buttons, 03 Environmental, 04 Power)")
+    parser.add_argument('--dump', action='store_true', help="support the bulk dump command AT+DMP?")
+    parser.add_argument('--baud', type=int, default=115200, help="baud rate to emulate, 0 for no throttling")
+    parser.add_argument('--latency', type=float, default=0.0, metavar='SEC', help="processing time of a command")
+    parser.add_argument('--drop', type=float, default=0.0, metavar='P', help="probability to lose a response line")
+    parser.add_argument('--error', type=float, default=0.0, metavar='P', help="probability of an ERROR response")
+    parser.add_argument('--seed', type=int, help="seed of the faults")
+    args = parser.parse_args(argv)
+
+    emulator = PtyEmulator(EmulatedBoard(args.id, args.sensors, dump=args.dump),
+                           Link(args.baud or None, args.latency, drop_rate=args.drop, error_rate=args.error,
+                                seed=args.seed))
+    print(emulator.start(), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.stop()
+        print(emulator.link.stats, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import numpy as np
+
+import BoardProfiles
+
+# ---- Constant ----
+BATTERY = 500  # in mAh
+VOLTAGE = 3.3  # in V
+DAY = 86400000  # in ms
+NUMBER_WUM = 5760  # The motherboard wakes up every 15 s with the new firmware
+LORA_ACC_THRESHOLDS = 30  # Limit of bytes for an accumulated message
+MICROPHONE_OFF_ENERGY = (21.6 * 3.3) * 64000  # The microphone is disabled after an exceeded threshold [uW*ms]
+ERROR_AVER_CUR_SLEEP = 1.26
+ERROR_AVER_CUR_TX = 8000
+ERROR_DATA_TX_TIME = [24.12, 35.05, 45.5, 126.15, 249.12, 495.61]
+ERROR_DATA_TX_TIME_ACC = [30.06, 55.71, 107, 127.29, 332.24, 661.31]
+MIN_SF = 7
+MAX_SF = 12
+DEFAULT_SF = 11
+N_PREAMBLE = 8  # https://www.google.com/patents/EP2763321A1?cl=en
+MAX_PAYLOAD = 255  # Longest LoRa payload [bytes]
+
+_airtime_tables = {}
+
+
+def check_spreading_factor(sf):
+    """Raise ValueError for a spreading factor (or any of an array) outside MIN_SF..MAX_SF, which has no TX error"""
+    if np.any(sf < MIN_SF) or np.any(sf > MAX_SF):
+        raise ValueError("spreading factor " + str(sf) + " is not between " + str(MIN_SF) + " and " + str(MAX_SF))
+
+
+def airtime_lora(spreading_factor, payload_size, data_acc=False, status=False):
+    """Air Time for the LoRa castle (TX time) [ms], spreading_factor and payload_size may be arrays"""
+    # Inspired by code from GillesC
+    # https://github.com/GillesC/LoRaEnergySim/blob/master/Framework/LoRaPacket.py
+    sf = np.asarray(spreading_factor)
+    check_spreading_factor(sf)
+    payload_size = np.asarray(payload_size)
+    t_sym = (2.0 ** sf) / 125
+    t_pream = (N_PREAMBLE + 4.25) * t_sym
+    ldr_opt = np.where(sf >= 11, 1, 0)  # Low Data Rate optimisation
+
+    payload_symb_n_b = 8 + np.maximum(
+        np.ceil((8.0 * payload_size - 4.0 * sf + 28 + 16) / (4.0 * (sf - 2 * ldr_opt))) * (1 + 4), 0)
+    t_payload = payload_symb_n_b * t_sym
+
+    if data_acc and not status:
+        t_error = np.asarray(ERROR_DATA_TX_TIME_ACC)[sf - MIN_SF]
+    else:
+        t_error = np.asarray(ERROR_DATA_TX_TIME)[sf - MIN_SF]
+
+    return t_pream + t_payload + t_error
+
+
+def airtime_table(data_acc=False, status=False):
+    """Air Time [ms] of every spreading factor (rows, from MIN_SF) and payload size (columns, 0 to MAX_PAYLOAD).
+
+    A table is built on first use for each TX error model and kept, so there are at most two 6 x 256 tables.
+    """
+    acc_error = bool(data_acc and not status)
+    table = _airtime_tables.get(acc_error)
+    if table is None:
+        table = airtime_lora(np.arange(MIN_SF, MAX_SF + 1)[:, np.newaxis], np.arange(MAX_PAYLOAD + 1),
+                             data_acc=acc_error)
+        table.setflags(write=False)
+        _airtime_tables[acc_error] = table
+    return table
+
+
+def airtime(spreading_factor, payload_size, data_acc=False, status=False):
+    """Air Time for the LoRa castle (TX time) [ms] looked up in airtime_table(), arrays are broadcast"""
+    sf = np.asarray(spreading_factor)
+    check_spreading_factor(sf)
+    payload_size = np.asarray(payload_size)
+    if np.any(payload_size < 0) or np.any(payload_size > MAX_PAYLOAD):
+        return airtime_lora(sf, payload_size, data_acc=data_acc, status=status)
+    return airtime_table(data_acc, status)[sf - MIN_SF, payload_size]
+
+
+def number_polling(poll_interval):
+    """Number of polling interrupts per day for a polling interval [min], poll_interval may be an array"""
+    poll_interval = np.asarray(poll_interval, dtype=float)
+    with np.errstate(divide='ignore'):
+        return np.where(poll_interval > 0, np.trunc(1440 / poll_interval), 0).astype(int)
+
+
+def tx_energy(time_tx, current):
+    """Energy of a transmission [uWh] from its time [ms] and aver. current [uA]"""
+    return (((time_tx / 1000) * VOLTAGE * (current / 1000000)) / 3600) * 1000000
+
+
+class Boards(object):
+    """Measurements of the sensor boards connected to one motherboard, gathered from the board profiles.
+
+    Every per-board array has one entry per sensor board slot; unused slots are zero. Nothing in here depends
+    on the event counts or the spreading factor, so it is built once per configuration.
+    """
+
+    def __init__(self, profiles, configs, poll_intervals, thresholds, data_acc=False):
+        """configs, poll_intervals (in min) and thresholds have one entry per slot, False when not used"""
+        self.data_acc = data_acc
+        self.number_wum = NUMBER_WUM
+        self.acc_thresholds = LORA_ACC_THRESHOLDS
+
+        self.used = np.array([c is not False for c in configs], dtype=bool)
+        self.configs = np.array([c if c is not False else BoardProfiles.MOTHERBOARD for c in configs], dtype=int)
+        self.number_used = int(np.count_nonzero(self.used))
+        self.names = [profiles.names[c] for c in self.configs[self.used]]
+        configs = self.configs
+
+        polling = np.array([p is not False and p != 0 for p in poll_intervals], dtype=bool) & self.used
+        thresholds = np.array([t is not False for t in thresholds], dtype=bool) & self.used
+        buttons = self.used & (configs == BoardProfiles.BUTTONS)
+        self.polling = polling
+        self.thresholds = thresholds
+        self.exceeding = thresholds | buttons  # boards with exceeded threshold (or button) events
+        self.sound = self.used & np.isin(configs, (BoardProfiles.SOUND, BoardProfiles.SOUND_TH))
+        self.microphone = self.used & (configs == BoardProfiles.SOUND_TH)
+
+        self.number_metrics = np.where(self.used, profiles.number_metrics[configs], 0).astype(int)
+
+        # Polling and threshold events
+        self.number_polling = number_polling([p if m else 0 for p, m in zip(poll_intervals, polling)])
+        energy = np.nan_to_num(profiles.energy[configs])
+        interval = np.nan_to_num(profiles.interval[configs])
+        self.poll_energy = np.where(polling, energy[:, BoardProfiles.SECTION_POLLING], 0)
+        self.poll_time = np.where(polling, interval[:, BoardProfiles.SECTION_POLLING], 0)
+        self.th_not_exceeded_energy = np.where(thresholds, energy[:, BoardProfiles.SECTION_TH_NOT_EXCEEDED], 0)
+        self.th_not_exceeded_time = np.where(thresholds, interval[:, BoardProfiles.SECTION_TH_NOT_EXCEEDED], 0)
+        self.th_exceeded_energy = np.where(self.exceeding, energy[:, BoardProfiles.SECTION_TH_EXCEEDED], 0)
+        self.th_exceeded_time = np.where(self.exceeding, interval[:, BoardProfiles.SECTION_TH_EXCEEDED], 0)
+
+        self.threshold_interval = np.where(thresholds, np.nan_to_num(profiles.threshold_interval[configs]), 0)
+        self.possible_thresholds = self.number_possible_thresh(self.number_polling)
+
+        # Static power, the motherboard is the first entry [uW]
+        self.static_power = np.concatenate(([profiles.static_current[BoardProfiles.MOTHERBOARD]],
+                                            np.where(self.used, profiles.static_current[configs], 0))) * VOLTAGE
+
+        # Motherboard wakes up
+        self.wum_energy = float(profiles.wum_energy[BoardProfiles.MOTHERBOARD])
+        self.wum_time = float(profiles.wum_time[BoardProfiles.MOTHERBOARD])
+
+        # Data storage (data accumulation)
+        self.store_energy = np.where(self.used, profiles.store_energy[configs], 0)
+        self.store_time = np.where(self.used, profiles.store_time[configs], 0)
+
+        # Status LoRa castle
+        motherboard = profiles[BoardProfiles.MOTHERBOARD]
+        self.st_wut_energy = float(motherboard.st_wut_energy)
+        self.st_wut_time = float(motherboard.st_wut_time)
+        self.st_tx_current = float(motherboard.st_tx_current)
+        self.st_rx_energy = float(motherboard.st_rx_energy)
+        self.st_rx_time = float(motherboard.st_rx_time)
+
+        # Data LoRa castle: one per board, or a single one for the accumulated message
+        if data_acc:
+            acc = profiles[BoardProfiles.SOUND_TH]
+            self.castle = np.ones(1, dtype=bool)
+            self.wut_energy = np.array([acc.acc_wut_energy])
+            self.wut_time = np.array([acc.acc_wut_time])
+            self.tx_current = np.array([acc.acc_tx_current])
+            self.rx_energy = np.array([acc.acc_rx_energy])
+            self.rx_time = np.array([acc.acc_rx_time])
+            self.payload_size = np.array([self.acc_thresholds])
+        else:
+            self.castle = self.used
+            self.wut_energy = np.where(self.used, np.nan_to_num(profiles.wut_energy[configs]), 0)
+            self.wut_time = np.where(self.used, np.nan_to_num(profiles.wut_time[configs]), 0)
+            self.tx_current = np.where(self.used, np.nan_to_num(profiles.tx_current[configs]), 0)
+            self.rx_energy = np.where(self.used, np.nan_to_num(profiles.rx_energy[configs]), 0)
+            self.rx_time = np.where(self.used, np.nan_to_num(profiles.rx_time[configs]), 0)
+            self.payload_size = 2 + (2 * self.number_metrics)
+
+    @property
+    def initial_thresh_not_exceeded(self):
+        return np.maximum(self.possible_thresholds, 0)
+
+    def number_possible_thresh(self, number_polling):
+        """Number of threshold checks per day left between the pollings (not for the microphone)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            possible = np.trunc(DAY / self.threshold_interval - number_polling)
+        return np.where(self.thresholds & ~self.microphone, possible, 0).astype(int)
+
+
+class Result(object):
+    """Output of evaluate(), every quantity has the batch shape of the inputs (plus the board axis)"""
+
+
+def _status_message(boards, r):
+    """Status LoRa castle"""
+    r.st_tx_time = airtime(r.spreading_factor, 7 + boards.number_used, data_acc=boards.data_acc, status=True)
+    r.st_tx_energy = tx_energy(r.st_tx_time, boards.st_tx_current)
+    r.time_st = boards.st_wut_time + r.st_tx_time + boards.st_rx_time
+    r.energy_st = boards.st_wut_energy + r.st_tx_energy + boards.st_rx_energy
+    r.energy_st_max = (boards.st_wut_energy + tx_energy(r.st_tx_time, boards.st_tx_current + ERROR_AVER_CUR_TX)
+                       + boards.st_rx_energy)
+
+
+def _sending_messages(boards, r):
+    """Data LoRa castles, one per board or the accumulated one"""
+    tx_time = airtime(r.spreading_factor[..., np.newaxis], boards.payload_size, data_acc=boards.data_acc)
+    r.castle_tx_time = tx_time
+    r.castle_tx_energy = tx_energy(tx_time, boards.tx_current)
+    r.castle_time = np.where(boards.castle, boards.wut_time + boards.rx_time + tx_time, 0)
+    r.castle_energy = np.where(boards.castle, boards.wut_energy + boards.rx_energy + r.castle_tx_energy, 0)
+    r.castle_energy_max = np.where(boards.castle, boards.wut_energy + boards.rx_energy + tx_energy(
+        tx_time, boards.tx_current + ERROR_AVER_CUR_TX), 0)
+
+
+def _storing(boards, r):
+    """Storing events and accumulated messages (data accumulation)"""
+    messages = r.thresh_exceeded + r.polls
+    if boards.data_acc:
+        polls_stored = np.where(boards.sound, 2 * r.polls, r.polls)  # Sound board particularity
+        r.number_storing = r.thresh_exceeded * boards.number_metrics + polls_stored * boards.number_metrics
+        acc_bytes = np.sum(np.where(boards.used, messages * ((boards.number_metrics * 2) + 4), 0), axis=-1)
+        r.acc_data_send_nb = np.trunc(acc_bytes / boards.acc_thresholds).astype(int)
+    else:
+        r.number_storing = np.zeros_like(messages)
+        r.acc_data_send_nb = np.zeros(np.shape(messages)[:-1], dtype=int)
+
+
+def _dynamic_data(boards, r):
+    """Dynamic data energy, the motherboard first"""
+    board_time = (r.polls * boards.poll_time + r.thresh_not_exceeded * boards.th_not_exceeded_time
+                  + r.thresh_exceeded * boards.th_exceeded_time)
+    board_energy = (r.polls * boards.poll_energy + r.thresh_not_exceeded * boards.th_not_exceeded_energy
+                    + r.thresh_exceeded * boards.th_exceeded_energy)
+    motherboard_time = boards.number_wum * boards.wum_time + np.sum(r.number_storing * boards.store_time, axis=-1)
+    motherboard_energy = (boards.number_wum * boards.wum_energy
+                          + np.sum(r.number_storing * boards.store_energy, axis=-1))
+    r.dyn_data_time = np.concatenate((np.broadcast_to(motherboard_time, board_time.shape[:-1])[..., np.newaxis],
+                                      board_time), axis=-1)
+    r.dyn_data_energy = motherboard_energy + np.sum(board_energy, axis=-1)
+
+
+def _dynamic_send(boards, r):
+    """Dynamic send energy (status and data messages)"""
+    if boards.data_acc:
+        r.dyn_send_time = r.time_st + r.acc_data_send_nb * r.castle_time[..., 0]
+        r.dyn_send_energy = r.energy_st + r.acc_data_send_nb * r.castle_energy[..., 0]
+        r.dyn_send_energy_max = r.energy_st_max + r.acc_data_send_nb * r.castle_energy_max[..., 0]
+    else:
+        messages = r.thresh_exceeded + r.polls
+        r.dyn_send_time = r.time_st + np.sum(messages * r.castle_time, axis=-1)
+        r.dyn_send_energy = r.energy_st + np.sum(messages * r.castle_energy, axis=-1)
+        r.dyn_send_energy_max = r.energy_st_max + np.sum(messages * r.castle_energy_max, axis=-1)
+
+
+def _static(boards, r):
+    """Static energy, in the time left by the dynamic events"""
+    static_board_time = DAY - r.dyn_data_time
+    static_board_time[..., 0] -= r.dyn_send_time
+    r.static_board_time = static_board_time
+    r.static_time = DAY - np.sum(r.dyn_data_time, axis=-1) - r.dyn_send_time
+    microphone = np.sum(np.where(boards.microphone, MICROPHONE_OFF_ENERGY * r.thresh_exceeded, 0), axis=-1)
+    r.static_energy = (np.sum(boards.static_power * static_board_time, axis=-1) - microphone) / 3600000
+    r.static_energy_max = (np.sum(((boards.static_power / VOLTAGE) + ERROR_AVER_CUR_SLEEP) * VOLTAGE
+                                  * static_board_time, axis=-1) - microphone) / 3600000
+    r.static_energy_min = (np.sum(((boards.static_power / VOLTAGE) - ERROR_AVER_CUR_SLEEP) * VOLTAGE
+                                  * static_board_time, axis=-1) - microphone) / 3600000
+
+
+def _total(boards, r):
+    """Total average consumption (per day) and lifetime"""
+    r.total_aver_cons = r.static_energy + r.dyn_data_energy + r.dyn_send_energy
+    r.total_aver_cons_max = r.static_energy_max + r.dyn_data_energy + r.dyn_send_energy_max
+    r.total_aver_cons_min = r.static_energy_min + r.dyn_data_energy + r.dyn_send_energy
+    r.lifetime = (24 / r.total_aver_cons) * ((BATTERY * VOLTAGE) * 1000)
+    r.lifetime_min = (24 / r.total_aver_cons_max) * ((BATTERY * VOLTAGE) * 1000)
+
+
+# Dependency graph of the model: every stage, in evaluation order, with the inputs and stages it depends on
+STAGES = [
+    ('status', _status_message, {'spreading_factor'}),
+    ('castles', _sending_messages, {'spreading_factor'}),
+    ('storing', _storing, {'thresh_exceeded', 'polls'}),
+    ('dyn_data', _dynamic_data, {'thresh_exceeded', 'thresh_not_exceeded', 'polls', 'storing'}),
+    ('dyn_send', _dynamic_send, {'thresh_exceeded', 'polls', 'status', 'castles', 'storing'}),
+    ('static', _static, {'thresh_exceeded', 'dyn_data', 'dyn_send'}),
+    ('total', _total, {'static', 'dyn_data', 'dyn_send'}),
+]
+
+
+class Evaluation(object):
+    """Evaluation of the energy model for one set of boards that only recomputes what its input changes affect.
+
+    update() compares the new inputs with the previous ones and runs the stages (see STAGES) that depend on a
+    changed input or on a recomputed stage; result holds every quantity, as returned by evaluate().
+    """
+
+    def __init__(self, boards):
+        self.boards = boards
+        self.result = Result()
+        self._inputs = None
+
+    def update(self, spreading_factor=DEFAULT_SF, thresh_exceeded=0, thresh_not_exceeded=0, polls=None):
+        """Set the inputs (see evaluate()), return the names of the changed inputs and recomputed stages"""
+        boards = self.boards
+        polls = boards.number_polling if polls is None else np.where(boards.polling, polls, 0)
+        exceeded, not_exceeded, polls = np.broadcast_arrays(np.where(boards.used, thresh_exceeded, 0),
+                                                            np.where(boards.used, thresh_not_exceeded, 0), polls)
+        shape = np.broadcast(np.asarray(spreading_factor), exceeded[..., 0]).shape
+        inputs = {
+            'spreading_factor': np.broadcast_to(spreading_factor, shape),
+            'thresh_exceeded': np.broadcast_to(exceeded, shape + exceeded.shape[-1:]),
+            'thresh_not_exceeded': np.broadcast_to(not_exceeded, shape + not_exceeded.shape[-1:]),
+            'polls': np.broadcast_to(polls, shape + polls.shape[-1:]),
+        }
+
+        if self._inputs is None:
+            changed = set(inputs)
+        else:
+            changed = {name for name, value in inputs.items() if value.shape != self._inputs[name].shape
+                       or not np.array_equal(value, self._inputs[name])}
+        self._inputs = inputs
+        for name in changed:
+            setattr(self.result, name, inputs[name])
+
+        for name, stage, depends in STAGES:
+            if depends & changed:
+                stage(boards, self.result)
+                changed.add(name)
+        return changed
+
+
+def evaluate(boards, spreading_factor=DEFAULT_SF, thresh_exceeded=0, thresh_not_exceeded=0, polls=None):
+    """Evaluate the daily consumption and lifetime of a motherboard with its sensor boards.
+
+    spreading_factor may be an array, thresh_exceeded and thresh_not_exceeded (events per day) arrays with the
+    boards on the last axis; all inputs are broadcast against each other, so a whole grid of configurations is
+    evaluated at once. polls (pollings per day, boards on the last axis) replaces the number of pollings of the
+    polling interval the boards were built with. Times are in ms, energies in uWh and lifetimes in hours.
+    """
+    evaluation = Evaluation(boards)
+    evaluation.update(spreading_factor, thresh_exceeded, thresh_not_exceeded, polls)
+    return evaluation.result
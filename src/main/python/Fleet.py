@@ -0,0 +1,180 @@
+"""Provision every motherboard connected to the computer at once.
+
+One session is opened per serial port and all sessions run in parallel, each in its own thread: ping the
+motherboard, list its sensors, load their settings (all at once, see ATCommands.load_all) and upload the new
+ones. Provisioning takes as long as the slowest motherboard. Every session learns the latencies of its own
+motherboard (a TimeoutPolicy of its own).
+
+    python Fleet.py                       read every motherboard
+    python Fleet.py --poll 600            also set the polling interval of every sensor to 600 s
+    python Fleet.py --ports COM3 COM4     only these ports
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+
+import ATCommands as Motherboard
+from SerialPorts import gen_serial_ports, new_port
+
+
+class SessionDebug:
+    """Debug output of one session, same interface as CustomDebug"""
+
+    def __init__(self, device, verbose=False):
+        self.device = device
+        self.verbose = verbose
+        self.lines = []
+
+    def write(self, _type, text):
+        self.lines.append(F"{_type}: {text}")
+        if self.verbose:
+            print(F"[{self.device}] {_type}: {text}", file=sys.stderr)
+
+
+class SessionResult:
+    """Outcome of the provisioning of one motherboard"""
+
+    def __init__(self, device):
+        self.device = device
+        self.motherboard_id = None
+        self.sensors = []
+        self.accumulation = None    # data accumulation of the motherboard, True or False once read
+        self.uploaded = 0           # sensors whose new settings were acknowledged
+        self.error = None           # first error, None when everything went well
+        self.duration = 0           # in s
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def provision(device, configure=None, progress=None, verbose=False, accumulation=None) -> SessionResult:
+    """Ping the motherboard on device, load the settings of its sensors and upload them after configure(sensor).
+
+    The data accumulation is read as well and changed when accumulation (True or False) differs from it.
+    progress(device, message) is called (from the session thread) after every step.
+    """
+    _result = SessionResult(device)
+    _debug = SessionDebug(device, verbose)
+    _policy = Motherboard.TimeoutPolicy()
+    _start = time.time()
+
+    def _step(message):
+        if progress is not None:
+            progress(device, message)
+
+    try:
+        _ser = new_port(device)
+    except serial.SerialException as e:
+        _result.error = F"cannot open port: {e}"
+        _step(_result.error)
+        return _result
+
+    try:
+        _err, _result.motherboard_id = Motherboard.handle_ping(_ser, _debug, _policy)
+        if _err:
+            _result.error = "no motherboard answers"
+            return _result
+        _step(F"motherboard {_result.motherboard_id}")
+
+        _err, _result.sensors = Motherboard.request_sensors(_ser, _debug, _policy)
+        if _err:
+            _result.error = "cannot list the sensors"
+            return _result
+        _step(F"{len(_result.sensors)} sensor(s)")
+
+        _err, _ = Motherboard.load_all(_result.sensors, _debug, _ser, policy=_policy)
+        if _err:
+            _result.error = "cannot load the sensors"
+            return _result
+        _step("loaded the sensors")
+
+        _err, _acc = Motherboard.request_acc(_ser, _debug, _policy)
+        if _err:
+            _result.error = "cannot read the data accumulation"
+            return _result
+        _result.accumulation = _acc == 1
+        if accumulation is not None and accumulation != _result.accumulation:
+            _err, _acc = Motherboard.set_accumulation(_ser, _debug, enable=accumulation, policy=_policy)
+            if _err or _acc != ("1" if accumulation else "0"):
+                _result.error = "the motherboard did not acknowledge the data accumulation"
+                return _result
+            _result.accumulation = accumulation
+            _step(F"data accumulation {'on' if accumulation else 'off'}")
+
+        if configure is not None:
+            for sensor in _result.sensors:
+                try:
+                    configure(sensor)
+                except ValueError as e:
+                    _result.error = str(e)
+                    return _result
+                if Motherboard.upload_sensor(sensor, _ser, _debug, _policy):
+                    _result.error = F"sensor {sensor.get_addr()} did not acknowledge its settings"
+                    return _result
+                _result.uploaded += 1
+                _step(F"uploaded sensor {sensor.get_addr()}")
+
+        Motherboard.close(_ser, _debug, _policy)
+    except serial.SerialException as e:
+        _result.error = F"serial port error: {e}"
+    finally:
+        _ser.close()
+        _result.duration = time.time() - _start
+        _step("done" if _result.ok else F"failed: {_result.error}")
+
+    return _result
+
+
+def provision_all(devices=None, configure=None, progress=None, verbose=False, accumulation=None) -> list:
+    """Provision every device (by default every serial port) in parallel, return the results in device order"""
+    if devices is None:
+        devices = [device for _, device in gen_serial_ports()]
+    if not devices:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="fleet") as executor:
+        _futures = {executor.submit(provision, device, configure, progress, verbose, accumulation): device
+                    for device in devices}
+        _results = {_futures[_fut]: _fut.result() for _fut in as_completed(_futures)}
+    return [_results[device] for device in devices]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Provision every motherboard connected to the computer")
+    parser.add_argument('--ports', nargs='+', metavar='PORT', help="serial ports (default: all)")
+    parser.add_argument('--poll', type=int, metavar='SEC', help="polling interval to set on every sensor")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every AT command")
+    args = parser.parse_args(argv)
+
+    _lock = threading.Lock()
+
+    def progress(device, message):
+        with _lock:
+            print(F"[{device}] {message}", file=sys.stderr)
+
+    configure = None
+    if args.poll is not None:
+        def configure(sensor):
+            sensor._polling_interval_sec = args.poll
+
+    _start = time.time()
+    results = provision_all(args.ports, configure, progress, args.verbose)
+    if not results:
+        print("No serial port found", file=sys.stderr)
+        return 1
+
+    for result in results:
+        status = "OK" if result.ok else "FAILED (" + result.error + ")"
+        print(F"{result.device}\t{result.motherboard_id}\t{len(result.sensors)} sensor(s)\t"
+              F"{result.uploaded} uploaded\t{result.duration:.2f} s\t{status}")
+    print(F"{len(results)} motherboard(s) in {time.time() - _start:.2f} s", file=sys.stderr)
+    return 0 if all(result.ok for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
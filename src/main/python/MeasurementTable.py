@@ -0,0 +1,323 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+import requests
+
+# ---- Constant ----
+URL_GITHUB = 'https://raw.githubusercontent.com/dramco-iwast/docs/master/Power_Data.csv'
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.iwast-configurator')
+ENV_DATA_FILE = 'IWAST_POWER_DATA'  # set to a local csv file to never use the network
+REQUEST_TIMEOUT = 5  # in s
+
+# ---- CSV layout ----
+PREAMBLE_LINES = 7                  # lines before the header
+SEPARATOR = ';'
+NO_DATA = 'No data'                 # value of an empty measurement
+MIN_ROWS = 8                        # motherboard + 7 board configurations
+TEXT_COLUMNS = (2, 4)               # date of the measurement, board name
+NUMERIC_COLUMNS = range(5, 52)      # measurements, in uA, ms, uWh ...
+TABLE_FORMAT = 2                    # version of the pickled Table, bump when Table changes
+
+
+class DataUnavailableError(Exception):
+    """The measurement table is neither cached nor downloadable"""
+
+
+class SchemaError(ValueError):
+    """The measurement table does not have the expected layout"""
+
+
+class UrlSource(object):
+    """Measurement table stored on a web server"""
+
+    def __init__(self, url=URL_GITHUB, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, etag=None):
+        """Return (content, etag), content is None when the table did not change since etag"""
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        req = requests.get(self.url, headers=headers, timeout=self.timeout)
+        if req.status_code == 304:
+            return None, etag
+        req.raise_for_status()
+        return req.content, req.headers.get('ETag')
+
+
+class FileSource(object):
+    """Measurement table stored in a local file"""
+
+    def __init__(self, path):
+        self.url = path
+
+    def fetch(self, etag=None):
+        stat = os.stat(self.url)
+        new_etag = str(stat.st_mtime_ns) + '-' + str(stat.st_size)
+        if new_etag == etag:
+            return None, etag
+        with open(self.url, 'rb') as f:
+            return f.read(), new_etag
+
+
+def default_source():
+    path = os.environ.get(ENV_DATA_FILE)
+    if path:
+        return FileSource(path)
+    return UrlSource()
+
+
+class Table(object):
+    """Parsed measurement table: one named column per csv column, one row per board configuration.
+
+    Numeric columns are float64 arrays in which 'No data' is stored as NaN, text columns are lists of str.
+    """
+
+    def __init__(self, columns, data):
+        self.columns = columns
+        self.data = data
+        self.iat = _PositionIndexer(self)
+
+    @property
+    def shape(self):
+        return (len(self.data[0]) if self.data else 0, len(self.columns))
+
+    def column_index(self, key):
+        if isinstance(key, int):
+            return key
+        return self.columns.index(key)
+
+    def column(self, key):
+        return self.data[self.column_index(key)]
+
+    def is_numeric(self, key):
+        return isinstance(self.column(key), np.ndarray)
+
+    def value(self, row, key):
+        """Return one cell, as float, str or NO_DATA"""
+        cell = self.column(key)[row]
+        if isinstance(cell, str):
+            return cell
+        if np.isnan(cell):
+            return NO_DATA
+        return float(cell)
+
+
+class _PositionIndexer(object):
+    """table.iat[row, col], like the pandas accessor"""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, key):
+        row, col = key
+        return self._table.value(row, col)
+
+
+def _decode(content):
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('latin-1')
+
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        if cell in ('', NO_DATA):
+            return np.nan
+        raise
+
+
+def parse_csv(content):
+    """Parse the raw csv file (bytes) into a Table and check its layout.
+
+    The cells are split by the csv module, so a quoted cell may contain the separator (or a line break).
+    """
+    lines = _decode(content).split('\n', PREAMBLE_LINES)
+    text = lines[PREAMBLE_LINES] if len(lines) > PREAMBLE_LINES else ''
+    rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(text, newline=''), delimiter=SEPARATOR)
+            if any(cell.strip() for cell in row)]
+    if not rows:
+        raise SchemaError("Empty measurement table")
+
+    columns = rows[0]
+    rows = rows[1:]
+    if len(rows) < MIN_ROWS:
+        raise SchemaError("Expected at least " + str(MIN_ROWS) + " rows, got " + str(len(rows)))
+    if len(columns) < NUMERIC_COLUMNS.stop:
+        raise SchemaError("Expected at least " + str(NUMERIC_COLUMNS.stop) + " columns, got " + str(len(columns)))
+
+    width = len(columns)
+    rows = [row + [''] * (width - len(row)) if len(row) < width else row[:width] for row in rows]
+
+    data = []
+    for idx, cells in enumerate(zip(*rows)):
+        if idx in NUMERIC_COLUMNS:
+            try:
+                data.append(np.array([_to_float(cell) for cell in cells], dtype=np.float64))
+            except ValueError:
+                raise SchemaError("Column " + str(idx) + " (" + columns[idx] + ") is not numeric")
+        else:
+            data.append(list(cells))
+
+    for idx in TEXT_COLUMNS:
+        if any(value == '' for value in data[idx]):
+            raise SchemaError("Column " + str(idx) + " (" + columns[idx] + ") has empty values")
+
+    return Table(columns, data)
+
+
+class MeasurementCache(object):
+    """On-disk cache of the parsed measurement table.
+
+    The cached table is returned immediately and revalidated against the source (with its ETag) in a
+    background thread, the new version is used the next time the table is loaded. The parsed table is
+    versioned by the sha256 of the raw file, so it is only parsed again when the content really changes.
+    validate(table) raises SchemaError for a table that parses but cannot be used (e.g. BoardProfiles): a new
+    version that fails it is not cached and the previous table stays in use.
+    """
+
+    def __init__(self, source=None, cache_dir=CACHE_DIR, validate=None):
+        self.source = source if source is not None else default_source()
+        self.cache_dir = cache_dir
+        self.validate = validate
+        self._meta_path = os.path.join(cache_dir, 'Power_Data.json')
+        self._raw_path = os.path.join(cache_dir, 'Power_Data.csv')
+        self._lock = threading.Lock()
+        self._revalidating = None
+
+    def load(self, revalidate=True):
+        """Return the measurement table, from disk if possible.
+
+        Raises DataUnavailableError when nothing is cached and the source cannot be read, and SchemaError when
+        nothing is cached and the table of the source has an unexpected layout (or fails validate).
+        """
+        meta = self._read_meta()
+        table = self._read_table(meta)
+        if table is None:
+            try:
+                table = self._read_table(self._update(None))
+            except (requests.exceptions.RequestException, OSError) as e:
+                raise DataUnavailableError("No measurement table available from " + str(self.source.url)) from e
+        elif revalidate:
+            self.revalidate_background()
+        return table
+
+    def revalidate_background(self):
+        """Check the source for a new version without blocking the caller"""
+        if self._revalidating is not None and self._revalidating.is_alive():
+            return
+        self._revalidating = threading.Thread(target=self._revalidate, name="power-data-revalidate", daemon=True)
+        self._revalidating.start()
+
+    def _revalidate(self):
+        try:
+            self._update(self._read_meta())
+        except (requests.exceptions.RequestException, OSError):
+            pass  # offline: keep the cached table
+        except SchemaError:
+            pass  # unusable new version: keep the cached table
+
+    def _parse(self, content):
+        table = parse_csv(content)
+        if self.validate is not None:
+            self.validate(table)
+        return table
+
+    def _update(self, meta):
+        """Fetch the source if it changed and store the parsed table, return the up to date metadata"""
+        content, etag = self.source.fetch(None if meta is None else meta.get('etag'))
+        if content is None:
+            return meta
+
+        sha = hashlib.sha256(content).hexdigest()
+        new_meta = {'url': str(self.source.url), 'etag': etag, 'sha256': sha}
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if meta is None or meta.get('sha256') != sha or not os.path.exists(self._table_path(sha)):
+                # parsed and validated before anything is replaced
+                table = self._parse(content)
+                self._write(self._table_path(sha), pickle.dumps(table, pickle.HIGHEST_PROTOCOL))
+                self._write(self._raw_path, content)
+                if meta is not None and meta.get('sha256') != sha:
+                    self._remove(self._table_path(meta.get('sha256')))
+            self._write(self._meta_path, json.dumps(new_meta).encode('utf-8'))
+        return new_meta
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path, 'rb') as f:
+                meta = json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != str(self.source.url):
+            return None  # cache of an other source
+        return meta
+
+    def _read_table(self, meta):
+        if meta is None:
+            return None
+        try:
+            with open(self._table_path(meta['sha256']), 'rb') as f:
+                table = pickle.load(f)
+        except (OSError, KeyError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass  # e.g. pickled by an other numpy version
+        else:
+            try:
+                if self.validate is not None:
+                    self.validate(table)
+                return table
+            except SchemaError:
+                return None
+
+        # table format changed: parse the cached csv again
+        try:
+            with open(self._raw_path, 'rb') as f:
+                content = f.read()
+            if hashlib.sha256(content).hexdigest() != meta.get('sha256'):
+                return None
+            table = self._parse(content)
+            with self._lock:
+                self._write(self._table_path(meta['sha256']), pickle.dumps(table, pickle.HIGHEST_PROTOCOL))
+            return table
+        except (OSError, SchemaError):
+            return None
+
+    def _table_path(self, sha):
+        return os.path.join(self.cache_dir, 'Power_Data.' + str(sha)[:16] + '.v' + str(TABLE_FORMAT) + '.pickle')
+
+    @staticmethod
+    def _write(path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_cache = None
+
+
+def load_table(validate=None):
+    """Return the measurement table of the default source, see MeasurementCache for validate (kept when None)"""
+    global _cache
+    if _cache is None:
+        _cache = MeasurementCache(validate=validate)
+    elif validate is not None:
+        _cache.validate = validate
+    return _cache.load()
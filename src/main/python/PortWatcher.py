@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import serial
+
+import ATCommands as Motherboard
+from SerialPorts import gen_serial_ports, new_port
+
+# Interval between two scans of the serial ports [s], a plugged in board shows up within this time
+WATCH_INTERVAL = 0.5
+# Time a new port gets to answer AT+PNG? [s]
+PROBE_TIMEOUT = 1.0
+
+
+class QuietDebug:
+    """Debug output that is dropped, same interface as CustomDebug (which may only be used from the GUI thread)"""
+
+    def write(self, _type, text):
+        pass
+
+
+def probe_port(device, timeout=PROBE_TIMEOUT):
+    """Return the id of the motherboard on device, None when the port cannot be opened or AT+PNG? is not answered"""
+    try:
+        _ser = new_port(device)
+    except serial.SerialException:
+        return None
+
+    _debug = QuietDebug()
+    try:
+        Motherboard.write_cmd(_ser, _debug, Motherboard.AT_PING_REQ)
+        (_err, _motherboard_id) = Motherboard.parse_ping(
+            Motherboard.read_response(_ser, _debug, timeout, Motherboard.AT_PING_REQ))
+        if _err:
+            return None
+        # leave the motherboard as the configurator does after a session
+        Motherboard.write_cmd(_ser, _debug, Motherboard.AT_CLOSE)
+        Motherboard.read_response(_ser, _debug, timeout, Motherboard.AT_CLOSE)
+        return _motherboard_id
+    except serial.SerialException:
+        return None
+    finally:
+        _ser.close()
+
+
+class PortWatcher:
+    """Scans the serial ports in a background thread and reports the ports that appear and disappear.
+
+    pyserial has no hot-plug notification, so comports() is polled every interval; it runs in the watcher thread,
+    so the event loop (and the GUI running on it) never waits for the enumeration. changed(added, removed) is
+    called on the event loop with lists of (description, device); the first scan reports every port as added.
+    With probe, every added port is pinged (in a thread of its own) and probed(device, motherboard_id) is called
+    on the event loop, with None when no motherboard answers.
+    """
+
+    def __init__(self, changed, probed=None, probe=False, interval=WATCH_INTERVAL):
+        self._changed = changed
+        self._probed = probed
+        self.probe = probe
+        self._interval = interval
+        self._ports = {}  # device -> description
+        self._loop = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._loop = asyncio.get_event_loop()
+        self._running = True
+        self._thread = threading.Thread(target=self._watch_loop, name="port-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread = None
+        self._wake.set()
+
+    def refresh(self):
+        """Scan the ports now instead of after the interval"""
+        self._wake.set()
+
+    def ports(self) -> dict:
+        return dict(self._ports)
+
+    def scan(self) -> (list, list):
+        """Scan the ports once, return the (description, device) pairs that were added and removed"""
+        _ports = {device: name for name, device in gen_serial_ports()}
+        _removed = [(name, device) for device, name in self._ports.items() if _ports.get(device) != name]
+        _added = [(name, device) for device, name in _ports.items() if self._ports.get(device) != name]
+        self._ports = _ports
+        return _added, _removed
+
+    def _watch_loop(self):
+        while self._running:
+            self._wake.clear()
+            try:
+                _added, _removed = self.scan()
+            except Exception:
+                # enumeration failed (e.g. while a driver is installed), try again at the next scan
+                _added, _removed = [], []
+            if (_added or _removed) and self._running:
+                self._loop.call_soon_threadsafe(self._changed, _added, _removed)
+            if self.probe and self._probed is not None:
+                # one thread per port, a port that does not answer does not hold up the scans or the other probes
+                for _, device in _added:
+                    threading.Thread(target=self._probe, args=(device,), name="port-probe", daemon=True).start()
+            self._wake.wait(self._interval)
+
+    def _probe(self, device):
+        _motherboard_id = probe_port(device)
+        if self._running:
+            self._loop.call_soon_threadsafe(self._probed, device, _motherboard_id)
@@ -1,26 +1,24 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QCloseEvent
 from PyQt5.QtWidgets import (QGridLayout, QLabel, QPushButton, QWidget, QSlider,
                              QScrollArea, QSpinBox, QTabWidget, QErrorMessage, QFileDialog)
+from concurrent.futures import ThreadPoolExecutor
 import math
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import io
-import ReportPDF
+import traceback
+import BoardProfiles
+import EnergyModel
+import MeasurementTable
 
 # ---- Constant ----
-URL_GITHUB = 'https://raw.githubusercontent.com/dramco-iwast/docs/master/Power_Data.csv'
 DEBUG = False
-BATTERY = 500  # in mAh
-ERROR_AVER_CUR_SLEEP = 1.26
-ERROR_AVER_CUR_TX = 8000
-ERROR_DATA_TX_TIME = [24.12, 35.05, 45.5, 126.15, 249.12, 495.61]
-ERROR_DATA_TX_TIME_ACC = [30.06, 55.71, 107, 127.29, 332.24, 661.31]
+UPDATE_INTERVAL = 16  # in ms, the event choices are evaluated at most once a frame (60 fps)
 
 
 class PowerReport(QWidget):
     """Second window to manage the power report"""
 
+    evaluated = pyqtSignal(object)  # quantities changed by an evaluation in the worker thread
+
     def __init__(self, data_acc,
                  id_config_1=False, poll_interval_1=False, thresholds_1=False,
                  id_config_2=False, poll_interval_2=False, thresholds_2=False,
@@ -43,7 +41,20 @@ class PowerReport(QWidget):
         self.__thresholds = []              # Threshold(s) ?            (if 'False' -> No Thresholds)
         self.__id_name = []                 # ID(s) name(s) of the board(s) used
         self.__number_metrics = []          # Number(s) of metrics of each boards
-        self.__lora_spread_factor = 11      # LoRa spreading factor     (default -> 11)
+        self.__lora_spread_factor = EnergyModel.DEFAULT_SF  # LoRa spreading factor     (default -> 11)
+        self.__boards = None                # Measurements of the boards used (EnergyModel.Boards)
+        self.__evaluation = None            # Energy model, recomputes only what the event choices change
+        self.__executor = None              # Worker thread evaluating the energy model
+        self.__evaluating = False           # An evaluation is running in the worker thread
+        self.__update_pending = False       # The event choices changed during the evaluation
+        self.__closed = False               # The window is closed, results of the worker thread are dropped
+
+        # Coalesce the event choices of a frame into one evaluation
+        self.__update_timer = QTimer(self)
+        self.__update_timer.setSingleShot(True)
+        self.__update_timer.setInterval(UPDATE_INTERVAL)
+        self.__update_timer.timeout.connect(self.update_values)
+        self.evaluated.connect(self.on_evaluated)
 
         self.__id.append(id_config_1)                   # ID of the configuration 1
         self.__poll_interval.append(poll_interval_1)    # Polling interval in min ? (if 'False' -> No Polling)
@@ -132,12 +143,12 @@ class PowerReport(QWidget):
 
         # Wake-Up motherboard event
         self.__time_wum = 0                 # Time for a "Wake-Up Motherboard" event        [ms]
-        self.__number_wum = 5760            # This event occurs each with the new firmware
+        self.__number_wum = EnergyModel.NUMBER_WUM  # This event occurs each with the new firmware
         self.__energy_wum = 0               # Energy for a "Wake-Up Motherboard" event      [uWh]
 
         # Accumulation data parameters (depends on the board -> we use an array for parameters who depend on the board)
         self.__acc_data_send_nb = 0         # Number of accumulated message that are sent by the motherboard
-        self.__lora_acc_thresholds = 30     # Limit of bytes for an accumulated message
+        self.__lora_acc_thresholds = EnergyModel.LORA_ACC_THRESHOLDS  # Limit of bytes for an accumulated message
         self.__time_store_data = []         # Time to store one metric in the motherboard for a specific board    [ms]
         self.__energy_store_data = []       # Energy to store one metric in the motherboard for a specific board  [uWh]
         self.__number_storing_msg = []      # Number of storing event for a specific board
@@ -170,21 +181,12 @@ class PowerReport(QWidget):
         self.tabs.addTab(self.scrollDataWidget, "Measurement Data")
 
         # Collect number of pollings
-        for id_c in range(len(self.__id)):
-            if self.get_id(id_c) is not False:
-                if self.get_poll_interval(id_c) is not False or self.get_poll_interval(id_c) != 0:
-                    self.append_number_polling_occurs(int(1440 / self.get_poll_interval(id_c)))
-                else:
-                    self.append_number_polling_occurs(0)
-            else:
-                self.append_number_polling_occurs(0)
+        self.__number_polling_occurs = self.__boards.number_polling.tolist()
 
         # Collect number of thresholds not exceeded
-        self.determine_number_thresh_not_exceeded()
-
-        # Collect number of storing event (if data accumulation is enable)
-        if self.get_data_acc() is True:
-            self.determine_number_storing_msg()
+        self.__number_possible_thresh = self.__boards.possible_thresholds.tolist()
+        self.__number_thresh_not_exceeded = self.__boards.initial_thresh_not_exceeded.tolist()
+        self.__number_thresh_exceeded = [0] * len(self.__id)
 
         # --------------------------------------------------------------------------------------------------------------
         #       EVENT WIDGET
@@ -196,12 +198,8 @@ class PowerReport(QWidget):
         self.event_config = self.config_event_widget()
         self.event_config.setMaximumWidth(400)
 
-        # Determine the number of message sending (if data accumulation is enabled)
-        if self.get_data_acc() is True:
-            self.determine_number_acc_send()
-
         # Determine an estimation of the total consumption of the system
-        self.determine_total_average_cons()
+        self.evaluate()
 
         # --------------------------------------------------------------------------------------------------------------
         #       GRAPHICS WIDGET
@@ -247,8 +245,7 @@ class PowerReport(QWidget):
         self.average_total_consumption_max = QLabel(self.tr(str(round(self.get_total_aver_cons_max(), 2)) + ' uWh'))
         self.average_total_consumption_min = QLabel(self.tr(str(round(self.get_total_aver_cons_min(), 2)) + ' uWh'))
 
-        # Determine lifetime battery estimation
-        self.determine_lifetime()
+        # Lifetime battery estimation (determined by evaluate)
         self.lifetime_label = QLabel(self.tr('Estimated life time: '))
         self.lifetime_value_label = QLabel(self.tr(
             str(self.get_life_estimation())+' (min: '+str(self.get_life_estimation_min())+')'))
@@ -275,7 +272,7 @@ class PowerReport(QWidget):
         link_template = '<a href={0}>{1}</a>'
         self.measurement_table_link = QLabel()
         self.measurement_table_link.setOpenExternalLinks(True)
-        self.measurement_table_link.setText(link_template.format(URL_GITHUB, 'Access the table'))
+        self.measurement_table_link.setText(link_template.format(MeasurementTable.URL_GITHUB, 'Access the table'))
 
         self.exit_button = QPushButton(self.tr('Exit'))
         self.exit_button.pressed.connect(self.on_exit_button)
@@ -311,124 +308,62 @@ class PowerReport(QWidget):
             if id_config[idc] is False:
                 id_config[idc] = 1000           # if no sensor boards -> ID = 1000
 
-        data_csv = self.collect_csv()
+        profiles = self.collect_csv()
 
         # Collect date of the measurement of the motherboard
-        date = data_csv.iat[0, 2]
-        self.pdf_data_date = date
+        self.pdf_data_date = profiles.date
+
+        # Measurements of the boards used, gathered once for the energy model
+        self.__boards = EnergyModel.Boards(profiles, self.__id, self.__poll_interval, self.__thresholds,
+                                           self.get_data_acc() is True)
+        self.__evaluation = EnergyModel.Evaluation(self.__boards)
+        boards = self.__boards
 
         # Collect Number of metrics per board
-        for id_c in range(len(id_config)):
-            if id_c != 0:
-                if id_config[id_c] != 1000:
-                    self.append_number_metrics(int(data_csv.iat[id_config[id_c], 51]))
-                else:
-                    self.append_number_metrics(0)
+        self.__number_metrics = boards.number_metrics.tolist()
 
         # Collect LoRa Castles Characteristics
-        if self.get_data_acc() is False:
-            for id_c in range(len(id_config)):
-                if id_c != 0:
-                    if id_config[id_c] != 1000:
-                        if data_csv.iat[id_config[id_c], 40] != 'No data':
-                            self.append_energy_wut_data(float(data_csv.iat[id_config[id_c], 40]))
-                            self.append_time_wut_data(float(data_csv.iat[id_config[id_c], 41]))
-                            self.append_aver_cur_data_transmission(float(data_csv.iat[id_config[id_c], 42]))
-                            self.append_energy_data_reception(float(data_csv.iat[id_config[id_c], 43]))
-                            self.append_time_data_reception(float(data_csv.iat[id_config[id_c], 44]))
-                            self.append_sending_castle_time(0)
-                            self.append_sending_castle_energy(0)
-                            self.append_sending_castle_energy_max(0)
-                            self.determine_sending_message(id_c - 1)
-                        else:
-                            self.append_energy_wut_data(0)
-                            self.append_time_wut_data(0)
-                            self.append_aver_cur_data_transmission(0)
-                            self.append_energy_data_reception(0)
-                            self.append_time_data_reception(0)
-                            self.append_sending_castle_time(0)
-                            self.append_sending_castle_energy(0)
-                            self.append_sending_castle_energy_max(0)
-                    else:
-                        self.append_energy_wut_data(0)
-                        self.append_time_wut_data(0)
-                        self.append_aver_cur_data_transmission(0)
-                        self.append_energy_data_reception(0)
-                        self.append_time_data_reception(0)
-                        self.append_sending_castle_time(0)
-                        self.append_sending_castle_energy(0)
-                        self.append_sending_castle_energy_max(0)
-        else:  # Data Acc is true
-            self.append_energy_wut_data(float(data_csv.iat[5, 45]))
-            self.append_time_wut_data(float(data_csv.iat[5, 46]))
-            self.append_aver_cur_data_transmission(float(data_csv.iat[5, 47]))
-            self.append_energy_data_reception(float(data_csv.iat[5, 48]))
-            self.append_time_data_reception(float(data_csv.iat[5, 49]))
-            self.append_sending_castle_time(0)
-            self.append_sending_castle_energy(0)
-            self.append_sending_castle_energy_max(0)
-            self.determine_sending_message(0)
+        self.__energy_wut_data = boards.wut_energy.tolist()
+        self.__time_wut_data = boards.wut_time.tolist()
+        self.__aver_cur_data_transmission = boards.tx_current.tolist()
+        self.__energy_data_reception = boards.rx_energy.tolist()
+        self.__time_data_reception = boards.rx_time.tolist()
 
         # Collect Data storage informations
         if self.get_data_acc() is True:
-            for id_c in range(len(id_config)):
-                if id_c != 0:
-                    self.append_number_storing_msg(0)
-                    if id_config[id_c] != 1000:
-                        self.append_time_store_data(float(data_csv.iat[id_config[id_c], 34]))
-                        self.append_energy_store_data(float(data_csv.iat[id_config[id_c], 33]))
-                    else:
-                        self.append_time_store_data(0)
-                        self.append_energy_store_data(0)
+            self.__number_storing_msg = [0] * len(self.__id)
+            self.__time_store_data = boards.store_time.tolist()
+            self.__energy_store_data = boards.store_energy.tolist()
 
         # Collect Static Power for all the system
-        self.append_time_static_energy(0)
-        self.append_time_dyn_data_energy(0)
-        for id_c in range(len(id_config)):
-            if id_config[id_c] != 1000:
-                self.append_power_static_energy((float(data_csv.iat[id_config[id_c], 7]))*3.3) # in uW
-            else:
-                self.append_power_static_energy(0)
-
-            self.append_time_static_energy(0)
-            self.append_time_dyn_data_energy(0)
+        self.__power_static_energy = boards.static_power.tolist()  # in uW
 
         # Determine Characteristics of the WUM event
-        self.set_energy_wum(float(data_csv.iat[id_config[0], 13]))
-        self.set_time_wum(float(data_csv.iat[id_config[0], 14]))
+        self.set_energy_wum(boards.wum_energy)
+        self.set_time_wum(boards.wum_time)
 
         # Collect boards name for the description
         Texte1 = str()
-        for id_c in range(len(id_config)):
-            if id_c != 0 and id_config[id_c] != 1000:
-                self.append_id_name(str(data_csv.iat[id_config[id_c], 4]))
-                Texte1 += 'Board ' + str(id_c) + ' -> ' + str(self.get_id_name(id_c - 1)) + '\n'
+        for id_c, name in zip([idc for idc in range(len(self.__id)) if self.get_id(idc) is not False], boards.names):
+            self.append_id_name(name)
+            Texte1 += 'Board ' + str(id_c + 1) + ' -> ' + str(name) + '\n'
         self.description_config.setText(Texte1)
 
         # Determine the status LoRa castle
-        self.set_wut_st_time(float(data_csv.iat[id_config[0], 36]))
-        self.set_wut_st_energy(float(data_csv.iat[id_config[0], 35]))
-        self.set_data_tx_st_aver_cur(float(data_csv.iat[id_config[0], 37]))
-        self.set_data_rx_st_time(float(data_csv.iat[id_config[0], 39]))
-        self.set_data_rx_st_energy(float(data_csv.iat[id_config[0], 38]))
-
-        self.determine_status_message()
+        self.set_wut_st_time(boards.st_wut_time)
+        self.set_wut_st_energy(boards.st_wut_energy)
+        self.set_data_tx_st_aver_cur(boards.st_tx_current)
+        self.set_data_rx_st_time(boards.st_rx_time)
+        self.set_data_rx_st_energy(boards.st_rx_energy)
 
         # Récupérer la période des thresholds en ms
-        id_c = 1
-        while id_c < len(id_config):
-            if id_config[id_c] != 1000 and id_config[id_c] != 0 and self.get_thresholds(id_c - 1) is not False:
-                self.append_threshold_interval(int(data_csv.iat[id_config[id_c], 50]))
-            elif id_config[id_c] != 0:
-                self.append_threshold_interval(0)
-            id_c += 1
+        self.__threshold_interval = boards.threshold_interval.astype(int).tolist()
 
         # Collect all data and build the table
         data_label = []
         data_label_total = []
         data_header = [[], [], [], [], [], []]
         data_value = [[], [], [], [], [], []]
-        data_value_nb = [[], [], [], [], [], []]
         data_total = [[], [], [], [], [], []]
         value_tempo = 0
         data_label_title = ['    -    Motherboard Wakes Up',
@@ -449,7 +384,6 @@ class PowerReport(QWidget):
         scrollDataWidget.setWidgetResizable(True)
         scrollDataWidget.setWidget(dataWidget)
 
-        column_dep = 5        # We begin at the column n°6
         section = 1           # 6 sections (without the data castle section)
         number_rows = 0       # 6 rows by sections
 
@@ -482,19 +416,17 @@ class PowerReport(QWidget):
                         QLabel(self.tr('Motherboard\nAlone')))  # Item data_header (id_c+section)
                 else:
                     data_header[section - 1].append(QLabel(  # Item data_header (id_c+section)
-                        self.tr(str(data_csv.iat[id_config[id_c], 4]) + '\nBoard')))
+                        self.tr(profiles.names[id_config[id_c]] + '\nBoard')))
 
                 if id_config[id_c] != 1000:
                     # Aver. Current Value
-                    value_tempo = data_csv.iat[id_config[id_c], column_dep + 2 + ((section - 1) * 5)]
-                    if value_tempo == 'No data':
+                    value_tempo = float(profiles.average_current[id_config[id_c], section - 1])
+                    if math.isnan(value_tempo):
                         data_value[section - 1].append(
-                            QLabel(self.tr(value_tempo)))  # Item data_value[section-1][id_c*4]
-                        data_value_nb[section - 1].append(0)  # Item data_value_nb[section-1][id_c*4]
+                            QLabel(self.tr(MeasurementTable.NO_DATA)))  # Item data_value[section-1][id_c*4]
                     else:
                         value_tempo = float(value_tempo)
                         data_total[section - 1][0] += value_tempo
-                        data_value_nb[section - 1].append(value_tempo)
                         self.data_pdf[self.section_pdf[section-1]+ligne_pdf][1] = str(round(value_tempo, 2))
                         if value_tempo // 1000 >= 1.0:
                             value_tempo /= 1000
@@ -503,15 +435,13 @@ class PowerReport(QWidget):
                             data_value[section - 1].append(QLabel(self.tr(str(round(value_tempo, 2)) + ' uA')))
 
                     # Max. Current Value
-                    value_tempo = data_csv.iat[id_config[id_c], column_dep + ((section - 1) * 5)]
-                    if value_tempo == 'No data':
+                    value_tempo = float(profiles.peak_current[id_config[id_c], section - 1])
+                    if math.isnan(value_tempo):
                         data_value[section - 1].append(
-                            QLabel(self.tr(value_tempo)))  # Item data_value[section-1][(id_c*4)+1]
-                        data_value_nb[section - 1].append(0)  # Item data_value_nb[section-1][(id_c*4)+1]
+                            QLabel(self.tr(MeasurementTable.NO_DATA)))  # Item data_value[section-1][(id_c*4)+1]
                     else:
                         value_tempo = float(value_tempo)
                         data_total[section - 1][1] += value_tempo
-                        data_value_nb[section - 1].append(value_tempo)
                         if value_tempo > self.get_max_peak_value():
                             self.set_max_peak_value(value_tempo)
                         if value_tempo // 1000 >= 1.0:
@@ -521,26 +451,22 @@ class PowerReport(QWidget):
                             data_value[section - 1].append(QLabel(self.tr(str(round(value_tempo, 2)) + ' uA')))
 
                     # Energy
-                    value_tempo = data_csv.iat[id_config[id_c], column_dep + 3 + ((section - 1) * 5)]
-                    if value_tempo == 'No data':
+                    value_tempo = float(profiles.energy[id_config[id_c], section - 1])
+                    if math.isnan(value_tempo):
                         data_value[section - 1].append(
-                            QLabel(self.tr(value_tempo)))  # Item data_value[section-1][(id_c*4)+2]
-                        data_value_nb[section - 1].append(0)  # Item data_value_nb[section-1][(id_c*4)+2]
+                            QLabel(self.tr(MeasurementTable.NO_DATA)))  # Item data_value[section-1][(id_c*4)+2]
                     else:
                         data_total[section - 1][2] += float(value_tempo)
                         data_value[section - 1].append(QLabel(self.tr((str(round(float(value_tempo), 2))) + ' uWh')))
-                        data_value_nb[section - 1].append(float(value_tempo))
                         self.data_pdf[self.section_pdf[section-1]+ligne_pdf][4] = str(round(float(value_tempo), 2))
 
                     # Interval time
-                    value_tempo = data_csv.iat[id_config[id_c], column_dep + 4 + ((section - 1) * 5)]
-                    if value_tempo == 'No data':
+                    value_tempo = float(profiles.interval[id_config[id_c], section - 1])
+                    if math.isnan(value_tempo):
                         data_value[section - 1].append(
-                            QLabel(self.tr(value_tempo)))  # Item data_value[section-1][(id_c*4)+3]
-                        data_value_nb[section - 1].append(0)  # Item data_value_nb[section-1][(id_c*4)+3]
+                            QLabel(self.tr(MeasurementTable.NO_DATA)))  # Item data_value[section-1][(id_c*4)+3]
                     else:
                         value_tempo = float(value_tempo)
-                        data_value_nb[section - 1].append(float(value_tempo))
                         self.data_pdf[self.section_pdf[section-1]+ligne_pdf][2] = str(round(value_tempo, 2))
                         if value_tempo // 1000 >= 1.0:
                             value_tempo /= 1000
@@ -590,51 +516,35 @@ class PowerReport(QWidget):
             section += 1
             number_rows += 6
 
-        for id_c in range(len(self.__id)):
-            if self.get_poll_interval(id_c) is not False:
-                self.append_energy_polling_occurs(nb=data_value_nb[4][((id_c + 1) * 4) + 2])
-                self.append_time_polling_occurs(nb=data_value_nb[4][((id_c + 1) * 4) + 3])
-            else:
-                self.append_energy_polling_occurs(nb=0)
-                self.append_time_polling_occurs(nb=0)
-
-            if self.get_thresholds(id_c) is not False:
-                self.append_energy_thresh_not_exceeded(nb=data_value_nb[2][((id_c + 1) * 4) + 2])
-                self.append_time_thresh_not_exceeded(nb=data_value_nb[2][((id_c + 1) * 4) + 3])
-                self.append_energy_thresh_exceeded(nb=data_value_nb[3][((id_c + 1) * 4) + 2])
-                self.append_time_thresh_exceeded(nb=data_value_nb[3][((id_c + 1) * 4) + 3])
-            elif self.get_id(id_c) == 1:  # Exception for the buttons board...
-                self.append_energy_thresh_not_exceeded(nb=0)
-                self.append_time_thresh_not_exceeded(nb=0)
-                self.append_energy_thresh_exceeded(nb=data_value_nb[3][((id_c + 1) * 4) + 2])
-                self.append_time_thresh_exceeded(nb=data_value_nb[3][((id_c + 1) * 4) + 3])
-            else:
-                self.append_energy_thresh_not_exceeded(nb=0)
-                self.append_time_thresh_not_exceeded(nb=0)
-                self.append_energy_thresh_exceeded(nb=0)
-                self.append_time_thresh_exceeded(nb=0)
+        # Collect the polling and threshold events of every board
+        self.__energy_polling_occurs = boards.poll_energy.tolist()
+        self.__time_polling_occurs = boards.poll_time.tolist()
+        self.__energy_thresh_not_exceeded = boards.th_not_exceeded_energy.tolist()
+        self.__time_thresh_not_exceeded = boards.th_not_exceeded_time.tolist()
+        self.__energy_thresh_exceeded = boards.th_exceeded_energy.tolist()
+        self.__time_thresh_exceeded = boards.th_exceeded_time.tolist()
 
         return scrollDataWidget
 
         # --------------------------------------------------------------------------------------------------------------
 
     def collect_csv(self):
-        """Upload the csv file stored in GitHub"""
+        """Load the board profiles from the csv file stored in GitHub (cached on disk)"""
 
         try:
-            req = requests.get(URL_GITHUB)
-        except requests.exceptions.ConnectionError:
+            return BoardProfiles.load_profiles()
+        except MeasurementTable.DataUnavailableError:
             print("Error - No connection !")
-            error_window = QErrorMessage()
+            error_window = QErrorMessage(self)
             error_window.setWindowTitle("Error")
             error_window.showMessage("Hum... There is a problem with your Internet connection")
-
-        page = req.content
-        soup = BeautifulSoup(page, 'html.parser')
-        soup_str = soup.get_text()
-        soup_str_io = io.StringIO(soup_str)
-        data = pd.read_csv(soup_str_io, sep=";", skiprows=7)
-        return data
+            raise
+        except MeasurementTable.SchemaError as e:
+            print("Error - Unexpected measurement table !")
+            error_window = QErrorMessage(self)
+            error_window.setWindowTitle("Error")
+            error_window.showMessage("The measurement table has an unexpected layout: " + str(e))
+            raise
 
     def config_graphic_widget(self):
         """Build the LoRa castle widget"""
@@ -653,9 +563,8 @@ class PowerReport(QWidget):
         scrollGraphicsWidget.setWidget(graphicsWidget)
 
         # Status Message
-        data_tx_time = self.determine_airtime_lora(payload_size=(7 + len(self.__id_name)), st=True)  # in ms
-        data_tx_energy = (((self.get_data_tx_st_aver_cur() / 1000000) * 3.3 * (
-                data_tx_time / 1000)) / 3600) * 1000000  # in uWh
+        data_tx_time = float(self.__evaluation.result.st_tx_time)        # in ms
+        data_tx_energy = float(self.__evaluation.result.st_tx_energy)    # in uWh
 
         title_status_message = QLabel(self.tr('Status Message'))
         title_status_message.setStyleSheet(
@@ -695,9 +604,8 @@ class PowerReport(QWidget):
         graphics.addWidget(self.value_total_time_1, 5, 5)
 
         if self.get_data_acc() is True:    # Accumulated Message
-            time_data_tx = self.determine_airtime_lora(payload_size=self.get_lora_acc_thresholds())
-            energy_data_tx = (((time_data_tx / 1000) * 3.3 * (
-                    self.get_aver_cur_data_transmission(0) / 1000000)) / 3600) * 1000000
+            time_data_tx = float(self.__evaluation.result.castle_tx_time[0])
+            energy_data_tx = float(self.__evaluation.result.castle_tx_energy[0])
 
             title_acc_message = QLabel(self.tr('Accumulated Message'))
             title_acc_message.setStyleSheet(
@@ -760,9 +668,8 @@ class PowerReport(QWidget):
             self.value_number_msg = []
             nb_rows = 6
             for board in range(len(self.__id_name)):
-                time_data_tx = self.determine_airtime_lora(payload_size=(2 + (2 * (self.get_number_metrics(board)))))
-                energy_data_tx = (((time_data_tx / 1000) * 3.3 * (
-                        self.get_aver_cur_data_transmission(board) / 1000000)) / 3600) * 1000000
+                time_data_tx = float(self.__evaluation.result.castle_tx_time[board])
+                energy_data_tx = float(self.__evaluation.result.castle_tx_energy[board])
                 title_normal_message.append(QLabel(self.tr('Normal Message  -  '+self.get_id_name(board))))
                 title_normal_message[board].setStyleSheet(
                     "border-bottom-width: 1px; border-bottom-style: solid; border-radius: 0px;"
@@ -825,7 +732,7 @@ class PowerReport(QWidget):
                 button_label = QLabel(self.tr('Number of times buttons are pressed: '))
                 self.button_choice = QSpinBox()
                 self.button_choice.setMaximum(100000)
-                self.button_choice.valueChanged.connect(self.update_values)
+                self.button_choice.valueChanged.connect(self.schedule_update)
 
                 event_box.addWidget(button_title, 0, 0)
                 event_box.addWidget(button_label, 1, 0)
@@ -846,7 +753,7 @@ class PowerReport(QWidget):
                     power_label_th_e = QLabel(self.tr('Number of exceeded thresholds:'))
                     self.power_choice = QSpinBox()
                     self.power_choice.setMaximum(self.get_number_thresh_not_exceeded(id_c))
-                    self.power_choice.valueChanged.connect(self.update_values)
+                    self.power_choice.valueChanged.connect(self.schedule_update)
                     event_box.addWidget(power_label_th_ne, 4, 0)
                     event_box.addWidget(self.power_label_th_ne_nb, 4, 1)
                     event_box.addWidget(power_label_th_e, 5, 0)
@@ -865,11 +772,11 @@ class PowerReport(QWidget):
                     sound_label_th_ne = QLabel(self.tr('Number of non-exceeded thresholds: '))
                     self.sound_choice_th_ne = QSpinBox()
                     self.sound_choice_th_ne.setMaximum(100000)
-                    self.sound_choice_th_ne.valueChanged.connect(self.update_values)
+                    self.sound_choice_th_ne.valueChanged.connect(self.schedule_update)
                     sound_label_th_e = QLabel(self.tr('Number of exceeded thresholds:'))
                     self.sound_choice_th_e = QSpinBox()
                     self.sound_choice_th_e.setMaximum(100000)
-                    self.sound_choice_th_e.valueChanged.connect(self.update_values)
+                    self.sound_choice_th_e.valueChanged.connect(self.schedule_update)
                     event_box.addWidget(sound_label_th_ne, 8, 0)
                     event_box.addWidget(self.sound_choice_th_ne, 8, 1)
                     event_box.addWidget(sound_label_th_e, 9, 0)
@@ -888,11 +795,11 @@ class PowerReport(QWidget):
                     environmental_label_th_ne = QLabel(self.tr('Number of non-exceeded thresholds: '))
                     self.environmental_choice_th_ne = QSpinBox()
                     self.environmental_choice_th_ne.setMaximum(100000)
-                    self.environmental_choice_th_ne.valueChanged.connect(self.update_values)
+                    self.environmental_choice_th_ne.valueChanged.connect(self.schedule_update)
                     environmental_label_th_e = QLabel(self.tr('Number of exceeded thresholds:'))
                     self.environmental_choice_th_e = QSpinBox()
                     self.environmental_choice_th_e.setMaximum(100000)
-                    self.environmental_choice_th_e.valueChanged.connect(self.update_values)
+                    self.environmental_choice_th_e.valueChanged.connect(self.schedule_update)
                     event_box.addWidget(environmental_label_th_ne, 8, 0)
                     event_box.addWidget(self.environmental_choice_th_ne, 8, 1)
                     event_box.addWidget(environmental_label_th_e, 9, 0)
@@ -910,7 +817,7 @@ class PowerReport(QWidget):
         self.lora_spread_fact.setValue(11)
         self.lora_spread_fact.setFocusPolicy(Qt.NoFocus)
         self.lora_spread_fact.setPageStep(1)
-        self.lora_spread_fact.valueChanged.connect(self.update_values)
+        self.lora_spread_fact.valueChanged.connect(self.schedule_update)
 
         event_box.addWidget(lora_spread_fact_label, 11, 0)
         event_box.addWidget(self.lora_spread_fact, 12, 0)
@@ -923,205 +830,94 @@ class PowerReport(QWidget):
 
         return scroll_event_widget
 
-    def determine_airtime_lora(self, payload_size, st=False):
-        """Determine Air Time for the LoRa castle (TX time)"""
-        # Inspired by code from GillesC
-        # https://github.com/GillesC/LoRaEnergySim/blob/master/Framework/LoRaPacket.py
-        n_pream = 8  # https://www.google.com/patents/EP2763321A1?cl=en
-        t_sym = (2.0 ** self.get_lora_spread_factor()) / 125
-        t_pream = (n_pream + 4.25) * t_sym
-        if self.get_lora_spread_factor() >= 11:
-            LDR_opt = 1  # Low Data Rate optimisation
-        else:
-            LDR_opt = 0
-
-        payload_symb_n_b = 8 + max(
-            math.ceil(
-                (8.0 * payload_size - 4.0 * self.get_lora_spread_factor() + 28 + 16) / (4.0 * (
-                        self.get_lora_spread_factor() - 2 * LDR_opt))) * (1 + 4), 0)
-        t_payload = payload_symb_n_b * t_sym
-
-        if self.get_data_acc() is False:
-            t_error = ERROR_DATA_TX_TIME[self.get_lora_spread_factor()-7]
-        elif st is True:
-            t_error = ERROR_DATA_TX_TIME[self.get_lora_spread_factor() - 7]
-        else:
-            t_error = ERROR_DATA_TX_TIME_ACC[self.get_lora_spread_factor()-7]
+    def evaluate(self):
+        """Evaluate the energy model with the current event choices, return the changed quantities"""
+        return self.apply_results(self.__evaluation.update(*self.model_inputs()))
 
-        return t_pream + t_payload + t_error
+    def model_inputs(self):
+        """Inputs of the energy model for the current event choices"""
+        return (self.get_lora_spread_factor(),
+                list(self.__number_thresh_exceeded), list(self.__number_thresh_not_exceeded))
 
-    def determine_status_message(self):
-        """Determine total energy and time for the status message"""
-
-        data_tx_time = self.determine_airtime_lora(payload_size=(7 + len(self.__id_name)), st=True)  # in ms
-        data_tx_energy = (((self.get_data_tx_st_aver_cur() / 1000000) * 3.3 * (
-                    data_tx_time / 1000)) / 3600) * 1000000  # in uWh
-        data_tx_energy_max = ((((self.get_data_tx_st_aver_cur()+ERROR_AVER_CUR_TX) / 1000000) * 3.3 * (
-                data_tx_time / 1000)) / 3600) * 1000000  # in uWh
-
-        total_time = self.get_wut_st_time() + data_tx_time + self.get_data_rx_st_time()
-        total_energy = self.get_wut_st_energy() + data_tx_energy + self.get_data_rx_st_energy()
-        total_energy_max = self.get_wut_st_energy() + data_tx_energy_max + self.get_data_rx_st_energy()
-
-        self.set_time_st(total_time)
-        self.set_energy_st(total_energy)
-        self.set_energy_st_max(total_energy_max)
-
-    def determine_sending_message(self, id):
-        """Determine normal LoRa message for a specific ID (or for the accumulated msg)"""
-
-        if self.get_data_acc() is False:
-            time_data_tx = self.determine_airtime_lora(payload_size=(2 + (2 * (self.get_number_metrics(id)))))
-        else:
-            time_data_tx = self.determine_airtime_lora(payload_size=self.get_lora_acc_thresholds())
-
-        energy_data_tx = (((time_data_tx / 1000) * 3.3 * (
-                self.get_aver_cur_data_transmission(id) / 1000000)) / 3600) * 1000000
-
-        energy_data_tx_max = (((time_data_tx / 1000) * 3.3 * (
-                (self.get_aver_cur_data_transmission(id)+ERROR_AVER_CUR_TX) / 1000000)) / 3600) * 1000000
-
-        self.set_sending_castle_time(id,
-                                     self.get_time_wut_data(id) + self.get_time_data_reception(id) + time_data_tx)
-        self.set_sending_castle_energy(id,
-                                       self.get_energy_wut_data(id) + self.get_energy_data_reception(id) + energy_data_tx)
-        self.set_sending_castle_energy_max(id,
-                                       self.get_energy_wut_data(id) + self.get_energy_data_reception(
-                                           id) + energy_data_tx_max)
-
-    def determine_static_energy(self):
-        """Determine the static energy for the entire system"""
-
-        # ---- Determine Static Time ---- [ms]
-        static_time = 86400000
-        self.set_time_static_energy(0, 86400000-self.get_time_dyn_data_energy(0)-self.get_dyn_send_time())
-        self.data_pdf[0][3] = round(86400000-self.get_time_dyn_data_energy(0)-self.get_dyn_send_time(), 2)
-        static_time = static_time - self.get_time_dyn_data_energy(0) - self.get_dyn_send_time()
-        for idc in range(len(self.__id)):
-            self.set_time_static_energy(idc+1, 86400000-self.get_time_dyn_data_energy(idc+1))
-            if self.__id[idc] is not False:
-                self.data_pdf[idc+1][3] = round(86400000-self.get_time_dyn_data_energy(idc+1), 2)
-            static_time -= self.get_time_dyn_data_energy(idc+1)
-
-        # ---- Determine Static Energy ---- [uWh]
-        static_energy = 0
-        static_energy_max = 0
-        static_energy_min = 0
-        static_energy += self.get_power_static_energy(0)*self.get_time_static_energy(0)
+    def evaluate_background(self, inputs):
+        """Evaluate the energy model in the worker thread and post the changed quantities to the GUI thread"""
+        try:
+            changed = self.__evaluation.update(*inputs)
+        except Exception:
+            traceback.print_exc()
+            changed = set()
+        if not self.__closed:
+            self.evaluated.emit(changed)
+
+    def apply_results(self, changed):
+        """Keep the quantities of the last evaluation changed, return them"""
+        result = self.__evaluation.result
+
+        # LoRa castles
+        if 'status' in changed:
+            self.set_time_st(float(result.time_st))
+            self.set_energy_st(float(result.energy_st))
+            self.set_energy_st_max(float(result.energy_st_max))
+        if 'castles' in changed:
+            self.__sending_castle_time = result.castle_time.tolist()
+            self.__sending_castle_energy = result.castle_energy.tolist()
+            self.__sending_castle_energy_max = result.castle_energy_max.tolist()
+
+        # Data accumulation
+        if self.get_data_acc() is True and 'storing' in changed:
+            self.__number_storing_msg = result.number_storing.tolist()
+            self.set_acc_data_send_nb(int(result.acc_data_send_nb))
+
+        # Dynamic energy
+        if 'dyn_data' in changed:
+            self.__time_dyn_data_energy = result.dyn_data_time.tolist()
+            self.set_dyn_data_energy(float(result.dyn_data_energy))
+        if 'dyn_send' in changed:
+            self.set_dyn_send_time(float(result.dyn_send_time))
+            self.set_dyn_send_energy(float(result.dyn_send_energy))
+            self.set_dyn_send_energy_max(float(result.dyn_send_energy_max))
+
+        if 'total' not in changed:
+            return changed
+
+        # Static energy
+        self.__time_static_energy = result.static_board_time.tolist()
+        self.set_static_energy(float(result.static_energy))
+        self.set_static_energy_max(float(result.static_energy_max))
+        self.set_static_energy_min(float(result.static_energy_min))
+        self.set_static_time(float(result.static_time))
+        self.data_pdf[0][3] = round(self.get_time_static_energy(0), 2)
         self.data_pdf[0][5] = round((self.get_power_static_energy(0)*self.get_time_static_energy(0)/3600000), 2)
-        static_energy_max += (((self.get_power_static_energy(
-            0)/3.3)+ERROR_AVER_CUR_SLEEP)*3.3)*self.get_time_static_energy(0)
-        static_energy_min += (((self.get_power_static_energy(
-            0)/3.3)-ERROR_AVER_CUR_SLEEP)*3.3)*self.get_time_static_energy(0)
-
         for idc in range(len(self.__id)):
-            static_energy += self.get_power_static_energy(idc+1)*self.get_time_static_energy(idc+1)
-            static_energy_max += (((self.get_power_static_energy(
-                idc+1) / 3.3) + ERROR_AVER_CUR_SLEEP) * 3.3) * self.get_time_static_energy(idc+1)
-            static_energy_min += (((self.get_power_static_energy(
-                idc+1) / 3.3) - ERROR_AVER_CUR_SLEEP) * 3.3) * self.get_time_static_energy(idc+1)
-
             if self.get_id(idc) is not False:
-                if self.get_id_name(idc) == 'Sound':              # Disabling the microphone after an exceeded threshold
-                    static_energy -= ((21.6*3.3)*64000)*self.get_number_thresh_exceeded(idc)
-                    static_energy_max -= ((21.6*3.3)*64000)*self.get_number_thresh_exceeded(idc)
-                    static_energy_min -= ((21.6*3.3)*64000) * self.get_number_thresh_exceeded(idc)
-            if self.get_id(idc) is not False:
-                self.data_pdf[idc+1][5] = round((self.get_power_static_energy(idc+1) * self.get_time_static_energy(idc+1) / 3600000),
-                                          2)
-
-        self.set_static_energy(static_energy/3600000)
-        self.set_static_energy_max(static_energy_max/3600000)
-        self.set_static_energy_min(static_energy_min/3600000)
-        self.set_static_time(static_time)
-
-    def determine_dynamic_data_energy(self):
-        """Determine the data dynamic energy for the entire system"""
-
-        # ---- Determine Dynamic Data Time ---- [ms]
-        # For Motherboard
-        dynamic_time = 0
-        dynamic_time += self.get_number_wum()*self.get_time_wum()
-        if self.get_data_acc() is True:
-            for idc in range(len(self.__id)):
-                if self.get_id(idc) is not False:
-                    dynamic_time += self.get_number_storing_msg(idc)*self.get_time_store_data(idc)
-
-        self.set_time_dyn_data_energy(0, dynamic_time)
-
-        # For other boards
-        for idc in range(len(self.__id)):
-            dynamic_time = 0
-            dynamic_time += self.get_number_polling_occurs(idc)*self.get_time_polling_occurs(idc)
-            dynamic_time += self.get_number_thresh_not_exceeded(idc)*self.get_time_thresh_not_exceeded(idc)
-            dynamic_time += self.get_number_thresh_exceeded(idc)*self.get_time_thresh_exceeded(idc)
-            self.set_time_dyn_data_energy(idc+1, dynamic_time)
-
-        # ---- Determine Dynamic Data Energy ---- [uWh]
-        dynamic_energy = 0
-        # For Motherboard
-        dynamic_energy += self.get_number_wum()*self.get_energy_wum()
-        if self.get_data_acc() is True:
-            for idc in range(len(self.__id)):
-                if self.get_id(idc) is not False:
-                    dynamic_energy += self.get_number_storing_msg(idc)*self.get_energy_store_data(idc)
-
-        # For other boards
-        for idc in range(len(self.__id)):
-            dynamic_energy += self.get_number_polling_occurs(idc)*self.get_energy_polling_occurs(idc)
-            dynamic_energy += self.get_number_thresh_not_exceeded(idc)*self.get_energy_thresh_not_exceeded(idc)
-            dynamic_energy += self.get_number_thresh_exceeded(idc)*self.get_energy_thresh_exceeded(idc)
-
-        self.set_dyn_data_energy(dynamic_energy)
-
-    def determine_dynamic_send_energy(self):
-        """Determine the sending dynamic energy for the entire system"""
-
-        # ---- Determine Dynamic Send Time ---- [ms]
-        # For Motherboard
-        dynamic_time = 0
-        dynamic_time += self.get_time_st()
-        if self.get_data_acc() is True:
-            dynamic_time += self.get_acc_data_send_nb()*self.get_sending_castle_time(0)
-        else:
-            for idc in range(len(self.__id)):
-                dynamic_time += self.get_number_thresh_exceeded(idc)*self.get_sending_castle_time(idc)
-                dynamic_time += self.get_number_polling_occurs(idc)*self.get_sending_castle_time(idc)
-
-        self.set_dyn_send_time(dynamic_time)
-
-        # ---- Determine Dynamic Send Energy ---- [uWh]
-        # For Motherboard
-        dynamic_energy = 0
-        dynamic_energy_max = 0
-        dynamic_energy += self.get_energy_st()
-        dynamic_energy_max += self.get_energy_st_max()
-
-        if self.get_data_acc() is True:
-            dynamic_energy += self.get_acc_data_send_nb()*self.get_sending_castle_energy(0)
-            dynamic_energy_max += self.get_acc_data_send_nb() * self.get_sending_castle_energy_max(0)
-        else:
-            for idc in range(len(self.__id)):
-                dynamic_energy += self.get_number_thresh_exceeded(idc)*self.get_sending_castle_energy(idc)
-                dynamic_energy_max += self.get_number_thresh_exceeded(idc) * self.get_sending_castle_energy_max(idc)
-                dynamic_energy += self.get_number_polling_occurs(idc)*self.get_sending_castle_energy(idc)
-                dynamic_energy_max += self.get_number_polling_occurs(idc) * self.get_sending_castle_energy_max(idc)
-
-        self.set_dyn_send_energy(dynamic_energy)
-        self.set_dyn_send_energy_max(dynamic_energy_max)
-
-    def determine_total_average_cons(self):
-        """Estimate the total average consumption"""
-
-        self.determine_dynamic_data_energy()
-        self.determine_dynamic_send_energy()
-        self.determine_static_energy()
+                self.data_pdf[idc+1][3] = round(self.get_time_static_energy(idc+1), 2)
+                self.data_pdf[idc+1][5] = round((self.get_power_static_energy(idc+1) *
+                                                 self.get_time_static_energy(idc+1) / 3600000), 2)
+
+        # Total average consumption
+        self.set_total_aver_cons(float(result.total_aver_cons))
+        self.set_total_aver_cons_max(float(result.total_aver_cons_max))
+        self.set_total_aver_cons_min(float(result.total_aver_cons_min))
+        self.determine_lifetime()
 
-        self.set_total_aver_cons(self.get_static_energy()+self.get_dyn_data_energy()+self.get_dyn_send_energy())
-        self.set_total_aver_cons_max(
-            self.get_static_energy_max()+self.get_dyn_data_energy()+self.get_dyn_send_energy_max())
-        self.set_total_aver_cons_min(
-            self.get_static_energy_min() + self.get_dyn_data_energy() + self.get_dyn_send_energy())
+        return changed
+
+    def set_label(self, label, text):
+        """Repaint a label only when its text changes"""
+        text = self.tr(text)
+        if label.text() != text:
+            label.setText(text)
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        """Stop the worker thread"""
+        self.__closed = True
+        self.__update_timer.stop()
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+        self.__evaluating = False
+        self.__update_pending = False
+        event.accept()
 
     def on_exit_button(self):
         """Close the window"""
@@ -1129,6 +925,7 @@ class PowerReport(QWidget):
 
     def on_print_button(self):
         """Print a PDF report"""
+        import ReportPDF  # reportlab is only needed here
         filepath, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "PDF(*.pdf) ")
         if filepath == "":
             return
@@ -1146,17 +943,23 @@ class PowerReport(QWidget):
             error_window.setWindowTitle("Error")
             error_window.showMessage(err)
 
+    def schedule_update(self):
+        """Evaluate the event choices at the next frame, with the values they have then"""
+        if not self.__update_timer.isActive():
+            self.__update_timer.start()
+
     def update_values(self):
         """Set the new values depending on the event choices"""
+        if self.__closed:
+            return
+        if self.__evaluating:
+            # Only the latest choices are evaluated, when the running evaluation is done
+            self.__update_pending = True
+            return
+
         # Update LoRa settings
         self.set_lora_spread_factor(self.lora_spread_fact.value())
-        self.lora_spread_fact_nb_label.setText(self.tr(str(self.get_lora_spread_factor())))
-        if self.get_data_acc() is False:
-            for id_c in range(len(self.__id_name)):
-                self.determine_sending_message(id_c)
-        else:
-            self.determine_sending_message(0)
-        self.determine_status_message()
+        self.set_label(self.lora_spread_fact_nb_label, str(self.get_lora_spread_factor()))
 
         # Update Thresholds numbers
         for id_c in range(len(self.__id_name)):
@@ -1169,7 +972,7 @@ class PowerReport(QWidget):
                             self.get_number_possible_thresh(id_c) - self.get_number_thresh_exceeded(id_c)))
                     if self.get_number_thresh_not_exceeded(idx=id_c) < 0:
                         self.set_number_thresh_not_exceeded(idx=id_c, nb=0)
-                    self.power_label_th_ne_nb.setText(str(self.get_number_thresh_not_exceeded(idx=id_c)))
+                    self.set_label(self.power_label_th_ne_nb, str(self.get_number_thresh_not_exceeded(idx=id_c)))
             elif self.get_id_name(id_c) == 'Sound':
                 if self.get_thresholds(id_c) is not False:
                     self.set_number_thresh_exceeded(idx=id_c, nb=self.sound_choice_th_e.value())
@@ -1179,83 +982,92 @@ class PowerReport(QWidget):
                     self.set_number_thresh_exceeded(idx=id_c, nb=self.environmental_choice_th_e.value())
                     self.set_number_thresh_not_exceeded(idx=id_c, nb=self.environmental_choice_th_ne.value())
 
-        if self.get_data_acc() is not False:
-            self.determine_number_acc_send()
-            self.determine_number_storing_msg()
-
-        # Update total average consumption
-        self.determine_total_average_cons()
-        self.average_total_consumption.setText(self.tr(str(round(self.get_total_aver_cons(), 2)) + ' uWh'))
-        self.average_total_consumption_max.setText(self.tr(str(round(self.get_total_aver_cons_max(), 2)) + ' uWh'))
-        self.average_total_consumption_min.setText(self.tr(str(round(self.get_total_aver_cons_min(), 2)) + ' uWh'))
-
-        # Update sleep time value
-        self.set_percent_static_time(round(self.get_static_time() / 864000, 3))
-        self.sleep_time_value_label.setText(
-            self.tr(self.better_sleep_time(int(self.get_static_time() / 1000)) + ' (' + str(
-                self.get_percent_static_time()) + ' %)'))
-
-        # Update lifetime
-        self.determine_lifetime()
-        self.lifetime_value_label.setText(self.tr(
-            str(self.get_life_estimation()) + ' (min: ' + str(self.get_life_estimation_min()) + ')'))
+        # Update the model in the worker thread, only the quantities depending on the changed choices are computed
+        # again
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(max_workers=1)
+        self.__evaluating = True
+        self.__executor.submit(self.evaluate_background, self.model_inputs())
+
+    def on_evaluated(self, changed):
+        """Show the results of the worker thread, all the labels at once"""
+        if self.__closed:
+            # finished after the window was closed
+            return
+        self.__evaluating = False
+        self.apply_results(changed)
+        self.update_labels(changed)
+
+        if self.__update_pending:
+            self.__update_pending = False
+            self.update_values()
+
+    def update_labels(self, changed):
+        """Repaint the labels of the changed quantities"""
+        if 'total' in changed:
+            # Update total average consumption
+            self.set_label(self.average_total_consumption, str(round(self.get_total_aver_cons(), 2)) + ' uWh')
+            self.set_label(self.average_total_consumption_max, str(round(self.get_total_aver_cons_max(), 2)) + ' uWh')
+            self.set_label(self.average_total_consumption_min, str(round(self.get_total_aver_cons_min(), 2)) + ' uWh')
+
+            # Update sleep time value
+            self.set_percent_static_time(round(self.get_static_time() / 864000, 3))
+            self.set_label(self.sleep_time_value_label, self.better_sleep_time(int(self.get_static_time() / 1000))
+                           + ' (' + str(self.get_percent_static_time()) + ' %)')
+
+            # Update lifetime
+            self.set_label(self.lifetime_value_label,
+                           str(self.get_life_estimation()) + ' (min: ' + str(self.get_life_estimation_min()) + ')')
 
         # Update LoRa castles
-        self.update_castles()
+        if changed & {'status', 'castles', 'storing', 'thresh_exceeded'}:
+            self.update_castles()
 
-        self.debug()
+        if changed:
+            self.debug()
 
     def update_castles(self):
         """Update the LoRa castles characteristics"""
+        result = self.__evaluation.result
+
         # Status Message
-        data_tx_time = self.determine_airtime_lora(payload_size=(7 + len(self.__id_name)), st=True)  # in ms
-        data_tx_energy = (((self.get_data_tx_st_aver_cur() / 1000000) * 3.3 * (
-                data_tx_time / 1000)) / 3600) * 1000000  # in uWh
+        data_tx_time = float(result.st_tx_time)        # in ms
+        data_tx_energy = float(result.st_tx_energy)    # in uWh
 
-        self.value_energy_area_2.setText(self.tr(str(round(data_tx_energy, 2))))
-        self.value_time_area_2.setText(self.tr(str(round(data_tx_time, 2))))
-        self.value_total_energy_1.setText(
-            self.tr(str(round((self.get_wut_st_energy() + data_tx_energy + self.get_data_rx_st_energy()), 2))))
-        self.value_total_time_1.setText(
-            self.tr(str(round((self.get_wut_st_time() + data_tx_time + self.get_data_rx_st_time()), 2))))
+        self.set_label(self.value_energy_area_2, str(round(data_tx_energy, 2)))
+        self.set_label(self.value_time_area_2, str(round(data_tx_time, 2)))
+        self.set_label(self.value_total_energy_1,
+                       str(round((self.get_wut_st_energy() + data_tx_energy + self.get_data_rx_st_energy()), 2)))
+        self.set_label(self.value_total_time_1,
+                       str(round((self.get_wut_st_time() + data_tx_time + self.get_data_rx_st_time()), 2)))
 
         if self.get_data_acc() is True:
 
             # Accumulated Message
-            time_data_tx = self.determine_airtime_lora(payload_size=self.get_lora_acc_thresholds())
-            energy_data_tx = (((time_data_tx / 1000) * 3.3 * (
-                    self.get_aver_cur_data_transmission(0) / 1000000)) / 3600) * 1000000
-
-            self.value_energy_area_22.setText(self.tr(str(round(energy_data_tx, 2))))
-            self.value_time_area_22.setText(self.tr(str(round(time_data_tx, 2))))
-            self.value_total_energy_2.setText(
-                self.tr(
-                    str(round((self.get_energy_wut_data(0) + energy_data_tx + self.get_energy_data_reception(0)), 2))))
-            self.value_total_time_2.setText(
-                self.tr(str(round((self.get_time_wut_data(0) + time_data_tx + self.get_time_data_reception(0)), 2))))
-            self.value_number_msg.setText(self.tr(str(self.get_acc_data_send_nb())))
+            time_data_tx = float(result.castle_tx_time[0])
+            energy_data_tx = float(result.castle_tx_energy[0])
+
+            self.set_label(self.value_energy_area_22, str(round(energy_data_tx, 2)))
+            self.set_label(self.value_time_area_22, str(round(time_data_tx, 2)))
+            self.set_label(self.value_total_energy_2, str(round(
+                (self.get_energy_wut_data(0) + energy_data_tx + self.get_energy_data_reception(0)), 2)))
+            self.set_label(self.value_total_time_2, str(round(
+                (self.get_time_wut_data(0) + time_data_tx + self.get_time_data_reception(0)), 2)))
+            self.set_label(self.value_number_msg, str(self.get_acc_data_send_nb()))
 
         else:
-            nb_rows = 6
             for board in range(len(self.__id_name)):
-                time_data_tx = self.determine_airtime_lora(payload_size=(2 + (2 * (self.get_number_metrics(board)))))
-                energy_data_tx = (((time_data_tx / 1000) * 3.3 * (
-                        self.get_aver_cur_data_transmission(board) / 1000000)) / 3600) * 1000000
-
-                self.value_energy_area_22[board].setText(self.tr(str(round(energy_data_tx, 2))))
-                self.value_time_area_22[board].setText(self.tr(str(round(time_data_tx, 2))))
-                self.value_total_energy[board].setText(
-                    self.tr(str(
-                        round(
-                            (self.get_energy_wut_data(board) + energy_data_tx + self.get_energy_data_reception(board)),
-                            2))))
-                self.value_total_time[board].setText(
-                    self.tr(
-                        str(round((self.get_time_wut_data(board) + time_data_tx + self.get_time_data_reception(board)),
-                                  2))))
-                self.value_number_msg[board].setText(
-                    self.tr(str(self.get_number_thresh_exceeded(board) + self.get_number_polling_occurs(board))))
-                nb_rows += 7
+                time_data_tx = float(result.castle_tx_time[board])
+                energy_data_tx = float(result.castle_tx_energy[board])
+
+                self.set_label(self.value_energy_area_22[board], str(round(energy_data_tx, 2)))
+                self.set_label(self.value_time_area_22[board], str(round(time_data_tx, 2)))
+                self.set_label(self.value_total_energy[board], str(round(
+                    (self.get_energy_wut_data(board) + energy_data_tx + self.get_energy_data_reception(board)), 2)))
+                self.set_label(self.value_total_time[board], str(round(
+                    (self.get_time_wut_data(board) + time_data_tx + self.get_time_data_reception(board)), 2)))
+                self.set_label(self.value_number_msg[board],
+                               str(self.get_number_thresh_exceeded(board) + self.get_number_polling_occurs(board)))
 
     def update_pdf(self):
         """Update the PDF information"""
@@ -1350,68 +1162,19 @@ class PowerReport(QWidget):
         better_value = str('' + number_hours + 'h ' + number_min + 'm ' + number_sec + 's')
         return better_value
 
-    def determine_number_thresh_not_exceeded(self):
-        """Determine the number of not-exceeded threshold for each board"""
-        for id_c in range(len(self.__id)):
-            if self.get_id(id_c) is not False:
-                if self.get_thresholds(id_c) is True and self.get_id_name(id_c) != 'Sound':
-                    self.append_number_possible_thresh(int((86400000 / self.get_threshold_interval(id_c)
-                                                            - self.get_number_polling_occurs(id_c))))
-
-                    if self.get_number_possible_thresh(id_c) >= 0:
-                        self.append_number_thresh_not_exceeded(self.get_number_possible_thresh(id_c))
-                        self.append_number_thresh_exceeded(0)
-                    else:
-                        self.append_number_thresh_not_exceeded(0)
-                        self.append_number_thresh_exceeded(0)
-                else:
-                    self.append_number_possible_thresh(0)
-                    self.append_number_thresh_not_exceeded(0)
-                    self.append_number_thresh_exceeded(0)
-            else:
-                self.append_number_possible_thresh(0)
-                self.append_number_thresh_not_exceeded(0)
-                self.append_number_thresh_exceeded(0)
-
-    def determine_number_acc_send(self):
-        """Determine the number of accumulated message"""
-        total_nb_metrics = 0
-        for id_c in range(len(self.__id)):
-            if self.get_id(id_c) is not False:
-                total_nb_metrics += self.get_number_thresh_exceeded(id_c) * ((self.get_number_metrics(id_c)*2)+4)
-                total_nb_metrics += self.get_number_polling_occurs(id_c) * ((self.get_number_metrics(id_c)*2)+4)
-
-        self.set_acc_data_send_nb(int(total_nb_metrics / self.get_lora_acc_thresholds()))
-
-    def determine_number_storing_msg(self):
-        """Determine the number of storing event for each boards"""
-        for idc in range(len(self.__id)):
-            if self.get_id(idc) is not False:
-                total_number = 0
-                total_number += self.get_number_thresh_exceeded(idc)*self.get_number_metrics(idc)
-                if self.get_id_name(idc) == 'Sound' or self.get_id_name(idc) == 'Sound (no thresh)':     # Sound board particularity
-                    total_number += 2*(self.get_number_polling_occurs(idc)*self.get_number_metrics(idc))
-                else:
-                    total_number += self.get_number_polling_occurs(idc) * self.get_number_metrics(idc)
-                self.set_number_storing_msg(idc, total_number)
-
-    def determine_lifetime(self):
-        """Determine the lifetime of the entire system"""
-        duration = (24/self.get_total_aver_cons())*((BATTERY*3.3)*1000)     # in hours
+    def better_lifetime(self, duration):
+        """Convert a lifetime in [h] into [d h m s]"""
         nb_jour = int(duration // 24)
         nb_heure = int(duration % 24)
         nb_minutes = int(((duration % 24) - int(duration % 24))*60)
         nb_seconds = int(
             ((((duration % 24) - int(duration % 24))*60) - int(((duration % 24) - int(duration % 24))*60))*60)
-        self.set_life_estimation(str(nb_jour)+'d '+str(nb_heure)+'h '+str(nb_minutes)+'m '+str(nb_seconds)+'s')
+        return str(nb_jour)+'d '+str(nb_heure)+'h '+str(nb_minutes)+'m '+str(nb_seconds)+'s'
 
-        duration = (24 / self.get_total_aver_cons_max()) * ((BATTERY * 3.3) * 1000)  # in hours
-        nb_jour = int(duration // 24)
-        nb_heure = int(duration % 24)
-        nb_minutes = int(((duration % 24) - int(duration % 24)) * 60)
-        nb_seconds = int(
-            ((((duration % 24) - int(duration % 24)) * 60) - int(((duration % 24) - int(duration % 24)) * 60)) * 60)
-        self.set_life_estimation_min(str(nb_jour)+'d '+str(nb_heure)+'h '+str(nb_minutes)+'m '+str(nb_seconds)+'s')
+    def determine_lifetime(self):
+        """Determine the lifetime of the entire system"""
+        self.set_life_estimation(self.better_lifetime(float(self.__evaluation.result.lifetime)))
+        self.set_life_estimation_min(self.better_lifetime(float(self.__evaluation.result.lifetime_min)))
 
     def debug(self):
         if DEBUG is True:
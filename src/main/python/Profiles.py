@@ -0,0 +1,195 @@
+"""Save the configuration of a motherboard as a profile and apply it to other motherboards.
+
+A profile holds the data accumulation of the motherboard and, per sensor, the polling interval and the threshold
+settings of every metric, in the values the motherboard uses (no unit conversion, so a profile is reapplied
+exactly). It is stored as one line of json, keyed by sensor id (address and type):
+
+    {"v":1,"acc":0,"sensors":{"0101":[900,[1,39000,48000]],"0204":[600,[0,30000,42000],[1,0,500]]}}
+
+Applying a profile loads the settings of the motherboard first and only uploads the ones that differ, so a
+motherboard that already has the profile costs no upload at all.
+
+    python Profiles.py export COM3 -o known-good.profile
+    python Profiles.py apply known-good.profile --ports COM4 COM5 COM6
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+import ATCommands as Motherboard
+import Fleet
+
+# ---- Constant ----
+PROFILE_VERSION = 1
+
+
+class ProfileError(ValueError):
+    """The profile is not valid or does not match the motherboard"""
+
+
+def threshold_value(value):
+    return None if value is None else int(value)
+
+
+def sensor_profile(sensor) -> list:
+    """[poll, [enabled, low, high] per metric] of a sensor loaded with load_data"""
+    return [sensor.get_polling_interval_sec()] + [
+        [1 if sensor._thresholds_enabled[metric_idx] else 0, threshold_value(sensor._thresholds_low[metric_idx]),
+         threshold_value(sensor._thresholds_high[metric_idx])] for metric_idx in range(sensor.get_num_metrics())]
+
+
+def sensor_id(sensor) -> str:
+    return sensor._addr + sensor._type
+
+
+def make_profile(sensors, accumulation) -> dict:
+    return {'v': PROFILE_VERSION, 'acc': 1 if accumulation else 0,
+            'sensors': {sensor_id(sensor): sensor_profile(sensor) for sensor in sensors}}
+
+
+def check_profile(profile):
+    """Raise ProfileError when profile is not a valid profile, return profile"""
+    if not isinstance(profile, dict) or profile.get('v') != PROFILE_VERSION:
+        raise ProfileError("not a profile of version " + str(PROFILE_VERSION))
+    if profile.get('acc') not in (0, 1) or not isinstance(profile.get('sensors'), dict):
+        raise ProfileError("the profile needs 'acc' and 'sensors'")
+
+    for _id, entry in profile['sensors'].items():
+        try:
+            _metrics = Motherboard.Sensor(_id).get_num_metrics()
+        except (AssertionError, KeyError):
+            raise ProfileError("unknown sensor id " + _id)
+        if not isinstance(entry, list) or len(entry) != _metrics + 1 or not isinstance(entry[0], int):
+            raise ProfileError(F"sensor {_id}: [poll, [enabled, low, high] x {_metrics}] expected")
+        for metric in entry[1:]:
+            if (not isinstance(metric, list) or len(metric) != 3 or metric[0] not in (0, 1)
+                    or not all(value is None or isinstance(value, int) for value in metric[1:])):
+                raise ProfileError(F"sensor {_id}: [enabled, low, high] expected, not {metric}")
+
+    return profile
+
+
+def write_profile(profile, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, separators=(',', ':'))
+        f.write('\n')
+
+
+def read_profile(path) -> dict:
+    with open(path, encoding='utf-8') as f:
+        try:
+            return check_profile(json.load(f))
+        except json.JSONDecodeError as e:
+            raise ProfileError(F"not a json file: {e}")
+
+
+def apply_sensor_profile(sensor, entry):
+    """Store the settings of the profile entry in the sensor object, thresholds left at None are not changed"""
+    sensor._polling_interval_sec = entry[0]
+    for metric_idx, (enabled, low, high) in enumerate(entry[1:]):
+        sensor._thresholds_enabled[metric_idx] = enabled == 1
+        if low is not None:
+            sensor._thresholds_low[metric_idx] = low
+        if high is not None:
+            sensor._thresholds_high[metric_idx] = high
+
+
+def configurator(profile):
+    """configure(sensor) callback for Fleet.provision, raises ProfileError for a sensor that is not in the profile"""
+    def configure(sensor):
+        entry = profile['sensors'].get(sensor_id(sensor))
+        if entry is None:
+            raise ProfileError(F"sensor {sensor_id(sensor)} ({sensor.get_name()}) is not in the profile")
+        apply_sensor_profile(sensor, entry)
+    return configure
+
+
+def missing_sensors(profile, result) -> list:
+    """Sensor ids of the profile that are not connected to the motherboard"""
+    _connected = {sensor_id(sensor) for sensor in result.sensors}
+    return sorted(_id for _id in profile['sensors'] if _id not in _connected)
+
+
+def export_profile(device, verbose=False):
+    """Read the profile of the motherboard on device, return (error, profile)"""
+    result = Fleet.provision(device, verbose=verbose)
+    if not result.ok:
+        return result.error, None
+    return None, make_profile(result.sensors, result.accumulation)
+
+
+def apply_profile(profile, devices=None, progress=None, verbose=False) -> list:
+    """Apply the profile to every device (by default every serial port) in parallel, return (result, status) pairs"""
+    results = Fleet.provision_all(devices, configurator(profile), progress, verbose,
+                                  accumulation=profile['acc'] == 1)
+    _statuses = []
+    for result in results:
+        _missing = missing_sensors(profile, result) if result.ok else []
+        if not result.ok:
+            status = "FAILED (" + result.error + ")"
+        elif _missing:
+            status = "FAILED (sensor(s) " + " ".join(_missing) + " not connected)"
+        else:
+            status = "OK"
+        _statuses.append((result, status))
+    return _statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a motherboard configuration as a profile or apply one")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print every AT command")
+    commands = parser.add_subparsers(dest='command')
+    export_parser = commands.add_parser('export', help="save the configuration of a motherboard")
+    export_parser.add_argument('port', help="serial port of the motherboard")
+    export_parser.add_argument('-o', '--output', metavar='FILE', help="profile file (default: standard output)")
+    apply_parser = commands.add_parser('apply', help="apply a profile to motherboards")
+    apply_parser.add_argument('profile', help="profile file")
+    apply_parser.add_argument('--ports', nargs='+', metavar='PORT', help="serial ports (default: all)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        err, profile = export_profile(args.port, args.verbose)
+        if err is not None:
+            print(F"{args.port}: {err}", file=sys.stderr)
+            return 1
+        if args.output:
+            write_profile(profile, args.output)
+        else:
+            print(json.dumps(profile, separators=(',', ':')))
+        return 0
+
+    if args.command != 'apply':
+        parser.print_usage(sys.stderr)
+        return 2
+
+    try:
+        profile = read_profile(args.profile)
+    except (OSError, ProfileError) as e:
+        print(F"{args.profile}: {e}", file=sys.stderr)
+        return 2
+
+    _lock = threading.Lock()
+
+    def progress(device, message):
+        if args.verbose:
+            with _lock:
+                print(F"[{device}] {message}", file=sys.stderr)
+
+    _start = time.time()
+    statuses = apply_profile(profile, args.ports, progress, args.verbose)
+    if not statuses:
+        print("No serial port found", file=sys.stderr)
+        return 1
+
+    for result, status in statuses:
+        print(F"{result.device}\t{result.motherboard_id}\t{result.uploaded}/{len(result.sensors)} sensor(s)\t"
+              F"{result.duration:.2f} s\t{status}")
+    if args.verbose:
+        print(F"{len(statuses)} motherboard(s) in {time.time() - _start:.2f} s", file=sys.stderr)
+    return 0 if all(status == "OK" for _, status in statuses) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import time
+
+
+class SensorState(object):
+    """Freshness of the settings of one sensor"""
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.loaded_at = None  # time.monotonic() of the last load or acknowledged upload, None when stale
+        self.dirty = False  # edited in the GUI and not uploaded yet
+
+
+class SensorCache(object):
+    """Settings of the sensors of the connected motherboard, loaded once and kept for the session.
+
+    The settings of a sensor are fresh from the moment they are loaded (or uploaded and acknowledged) until they
+    are invalidated: by a failed upload, by a new connection (clear), by a change of the sensors listed by AT+LS?
+    or on request. Only stale sensors need to be loaded from the motherboard.
+    """
+
+    def __init__(self):
+        self.__states = {}  # sensor id (address and type) -> SensorState, in the order of AT+LS?
+
+    @staticmethod
+    def sensor_id(sensor) -> str:
+        return sensor._addr + sensor._type
+
+    def clear(self):
+        self.__states = {}
+
+    def update_sensors(self, sensors) -> (bool, list):
+        """Take the sensors listed by AT+LS?, return (whether the list changed, the sensors to use).
+
+        Sensors that are still connected keep their object and settings, the others are dropped.
+        """
+        _ids = [self.sensor_id(sensor) for sensor in sensors]
+        _changed = _ids != list(self.__states)
+        self.__states = {_id: self.__states.get(_id) or SensorState(sensor) for _id, sensor in zip(_ids, sensors)}
+        return _changed, self.sensors()
+
+    def sensors(self) -> list:
+        return [state.sensor for state in self.__states.values()]
+
+    def state(self, sensor) -> SensorState:
+        return self.__states.get(self.sensor_id(sensor))
+
+    def is_fresh(self, sensor, max_age=None) -> bool:
+        """True if the settings of the sensor are loaded and valid (and not older than max_age [s] when given)"""
+        _state = self.state(sensor)
+        if _state is None or _state.loaded_at is None:
+            return False
+        return max_age is None or time.monotonic() - _state.loaded_at <= max_age
+
+    def stale(self) -> list:
+        return [state.sensor for state in self.__states.values() if not self.is_fresh(state.sensor)]
+
+    def loaded(self, sensors, err=False):
+        """Record the load_data/load_all of the sensors, those that could not be loaded (all after err) are stale"""
+        for sensor in sensors:
+            _state = self.state(sensor)
+            if _state is not None:
+                _state.loaded_at = None if err else sensor._loaded_at
+                _state.dirty = False
+
+    def edited(self, sensor):
+        _state = self.state(sensor)
+        if _state is not None:
+            _state.dirty = True
+
+    def is_dirty(self, sensor) -> bool:
+        _state = self.state(sensor)
+        return _state is not None and _state.dirty
+
+    def uploaded(self, sensor, err):
+        """Record an upload: acknowledged settings are the new state, after an error the sensor is stale"""
+        _state = self.state(sensor)
+        if _state is None:
+            return
+        _state.dirty = False
+        _state.loaded_at = None if err else time.monotonic()
+
+    def invalidate(self, sensor=None):
+        """Make the sensor (by default every sensor) stale"""
+        for _state in self.__states.values():
+            if sensor is None or _state.sensor is sensor:
+                _state.loaded_at = None
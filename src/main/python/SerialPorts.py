@@ -0,0 +1,24 @@
+from typing import Iterator, Tuple
+
+import serial
+from serial.tools.list_ports import comports
+
+# Settings of the motherboard serial port
+_bytesize = serial.EIGHTBITS
+_stopbits = serial.STOPBITS_ONE
+_parity = serial.PARITY_NONE
+_baudrate = 115200
+_flowcontrol = False
+_timeout = 5  # in s
+
+
+def new_port(device=None) -> serial.Serial:
+    """Return a serial port with the motherboard settings, opened when device is given."""
+    return serial.Serial(port=device, baudrate=_baudrate, xonxoff=_flowcontrol,
+                         timeout=_timeout, bytesize=_bytesize, stopbits=_stopbits, parity=_parity, write_timeout=None)
+
+
+def gen_serial_ports() -> Iterator[Tuple[str, str]]:
+    """Return all available serial ports."""
+    ports = comports()
+    return ((p.description, p.device) for p in ports)
@@ -0,0 +1,408 @@
+"""Record the serial traffic with the motherboard and replay it, to reproduce field failures offline.
+
+TracedSerial wraps a serial port and appends every write (TX) and every read (RX) to a trace file, as the raw
+bytes with a monotonic timestamp, so the exact timing and bytes that were on the wire are kept. The GUI records
+when IWAST_TRACE is set to the trace file; any other port is traced with:
+
+    ser = TracedSerial(new_port(device), TraceWriter("session.trace"))
+
+The file is append-only: a header, then per frame the time [s, time.monotonic()], the kind (TX, RX or OPEN, a new
+session with the port and the wall clock time as json) and the length, followed by the bytes.
+
+ReplaySerial plays a recorded session back to the ATCommands functions: after a write, the bytes read after
+the same write in the recording become readable with the recorded delays. The command line tool lists the
+sessions of a trace, shows the latency distribution per command type and replays a session through
+ATCommands.pipeline:
+
+    python SerialTrace.py sessions session.trace
+    python SerialTrace.py latency session.trace
+    python SerialTrace.py replay session.trace --session 2 -v
+"""
+import argparse
+import json
+import math
+import statistics
+import struct
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+from serial.serialutil import SerialBase, PortNotOpenError
+
+import ATCommands as Motherboard
+
+# ---- Constant ----
+MAGIC = b"IWTRACE1"
+FRAME = struct.Struct("<dBI")  # time, kind, length of the bytes
+TX = 0
+RX = 1
+OPEN = 2
+ENV_TRACE = 'IWAST_TRACE'
+# Commands whose response is followed by a status line (OK), see ATCommands.request_acc
+STATUS_LINE_AFTER = (Motherboard.AT_ACC_REQ,)
+
+Frame = namedtuple('Frame', ['time', 'kind', 'data'])
+
+
+class TraceError(ValueError):
+    """The file is not a trace"""
+
+
+class TraceWriter(object):
+    """Appends frames to a trace file, from any thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'ab')
+        if self.__file.tell() == 0:
+            self.__file.write(MAGIC)
+            self.__file.flush()
+
+    def write(self, kind, data, _time=None):
+        _time = time.monotonic() if _time is None else _time
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.write(FRAME.pack(_time, kind, len(data)) + data)
+            # flushed per frame, the end of a session that crashes is what matters most
+            self.__file.flush()
+
+    def open_session(self, port):
+        self.write(OPEN, json.dumps({'port': port, 'time': time.time()}).encode('utf-8'))
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+
+def read_trace(path) -> list:
+    """Frames of a trace file, a frame cut off at the end (the writer was killed) is left out"""
+    with open(path, 'rb') as f:
+        _data = f.read()
+    if not _data.startswith(MAGIC):
+        raise TraceError("not a trace file")
+
+    _frames = []
+    _offset = len(MAGIC)
+    while _offset + FRAME.size <= len(_data):
+        _time, _kind, _length = FRAME.unpack_from(_data, _offset)
+        _offset += FRAME.size
+        if _offset + _length > len(_data):
+            break
+        _frames.append(Frame(_time, _kind, _data[_offset:_offset + _length]))
+        _offset += _length
+    return _frames
+
+
+def sessions(frames) -> list:
+    """Split the frames in sessions, each starting with its OPEN frame (frames before the first OPEN form one)"""
+    _sessions = []
+    for frame in frames:
+        if frame.kind == OPEN or not _sessions:
+            _sessions.append([])
+        _sessions[-1].append(frame)
+    return _sessions
+
+
+def session_info(session) -> dict:
+    """Port and wall clock start of a session, empty without OPEN frame"""
+    if not session or session[0].kind != OPEN:
+        return {}
+    try:
+        return json.loads(session[0].data.decode('utf-8'))
+    except ValueError:
+        return {}
+
+
+def tx_line(data) -> str:
+    return data.decode('utf-8', errors='replace').strip()
+
+
+def latencies(frames) -> dict:
+    """Latencies of the responses per command type [s], as TimeoutPolicy measures them.
+
+    A line belongs to the oldest command without answer that it answers (ATCommands.answers), as in the
+    pipeline: the commands before it lost their response. Lines that answer no command in flight (late responses)
+    and the status line after the response to a STATUS_LINE_AFTER command are skipped. The latency runs from the
+    moment the command is sent, or the previous response is received when that is later, to the read that
+    completes the response.
+    """
+    _latencies = {}
+    _in_flight = deque()
+    _framer = Motherboard.LineFramer()
+    _last = None
+    _status_line = False
+    for frame in frames:
+        if frame.kind == OPEN:
+            _in_flight.clear()
+            _framer = Motherboard.LineFramer()
+            _last = None
+            _status_line = False
+        elif frame.kind == TX:
+            _in_flight.append((tx_line(frame.data), frame.time))
+        elif frame.kind == RX:
+            for line in _framer.feed(frame.data):
+                _kind = Motherboard.classify(line)
+                if _kind == Motherboard.LINE_UNSOLICITED:
+                    continue
+                if _status_line:
+                    _status_line = False
+                    if _kind == Motherboard.LINE_OK:
+                        continue
+                _answered = next((_idx for _idx, (_cmd, _) in enumerate(_in_flight)
+                                  if Motherboard.answers(_cmd, line)), None)
+                if _answered is None:
+                    continue
+                for _ in range(_answered):
+                    _in_flight.popleft()
+                _cmd, _sent = _in_flight.popleft()
+                _status_line = Motherboard.command_type(_cmd) in STATUS_LINE_AFTER
+                _start = _sent if _last is None else max(_sent, _last)
+                _latencies.setdefault(Motherboard.command_type(_cmd), []).append(frame.time - _start)
+                _last = frame.time
+    return _latencies
+
+
+def latency_report(frames) -> dict:
+    """count, median, 95th percentile and max latency [s] per command type"""
+    _report = {}
+    for _type, _values in sorted(latencies(frames).items()):
+        _sorted = sorted(_values)
+        _report[_type] = {'count': len(_sorted), 'median': statistics.median(_sorted),
+                          'p95': _sorted[math.ceil(0.95 * len(_sorted)) - 1], 'max': _sorted[-1]}
+    return _report
+
+
+class TracedSerial(object):
+    """Serial port that records what is written to and read from the port it wraps, otherwise the same port"""
+
+    def __init__(self, _ser, trace):
+        object.__setattr__(self, '_ser', _ser)
+        object.__setattr__(self, '_trace', trace)
+        if _ser.is_open:
+            trace.open_session(_ser.port)
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._ser, name, value)
+
+    def open(self):
+        self._ser.open()
+        self._trace.open_session(self._ser.port)
+
+    def write(self, data):
+        _written = self._ser.write(data)
+        self._trace.write(TX, bytes(data))
+        return _written
+
+    def read(self, size=1):
+        _data = self._ser.read(size)
+        if _data:
+            self._trace.write(RX, _data)
+        return _data
+
+
+class ReplaySerial(SerialBase):
+    """pyserial port that plays a recorded session back.
+
+    Every write takes the next recorded write and makes the bytes read after it (until the next recorded write)
+    readable with their recorded delays. Bytes read before the first write are readable from open() on. Writes
+    that differ from the recording are kept in mismatches as (index, recorded, written); replay goes on with the
+    recording. Once the recording is used up, nothing is received anymore.
+    """
+
+    def __init__(self, session=(), **kwargs):
+        self.mismatches = []
+        self.__initial = []         # (delay after open, bytes)
+        self.__script = deque()     # (bytes written, [(delay after the write, bytes read)])
+        self.__written = 0
+        self.__condition = threading.Condition()
+        self.__pending = deque()    # (time at which it is received, bytes)
+        self.__rx = bytearray()
+        _start = session[0].time if session else 0.0
+        for frame in session:
+            if frame.kind == TX:
+                self.__script.append((frame.data, []))
+                _start = frame.time
+            elif frame.kind == RX:
+                _reads = self.__script[-1][1] if self.__script else self.__initial
+                _reads.append((frame.time - _start, frame.data))
+        kwargs.setdefault('port', 'replay')
+        super().__init__(**kwargs)
+
+    @property
+    def remaining(self):
+        """Recorded writes that were not replayed"""
+        return len(self.__script)
+
+    def open(self):
+        self.is_open = True
+        self.__schedule(self.__initial)
+
+    def close(self):
+        with self.__condition:
+            self.is_open = False
+            self.__condition.notify_all()
+
+    def _reconfigure_port(self, *args, **kwargs):
+        pass
+
+    def reset_input_buffer(self):
+        with self.__condition:
+            del self.__rx[:]
+
+    def reset_output_buffer(self):
+        pass
+
+    @property
+    def in_waiting(self):
+        with self.__condition:
+            self.__receive(time.monotonic())
+            return len(self.__rx)
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        self.__written += 1
+        if self.__script:
+            _recorded, _reads = self.__script.popleft()
+            if _recorded != bytes(data):
+                self.mismatches.append((self.__written, _recorded, bytes(data)))
+            self.__schedule(_reads)
+        return len(data)
+
+    def __schedule(self, reads):
+        _now = time.monotonic()
+        with self.__condition:
+            for _delay, _data in reads:
+                self.__pending.append((_now + _delay, _data))
+            self.__condition.notify_all()
+
+    def __receive(self, now):
+        while self.__pending and self.__pending[0][0] <= now:
+            self.__rx += self.__pending.popleft()[1]
+
+    def read(self, size=1):
+        _deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self.__condition:
+            while True:
+                if not self.is_open:
+                    raise PortNotOpenError()
+                _now = time.monotonic()
+                self.__receive(_now)
+                if len(self.__rx) >= size or (_deadline is not None and _now >= _deadline):
+                    break
+                _wake = _deadline
+                if self.__pending and (_wake is None or self.__pending[0][0] < _wake):
+                    _wake = self.__pending[0][0]
+                self.__condition.wait(None if _wake is None else _wake - _now)
+            _data = bytes(self.__rx[:size])
+            del self.__rx[:size]
+        return _data
+
+
+class PrintDebug:
+    """Debug output on standard output, same interface as CustomDebug"""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+
+    def write(self, _type, text):
+        if self.verbose:
+            print(F"{_type}: {text}")
+
+
+def pipelines(session) -> list:
+    """Commands of the session, grouped as they were sent: writes without a read in between form one pipeline"""
+    _groups = []
+    _reading = True
+    for frame in session:
+        if frame.kind == TX:
+            if _reading:
+                _groups.append([])
+            _groups[-1].append(tx_line(frame.data))
+            _reading = False
+        elif frame.kind == RX:
+            _reading = True
+    return _groups
+
+
+def replay(session, debug, timeout=Motherboard.LONG_TIMEOUT) -> (list, ReplaySerial):
+    """Send the commands of the session through ATCommands.pipeline to a ReplaySerial, return (responses, port).
+
+    The commands that were sent again after a missed response are in the recording, so the pipelines do not retry.
+    """
+    _ser = ReplaySerial(session, timeout=timeout)  # opened by SerialBase, as a port is
+    _policy = Motherboard.TimeoutPolicy(retries=0)
+    _responses = []
+    try:
+        for _cmds in pipelines(session):
+            _responses.extend(zip(_cmds, Motherboard.pipeline(_ser, debug, _cmds, policy=_policy)))
+    finally:
+        _ser.close()
+    return _responses, _ser
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay serial traces of the configurator")
+    commands = parser.add_subparsers(dest='command')
+    sessions_parser = commands.add_parser('sessions', help="list the sessions of a trace")
+    sessions_parser.add_argument('trace', help="trace file")
+    latency_parser = commands.add_parser('latency', help="latency distribution per command type")
+    latency_parser.add_argument('trace', help="trace file")
+    latency_parser.add_argument('--session', type=int, help="only this session (default: all)")
+    replay_parser = commands.add_parser('replay', help="replay a session through ATCommands")
+    replay_parser.add_argument('trace', help="trace file")
+    replay_parser.add_argument('--session', type=int, help="session to replay (default: the last one)")
+    replay_parser.add_argument('-v', '--verbose', action='store_true', help="print every line sent and read")
+    args = parser.parse_args(argv)
+
+    if args.command not in ('sessions', 'latency', 'replay'):
+        parser.print_usage(sys.stderr)
+        return 2
+    try:
+        _sessions = sessions(read_trace(args.trace))
+    except (OSError, TraceError) as e:
+        print(F"{args.trace}: {e}", file=sys.stderr)
+        return 2
+    if getattr(args, 'session', None) is not None and not 0 <= args.session < len(_sessions):
+        print(F"{args.trace}: {len(_sessions)} session(s)", file=sys.stderr)
+        return 2
+
+    if args.command == 'sessions':
+        for _idx, session in enumerate(_sessions):
+            _info = session_info(session)
+            _started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_info['time'])) if 'time' in _info else "-"
+            _counts = {_kind: sum(1 for frame in session if frame.kind == _kind) for _kind in (TX, RX)}
+            print(F"{_idx}\t{_info.get('port', '-')}\t{_started}\t{_counts[TX]} TX\t{_counts[RX]} RX\t"
+                  F"{session[-1].time - session[0].time:.2f} s")
+        return 0
+
+    if args.command == 'latency':
+        _frames = [frame for session in _sessions for frame in session] if args.session is None \
+            else _sessions[args.session]
+        for _type, _stats in latency_report(_frames).items():
+            print(F"{_type}\t{_stats['count']}\tmedian {_stats['median'] * 1000:.1f} ms\t"
+                  F"p95 {_stats['p95'] * 1000:.1f} ms\tmax {_stats['max'] * 1000:.1f} ms")
+        return 0
+
+    _session = _sessions[-1 if args.session is None else args.session]
+    _responses, _ser = replay(_session, PrintDebug(args.verbose))
+    _missed = 0
+    for _cmd, _response in _responses:
+        _missed += _response is None
+        if not args.verbose:
+            print(F"{_cmd}\t{_response}")
+    for _idx, _recorded, _written in _ser.mismatches:
+        print(F"write {_idx}: recorded {_recorded}, replayed {_written}", file=sys.stderr)
+    print(F"{len(_responses)} command(s), {_missed} without response, {len(_ser.mismatches)} mismatch(es), "
+          F"{_ser.remaining} recorded write(s) left", file=sys.stderr)
+    return 0 if not _ser.mismatches else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
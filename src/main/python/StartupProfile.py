@@ -0,0 +1,203 @@
+"""Profile the start-up of the configurator, also in the frozen application where python -X importtime is no option.
+
+Start main.py (or the executable) with --profile-startup, or set IWAST_PROFILE_STARTUP to the report file:
+
+    python main.py --profile-startup
+    "IWAST Configurator V2.1.exe" --profile-startup=C:\\Temp\\startup.json
+
+From the switch until the first paint of the main window, the import time of every module (with the time of its own
+code and with the modules it imports, like python -X importtime) and the start-up steps of main.py are recorded. The
+report is written as json once the window is painted, by default to iwast-startup.json in the temporary directory,
+and the slowest imports and steps are printed. Times are in s, steps start at the moment of the switch.
+"""
+import contextlib
+import importlib.abc
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+# ---- Constant ----
+OPTION = '--profile-startup'
+ENV_PROFILE = 'IWAST_PROFILE_STARTUP'
+DEFAULT_REPORT = 'iwast-startup.json'
+SUMMARY_LENGTH = 10  # slowest imports printed
+
+
+class TimedLoader(importlib.abc.Loader):
+    """Loader that times the loader it wraps, from create_module until exec_module is done"""
+
+    def __init__(self, loader, timer):
+        self.__loader = loader
+        self.__timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.__loader, name)
+
+    def create_module(self, spec):
+        # extension modules (PyQt5, numpy) are loaded here, the time runs until exec_module is done
+        self.__timer.enter(spec.name)
+        try:
+            return self.__loader.create_module(spec)
+        except BaseException:
+            self.__timer.leave()
+            raise
+
+    def exec_module(self, module):
+        try:
+            self.__loader.exec_module(module)
+        finally:
+            self.__timer.leave()
+            # the module keeps its own loader, e.g. for importlib.resources
+            module.__loader__ = self.__loader
+            if getattr(module, '__spec__', None) is not None:
+                module.__spec__.loader = self.__loader
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """First finder of sys.meta_path, times the modules found by the finders after it"""
+
+    def __init__(self, clock):
+        self.imports = []  # (module, thread, self time, cumulative time), in the order the imports end
+        self.__clock = clock
+        self.__stacks = {}  # thread id -> [module, start, time of the imports in the module]
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            if not hasattr(finder, 'find_spec'):
+                # PEP 302 finder (the C extensions of PyInstaller 3), its modules count for the importing module
+                if hasattr(finder, 'find_module') and finder.find_module(name, path) is not None:
+                    return None
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self, name):
+        self.__stacks.setdefault(threading.get_ident(), []).append([name, self.__clock(), 0.0])
+
+    def leave(self):
+        _stack = self.__stacks[threading.get_ident()]
+        name, start, nested = _stack.pop()
+        _cumulative = self.__clock() - start
+        if _stack:
+            _stack[-1][2] += _cumulative
+        self.imports.append((name, threading.current_thread().name, _cumulative - nested, _cumulative))
+
+
+class StartupProfiler(object):
+    """Records the imports and the start-up steps, does nothing when disabled (path None)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.enabled = path is not None
+        self.steps = []  # (name, start, duration)
+        self.__start = time.perf_counter()
+        self.__timer = ImportTimer(self.clock)
+        if self.enabled:
+            self.__timer.install()
+
+    def clock(self) -> float:
+        return time.perf_counter() - self.__start
+
+    @contextlib.contextmanager
+    def step(self, name):
+        _start = self.clock()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.steps.append((name, _start, self.clock() - _start))
+
+    def mark(self, name, since=0.0):
+        """Record a step from since until now"""
+        if self.enabled:
+            self.steps.append((name, since, self.clock() - since))
+
+    def watch_first_paint(self, widget):
+        """Record the first paint of widget (from now until the paint is done) and write the report"""
+        if not self.enabled:
+            return
+        from PyQt5.QtCore import QEvent, QObject, QTimer
+
+        _shown = self.clock()
+        profiler = self
+
+        class PaintFilter(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Paint:
+                    obj.removeEventFilter(self)
+                    # the children are painted in the same pass, after the window itself
+                    QTimer.singleShot(0, lambda: profiler.finish(_shown))
+                return False
+
+        widget.installEventFilter(PaintFilter(widget))
+
+    def finish(self, shown):
+        self.mark('first paint', shown)
+        self.__timer.uninstall()
+        try:
+            self.write()
+        except OSError as e:
+            print(F"{self.path}: {e}", file=sys.stderr)
+            return
+        self.print_summary()
+
+    def report(self) -> dict:
+        _imports = sorted(self.__timer.imports, key=lambda entry: entry[3], reverse=True)
+        return {
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'total': self.clock(),
+            'import_time': sum(entry[2] for entry in _imports),
+            'steps': [{'name': name, 'start': start, 'duration': duration} for name, start, duration in self.steps],
+            'imports': [{'module': name, 'thread': thread, 'self': own, 'cumulative': cumulative}
+                        for name, thread, own, cumulative in _imports],
+        }
+
+    def write(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print_summary(self):
+        _report = self.report()
+        print(F"start-up {_report['total'] * 1000:.0f} ms, imports {_report['import_time'] * 1000:.0f} ms, "
+              F"report in {self.path}", file=sys.stderr)
+        for step in _report['steps']:
+            print(F"  {step['duration'] * 1000:8.1f} ms  {step['name']}", file=sys.stderr)
+        for entry in _report['imports'][:SUMMARY_LENGTH]:
+            print(F"  {entry['cumulative'] * 1000:8.1f} ms  import {entry['module']} "
+                  F"({entry['self'] * 1000:.1f} ms itself)", file=sys.stderr)
+
+
+def report_path(argv):
+    """Report file of the profiler switch in argv (removed from argv) or the environment, None without switch"""
+    _path = os.environ.get(ENV_PROFILE) or None
+    for arg in list(argv[1:]):
+        if arg == OPTION or arg.startswith(OPTION + '='):
+            argv.remove(arg)
+            _path = arg[len(OPTION) + 1:] or _path or os.path.join(tempfile.gettempdir(), DEFAULT_REPORT)
+    return _path
+
+
+def from_argv(argv=None) -> StartupProfiler:
+    """Profiler for the switch in argv (default sys.argv), installed right away to time the imports that follow"""
+    return StartupProfiler(report_path(sys.argv if argv is None else argv))
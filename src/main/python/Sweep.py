@@ -0,0 +1,120 @@
+"""Evaluate the energy model over a grid of configurations and write consumption and lifetime as csv.
+
+Example, every spreading factor, polling every 5 to 60 min and 0 to 500 exceeded thresholds a day for a power and
+an environmental board, with and without data accumulation:
+
+    python Sweep.py --boards 3 7 --poll 5 60 5 --exceeded 0 500 10 -o sweep.csv
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import BoardProfiles
+import EnergyModel
+import MeasurementTable
+
+# ---- Constant ----
+COLUMNS = ['data_acc', 'spreading_factor', 'poll_interval', 'thresh_exceeded',
+           'total_aver_cons', 'total_aver_cons_max', 'total_aver_cons_min', 'lifetime', 'lifetime_min']
+FORMATS = ['%d', '%d', '%g', '%d', '%.2f', '%.2f', '%.2f', '%.1f', '%.1f']
+THRESHOLD_CONFIGS = (BoardProfiles.POWER_TH, BoardProfiles.SOUND_TH, BoardProfiles.ENVIRONMENTAL_TH)
+
+
+def sweep(profiles, configs, spreading_factors, poll_intervals, thresh_exceeded, data_acc=(False, True),
+          thresholds=None):
+    """Evaluate every combination of the parameters, return one flat array per column of COLUMNS.
+
+    configs are the board configurations connected to the motherboard, every board but the buttons polls with the
+    same interval [min] and every board with thresholds (thresholds, by default the '_TH' configurations) and the
+    buttons see the same number of exceeded thresholds a day. As with the power board in the power report, the
+    other threshold checks of the day are not exceeded.
+    """
+    if thresholds is None:
+        thresholds = [config in THRESHOLD_CONFIGS for config in configs]
+    spreading_factors = np.asarray(spreading_factors, dtype=int)
+    poll_intervals = np.asarray(poll_intervals, dtype=float)
+    thresh_exceeded = np.asarray(thresh_exceeded, dtype=int)
+
+    # Grid axes: spreading factor, polling interval, exceeded thresholds (and the boards last)
+    polls = EnergyModel.number_polling(poll_intervals)[:, np.newaxis, np.newaxis]
+    columns = {name: [] for name in COLUMNS}
+    for acc in data_acc:
+        boards = EnergyModel.Boards(profiles, list(configs),
+                                    [config != BoardProfiles.BUTTONS for config in configs], thresholds, acc)
+        exceeded = thresh_exceeded[np.newaxis, :, np.newaxis] * boards.exceeding
+        not_exceeded = np.maximum(boards.number_possible_thresh(polls) - exceeded, 0)
+        for sf in spreading_factors:
+            result = EnergyModel.evaluate(boards, sf, exceeded, not_exceeded, polls=polls)
+            shape = result.total_aver_cons.shape
+            columns['data_acc'].append(np.full(shape, acc, dtype=int))
+            columns['spreading_factor'].append(np.full(shape, sf, dtype=int))
+            columns['poll_interval'].append(np.broadcast_to(poll_intervals[:, np.newaxis], shape))
+            columns['thresh_exceeded'].append(np.broadcast_to(thresh_exceeded[np.newaxis, :], shape))
+            for name in COLUMNS[4:]:
+                columns[name].append(getattr(result, name))
+
+    return {name: np.concatenate([value.ravel() for value in values]) for name, values in columns.items()}
+
+
+def write_csv(columns, file):
+    """Write the result of sweep() as csv"""
+    np.savetxt(file, np.column_stack([columns[name] for name in COLUMNS]), fmt=FORMATS, delimiter=',',
+               header=','.join(COLUMNS), comments='')
+
+
+def value_range(values):
+    """START [STOP [STEP]] -> array, STOP included"""
+    if len(values) == 1:
+        return np.array(values)
+    step = values[2] if len(values) > 2 else 1
+    return np.arange(values[0], values[1] + step / 2, step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate consumption [uWh/day] and lifetime [h] over a grid of "
+                                                 "configurations")
+    parser.add_argument('--boards', type=int, nargs='+', required=True, metavar='CONFIG',
+                        help="board configurations (row of the measurement table: 1 Buttons, 2 Power (no thresh), "
+                             "3 Power, 4 Sound (no thresh), 5 Sound, 6 Environmental (no thresh), 7 Environmental)")
+    parser.add_argument('--sf', type=int, nargs='+', default=[EnergyModel.MIN_SF, EnergyModel.MAX_SF],
+                        metavar='SF', help="spreading factors: START [STOP [STEP]] (default: 7 12)")
+    parser.add_argument('--poll', type=float, nargs='+', default=[1, 60], metavar='MIN',
+                        help="polling intervals in min: START [STOP [STEP]] (default: 1 60)")
+    parser.add_argument('--exceeded', type=int, nargs='+', default=[0], metavar='N',
+                        help="exceeded thresholds (or button presses) a day: START [STOP [STEP]] (default: 0)")
+    parser.add_argument('--acc', choices=['off', 'on', 'both'], default='both', help="data accumulation")
+    parser.add_argument('--data', metavar='CSV', help="measurement table to use instead of the one on GitHub")
+    parser.add_argument('-o', '--output', metavar='FILE', help="csv file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    for config in args.boards:
+        if not BoardProfiles.BUTTONS <= config <= BoardProfiles.ENVIRONMENTAL_TH:
+            parser.error("unknown board configuration " + str(config))
+    sfs = value_range(args.sf)
+    if np.any(sfs < EnergyModel.MIN_SF) or np.any(sfs > EnergyModel.MAX_SF):
+        parser.error("the spreading factor must be between 7 and 12")
+
+    if args.data:
+        table = MeasurementTable.MeasurementCache(MeasurementTable.FileSource(args.data),
+                                                  validate=BoardProfiles.BoardProfiles).load(revalidate=False)
+    else:
+        table = MeasurementTable.load_table(validate=BoardProfiles.BoardProfiles)
+    profiles = BoardProfiles.BoardProfiles(table)
+
+    start = time.time()
+    columns = sweep(profiles, args.boards, sfs, value_range(args.poll), value_range(args.exceeded),
+                    data_acc={'off': (False,), 'on': (True,), 'both': (False, True)}[args.acc])
+    evaluated = time.time()
+    if args.output:
+        with open(args.output, 'wb') as f:
+            write_csv(columns, f)
+    else:
+        write_csv(columns, sys.stdout.buffer)
+    print(str(len(columns['lifetime'])) + ' configurations evaluated in ' + str(round(evaluated - start, 2))
+          + ' s, written in ' + str(round(time.time() - evaluated, 2)) + ' s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,37 @@
+import StartupProfile
+# before the other imports, so that they are timed with --profile-startup
+profiler = StartupProfile.from_argv()
+
 import asyncio
+import functools
+import importlib
+import os
 import sys
-from typing import Iterator, Tuple
+import threading
 
-import serial
+from fbs_runtime.application_context import cached_property
 from fbs_runtime.application_context.PyQt5 import ApplicationContext
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtGui import QCloseEvent
 from PyQt5.QtWidgets import (QApplication, QCheckBox, QComboBox, QGridLayout,
                              QLabel, QLineEdit, QMessageBox, QPlainTextEdit,
                              QPushButton, QWidget)
 from quamash import QEventLoop
-from serial.tools.list_ports import comports
 
 import ATCommands as Motherboard
+from AsyncSerial import AsyncSerial
+from SerialPorts import new_port
+from PortWatcher import PortWatcher
+from SerialTrace import ENV_TRACE, TracedSerial, TraceWriter
 import qdarkstyle
 from CustomDebug import CustomDebug
-import PowerReport
+from SensorCache import SensorCache
 
-# Object for access to the serial port
-_bytesize = serial.EIGHTBITS
-_stopbits = serial.STOPBITS_ONE
-_parity = serial.PARITY_NONE
-_baudrate = 115200
-_flowcontrol = False
-ser = serial.Serial(baudrate=_baudrate, xonxoff=_flowcontrol,
-                    timeout=5, bytesize=_bytesize, stopbits=_stopbits, parity=_parity, write_timeout=None)
+# Object for access to the serial port, recorded to the trace file when IWAST_TRACE is set (see SerialTrace)
+ser = new_port()
+if os.environ.get(ENV_TRACE):
+    ser = TracedSerial(ser, TraceWriter(os.environ[ENV_TRACE]))
 
 # Setting constants
 SETTING_PORT_NAME = 'port_name'
@@ -32,11 +39,13 @@ SETTING_MESSAGE = "message"
 
 VERSION = "v2.2"
 
-
-def gen_serial_ports() -> Iterator[Tuple[str, str]]:
-    """Return all available serial ports."""
-    ports = comports()
-    return ((p.description, p.device) for p in ports)
+# The power report (numpy, requests) and the PDF report (reportlab) are imported on first use, and in the background
+# once the window is shown unless IWAST_PREWARM=0
+PREWARM_MODULES = ('PowerReport', 'ReportPDF')
+PREWARM_DELAY = 500  # in ms, after the first paint
+ENV_PREWARM = 'IWAST_PREWARM'
+# IWAST_PROBE_PORTS=1 pings every serial port that appears to show the id of the motherboard on it
+ENV_PROBE_PORTS = 'IWAST_PROBE_PORTS'
 
 
 def send_serial_async(msg: str) -> None:
@@ -44,6 +53,45 @@ def send_serial_async(msg: str) -> None:
     ser.write(msg.encode())
 
 
+def prewarm_imports(modules=PREWARM_MODULES) -> threading.Thread:
+    """Import the modules in a background thread, so that their first use does not wait for the import."""
+    def _import():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass  # imported again, and reported, on first use
+
+    _thread = threading.Thread(target=_import, name="prewarm", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def sensor_action(coroutine):
+    """Run the coroutine method only when no other sensor action (load or save) of the widget is running"""
+    @functools.wraps(coroutine)
+    async def _run(self, *args):
+        if self._sensor_busy:
+            self._debug.write("APP", "Busy with the previous sensor action")
+            return None
+        self._sensor_busy = True
+        try:
+            return await coroutine(self, *args)
+        finally:
+            self._sensor_busy = False
+
+    return _run
+
+
+class AppContext(ApplicationContext):
+    """ApplicationContext that reports the construction of its QApplication to the start-up profiler."""
+
+    @cached_property
+    def app(self):
+        with profiler.step('QApplication'):
+            return super().app
+
+
 # noinspection PyArgumentList
 class RemoteWidget(QWidget):
     """Main Widget."""
@@ -52,6 +100,13 @@ class RemoteWidget(QWidget):
         super().__init__(parent)
 
         self._connected_sensors = {}
+        # settings of the sensors loaded during this connection
+        self._cache = SensorCache()
+        self._shown_sensor = None
+        # whether the motherboard supports the bulk dump command, None until it is tried
+        self._dump_supported = None
+        # a load or save of a sensor is running, see sensor_action
+        self._sensor_busy = False
         self.resize(700, 500)
 
         # Varibles for PowerReport
@@ -70,6 +125,9 @@ class RemoteWidget(QWidget):
 
         self._debug = CustomDebug(self.debug_textedit)
 
+        # Serial port access from the event loop
+        self._aser = AsyncSerial(ser, unsolicited=self.on_unsolicited_line)
+
         # Refresh COM Ports
         self.refresh_com_ports_btn = QPushButton(self.tr('Refresh'))
         self.refresh_com_ports_btn.pressed.connect(self.update_com_ports)
@@ -84,7 +142,10 @@ class RemoteWidget(QWidget):
         self.port_label.setBuddy(self.port_combobox)
         self.port_combobox.currentIndexChanged.connect(
             self.on_port_combobox_change)
-        self.update_com_ports()
+        # the ports are listed by the watcher thread, as they appear and disappear
+        self._port_watcher = PortWatcher(self.on_ports_changed, self.on_port_probed,
+                                         probe=os.environ.get(ENV_PROBE_PORTS, '0') != '0')
+        self._port_watcher.start()
 
         # Connect and Disconnect Buttons
         self.connect_btn = QPushButton(self.tr('Connect'))
@@ -198,10 +259,21 @@ class RemoteWidget(QWidget):
         self.sensor_label.setBuddy(self.sensor_combobox)
         self.sensor_combobox.currentIndexChanged.connect(
             self.on_sensor_combobox_change)
-        self.update_com_ports()
         self.sensor_btn = QPushButton(self.tr('Load'))
         self.sensor_btn.setVisible(False)
         self.sensor_btn.pressed.connect(self.on_sensor_btn_pressed)
+        self.reload_btn = QPushButton(self.tr('Reload'))
+        self.reload_btn.setVisible(False)
+        self.reload_btn.pressed.connect(self.on_reload_btn_pressed)
+
+        # Edits of the sensor settings, not uploaded until saved
+        for _edit in (self.poll_lineedit, self.threshold_high_lineedit_1, self.threshold_low_lineedit_1,
+                      self.threshold_high_lineedit_2, self.threshold_low_lineedit_2, self.threshold_high_lineedit_3,
+                      self.threshold_low_lineedit_3, self.threshold_high_lineedit_4, self.threshold_low_lineedit_4):
+            _edit.textEdited.connect(self.on_sensor_edited)
+        for _checkbox in (self.threshold_checkbox_1, self.threshold_checkbox_2, self.threshold_checkbox_3,
+                          self.threshold_checkbox_4):
+            _checkbox.clicked.connect(self.on_sensor_edited)
 
         # Save and Disconnect Buttons
         self.save_btn = QPushButton(self.tr('Save'))
@@ -237,6 +309,7 @@ class RemoteWidget(QWidget):
         layout.addWidget(self.sensor_combobox, 1, 1, 1, 3)
         layout.addWidget(self.sensor_btn, 1, 4)
         layout.addWidget(self.save_btn, 1, 5)
+        layout.addWidget(self.reload_btn, 2, 5)
 
         # Polling line
 
@@ -299,7 +372,6 @@ class RemoteWidget(QWidget):
 
         self._debug.write("GUI", "Application started successfully")
         self._debug.write("GUI", VERSION)
-        self.update_com_ports()
 
     # def _load_settings(self) -> None:
     #     """Load settings on startup."""
@@ -332,16 +404,55 @@ class RemoteWidget(QWidget):
         QMessageBox.critical(self, QApplication.applicationName(), str(msg))
 
     def update_com_ports(self) -> None:
-        """Update COM Port list in GUI."""
+        """Update COM Port list in GUI (the watcher scans the ports right away)."""
         self._debug.write("COM", "Searching for COM ports")
-        self.port_combobox.clear()
-        for name, device in gen_serial_ports():
+        self._port_watcher.refresh()
+
+    def on_ports_changed(self, added, removed) -> None:
+        """Remove the unplugged ports from the COM Port list and add the new ones, the selection is kept."""
+        for name, device in removed:
+            index = self.port_combobox.findData(device)
+            if index > -1:
+                self.port_combobox.removeItem(index)
+            self._debug.write("COM", F"Removed name: {name}, device: {device}")
+        for name, device in added:
             self.port_combobox.addItem(name, device)
             self._debug.write("COM", F"Found name: {name}, device: {device}")
 
+    def on_port_probed(self, device, motherboard_id) -> None:
+        """Show the motherboard that answered on a new port."""
+        index = self.port_combobox.findData(device)
+        if index > -1 and motherboard_id is not None:
+            name = self.port_combobox.itemText(index)
+            self.port_combobox.setItemText(index, F"{name} - motherboard {motherboard_id}")
+            self._debug.write("COM", F"Motherboard {motherboard_id} on {device}")
+
     def on_sensor_combobox_change(self, i):
-        # TODO
-        pass
+        # show the cached settings right away, other sensors still need the load button
+        sensor = self._connected_sensors.get(self.sensor_combobox.itemText(i))
+        if sensor is not None and self._cache.is_fresh(sensor) and self.sensor_btn.isVisible():
+            asyncio.ensure_future(self.load_sensor_async())
+
+    def on_sensor_edited(self, *args):
+        if self._shown_sensor is not None:
+            self._cache.edited(self._shown_sensor)
+
+    def on_reload_btn_pressed(self):
+        asyncio.ensure_future(self.reload_sensors_async())
+
+    async def reload_sensors_async(self):
+        """Load the sensor list and the settings of every sensor again, edits that are not saved are discarded"""
+        (_err, _sensors) = await Motherboard.request_sensors_async(self._aser, self._debug)
+        if _err:
+            return
+        (_changed, _sensors) = self._cache.update_sensors(_sensors)
+        if _changed:
+            self._debug.write("APP", "The connected sensors changed")
+            self.populate_sensors(_sensors)
+        self._cache.invalidate()
+        await self.prefetch_sensors()
+        if self.sensor_combobox.count() > 0:
+            await self.load_sensor_async()
 
     def on_port_combobox_change(self, i):
         self._debug.write(
@@ -382,13 +493,27 @@ class RemoteWidget(QWidget):
         self.threshold_low_lineedit_4.setVisible(False)
 
     def on_sensor_btn_pressed(self):
+        asyncio.ensure_future(self.load_sensor_async())
+
+    @sensor_action
+    async def load_sensor_async(self):
         self.save_btn.setVisible(True)
 
         self.remove_metric_rows_from_gui()
         sensor_str = self.sensor_combobox.currentText()
         selected_sensor = self._connected_sensors[sensor_str]
-        self._debug.write("APP", F"Loading sensor data from {selected_sensor}")
-        Motherboard.load_data(selected_sensor, self._debug, ser)
+        if self._shown_sensor is not None and self._shown_sensor is not selected_sensor \
+                and self._cache.is_dirty(self._shown_sensor):
+            self._debug.write("APP", F"Changes of {self._shown_sensor.get_name()} "
+                                     F"[{self._shown_sensor.get_addr()}] not saved")
+            self._cache.state(self._shown_sensor).dirty = False
+        if not self._cache.is_fresh(selected_sensor):
+            self._debug.write("APP", F"Loading sensor data from {selected_sensor}")
+            _err = await Motherboard.load_data_async(selected_sensor, self._debug, self._aser)
+            self._cache.loaded([selected_sensor], _err)
+            if _err:
+                self._debug.write("ERR", F"Not all settings of {selected_sensor} could be loaded")
+        self._shown_sensor = selected_sensor
         # self.poll_checkbox.setCheckState(selected_sensor._polling_enabled)
         if selected_sensor.get_name() == 'Button Sensor':
             self.poll_label.setVisible(False)
@@ -456,6 +581,7 @@ class RemoteWidget(QWidget):
 
     def on_power_report_btn_pressed(self):
         """Display Power Measurement for the selected configuration """
+        import PowerReport
         # TODO
         if self.window_power_r is None:
             self.power_report_btn.setVisible(False)
@@ -547,8 +673,11 @@ class RemoteWidget(QWidget):
 
     def closeEvent(self, event: QCloseEvent) -> None:
         """Handle Close event of the Widget."""
+        self._port_watcher.stop()
+        self._aser.stop()
         if ser.is_open:
             ser.close()
+        self._debug.flush()
 
         # self._save_settings()
 
@@ -575,13 +704,20 @@ class RemoteWidget(QWidget):
         # TODO
 
     def click_accumulation_checkbox(self):
-        (err, acc_confirm) = Motherboard.set_accumulation(
-            ser, self._debug, enable=self.accumulation_checkbox.isChecked())
+        asyncio.ensure_future(self.set_accumulation_async())
+
+    async def set_accumulation_async(self):
+        (err, acc_confirm) = await Motherboard.set_accumulation_async(
+            self._aser, self._debug, enable=self.accumulation_checkbox.isChecked())
         if (not err):
             self._debug.write("APP", F"Accumulation {acc_confirm}")
         self.power_data_acc = self.accumulation_checkbox.isChecked()
 
     def on_save_btn_pressed(self):
+        asyncio.ensure_future(self.save_sensor_async())
+
+    @sensor_action
+    async def save_sensor_async(self):
         sensor_str = self.sensor_combobox.currentText()
         selected_sensor = self._connected_sensors[sensor_str]
         self._debug.write("APP", F"Saving data from {sensor_str}")
@@ -638,7 +774,10 @@ class RemoteWidget(QWidget):
                         self._debug.write(
                             "APP", F"Saving metric 4 from {sensor_str}")
 
-        Motherboard.upload_sensor(selected_sensor, ser, self._debug)
+        _err = await Motherboard.upload_sensor_async(selected_sensor, self._aser, self._debug)
+        self._cache.uploaded(selected_sensor, _err)
+        if _err:
+            self._debug.write("ERR", F"Not all settings of {sensor_str} were accepted, they are loaded again")
 
         # For the power report -----------------------------------------------------------------------------------------
         idc = self.power_config_name.index(selected_sensor.get_name())
@@ -676,6 +815,11 @@ class RemoteWidget(QWidget):
         """Open serial connection to the specified port."""
         self._debug.write(
             "APP", F"Trying to access motherbaord on port {self.port}")
+        # the settings may have changed while disconnected
+        self._cache.clear()
+        self._shown_sensor = None
+        self._dump_supported = None
+        self._aser.stop()
         if ser.is_open:
             ser.close()
         ser.port = self.port
@@ -688,71 +832,99 @@ class RemoteWidget(QWidget):
         if ser.is_open:
             self._debug.write(
                 "COM", F"Serial port {self.port} is open.")
-
-            (err, motherboard_id) = Motherboard.handle_ping(ser, self._debug)
-
-            if not err:
-                self._debug.write("COM", F"Connected to {motherboard_id}")
-                self.connect_btn.setEnabled(False)
-                self.test_btn.setVisible(True)
-                self.disconnect_btn.setVisible(True)
-                self.disconnect_btn.pressed.connect(self.on_disconnect_btn_pressed)
-                self.sensor_btn.pressed.connect(self.on_sensor_btn_pressed)
-                self.save_btn.pressed.connect(self.on_save_btn_pressed)
-                self.port_combobox.setDisabled(True)
-                self.save_btn.setEnabled(True)
-                self.load_sensors()
-
-            (err2, acc_state) = Motherboard.request_acc(ser, self._debug)
-
-            if (not err2):
-                self.accumulation_checkbox.setVisible(True)
-                self.accumulation_checkbox.setCheckState(acc_state)
+            self._aser.start()
+            asyncio.ensure_future(self.connect_async())
 
         else:
             self._debug.write(
                 "ERR", F"Serial port {self.port} is not open :(.")
 
-            # loop.create_task(self.receive_serial_async())
+    async def connect_async(self):
+        (err, motherboard_id) = await Motherboard.handle_ping_async(self._aser, self._debug)
+
+        if not err:
+            self._debug.write("COM", F"Connected to {motherboard_id}")
+            self.connect_btn.setEnabled(False)
+            self.test_btn.setVisible(True)
+            self.disconnect_btn.setVisible(True)
+            self.port_combobox.setDisabled(True)
+            self.save_btn.setEnabled(True)
+            await self.load_sensors()
+
+        (err2, acc_state) = await Motherboard.request_acc_async(self._aser, self._debug)
+
+        if (not err2):
+            self.accumulation_checkbox.setVisible(True)
+            self.accumulation_checkbox.setCheckState(acc_state)
+
+        if not err:
+            await self.prefetch_sensors()
+
+    async def prefetch_sensors(self):
+        """Load the settings of every stale sensor at once, so that showing a sensor needs no serial traffic"""
+        _sensors = self._cache.stale()
+        if not _sensors:
+            return
+        (_err, self._dump_supported) = await Motherboard.load_all_async(
+            _sensors, self._debug, self._aser, dump=self._dump_supported)
+        self._cache.loaded(_sensors)
+        if _err:
+            self._debug.write("ERR", "Not all sensor settings could be loaded, they are loaded when shown")
+        else:
+            self._debug.write("APP", F"Settings of {len(_sensors)} sensor(s) loaded")
 
-    def load_sensors(self):
-        self._connected_sensors = {}
+    async def load_sensors(self):
         """request the connected sensors on the motherboard"""
 
         _sensors = []
-        (_err, _sensors) = Motherboard.request_sensors(ser, self._debug)
+        (_err, _sensors) = await Motherboard.request_sensors_async(self._aser, self._debug)
 
         if (not _err):
-            if len(_sensors) > 0:
-                self.sensor_btn.setVisible(True)
-
-            for s in _sensors:
-                _name = s.get_name()
-                _id = s.get_addr()
-
-                # For the power report ---------------------------------------------------------------------------------
-                self.power_config_name.append(_name)
-                if _name == 'Button Sensor':
-                    self.power_config_id.append(1)
-                elif _name == 'Power Sensor':
-                    self.power_config_id.append(2)
-                elif _name == 'Sound Sensor':
-                    self.power_config_id.append(4)
-                elif _name == 'Environmental Sensor':
-                    self.power_config_id.append(6)
-                self.power_pol.append(False)
-                self.power_th.append(False)
-                # self.power_report_btn.setVisible(True)
-                # ------------------------------------------------------------------------------------------------------
-
-                _sensor_str = F"{_name} [{_id}]"
-                self._debug.write("GUI", F"Adding Sensor: {_sensor_str}")
-
-                self.sensor_combobox.addItem(_sensor_str)
-
-                self._connected_sensors.update({
-                    _sensor_str: s
-                })
+            (_, _sensors) = self._cache.update_sensors(_sensors)
+            self.populate_sensors(_sensors)
+
+    def populate_sensors(self, _sensors):
+        """Fill the sensor combobox (and the power report configuration) with the sensors of the motherboard"""
+        self._connected_sensors = {}
+        self._shown_sensor = None
+        self.sensor_combobox.clear()
+        self.power_config_name = []
+        self.power_config_id = []
+        self.power_pol = []
+        self.power_th = []
+        self.remove_metric_rows_from_gui()
+
+        if len(_sensors) > 0:
+            self.sensor_btn.setVisible(True)
+            self.reload_btn.setVisible(True)
+
+        for s in _sensors:
+            _name = s.get_name()
+            _id = s.get_addr()
+
+            # For the power report -------------------------------------------------------------------------------------
+            self.power_config_name.append(_name)
+            if _name == 'Button Sensor':
+                self.power_config_id.append(1)
+            elif _name == 'Power Sensor':
+                self.power_config_id.append(2)
+            elif _name == 'Sound Sensor':
+                self.power_config_id.append(4)
+            elif _name == 'Environmental Sensor':
+                self.power_config_id.append(6)
+            self.power_pol.append(False)
+            self.power_th.append(False)
+            # self.power_report_btn.setVisible(True)
+            # ----------------------------------------------------------------------------------------------------------
+
+            _sensor_str = F"{_name} [{_id}]"
+            self._debug.write("GUI", F"Adding Sensor: {_sensor_str}")
+
+            self.sensor_combobox.addItem(_sensor_str)
+
+            self._connected_sensors.update({
+                _sensor_str: s
+            })
 
     # def load_sensor_data(self):
     #     for sensor_str, sensor in self._connected_sensors.items():
@@ -764,8 +936,13 @@ class RemoteWidget(QWidget):
         self.new_config_btn.setVisible(True)
         self.save_btn.pressed.disconnect()
         self.sensor_btn.pressed.disconnect()
-        Motherboard.close(ser, self._debug)
+        self.reload_btn.setVisible(False)
+        asyncio.ensure_future(self.disconnect_async())
 
+    async def disconnect_async(self):
+        await Motherboard.close_async(self._aser, self._debug)
+
+        self._aser.stop()
         if ser.is_open:
             ser.close()
         self.update_com_ports()
@@ -793,8 +970,11 @@ class RemoteWidget(QWidget):
         self._debug.write("GUI", VERSION)
         self.update_com_ports()
 
+        self._cache.clear()
+        self._shown_sensor = None
         self.sensor_combobox.clear()
         self.sensor_btn.setVisible(False)
+        self.reload_btn.setVisible(False)
         self.save_btn.setVisible(False)
         self.accumulation_checkbox.setVisible(False)
         self.new_config_btn.setVisible(False)
@@ -802,32 +982,33 @@ class RemoteWidget(QWidget):
         self.connect_btn.setEnabled(True)
         self.port_combobox.setEnabled(True)
 
-    async def receive_serial_async(self) -> None:
-        """Wait for incoming data, convert it to text and add to Textedit."""
-        while True:
-            msg = ser.readline()
-            if msg != b'':
-                text = msg.decode().strip()
-                self.received_textedit.appendPlainText(text)
-            await asyncio.sleep(0)
+    def on_unsolicited_line(self, line: str) -> None:
+        """Show output of the motherboard that is not an answer to a command."""
+        self._debug.write("COM", F"RX: {line}")
 
 
 if __name__ == '__main__':
-    appctxt = ApplicationContext()  # 1. Instantiate ApplicationContext
-    app = QApplication([])
-    loop = QEventLoop()
+    profiler.mark('imports')
+    with profiler.step('ApplicationContext'):
+        appctxt = AppContext()  # 1. Instantiate ApplicationContext
+    app = appctxt.app
+    loop = QEventLoop(app)
     asyncio.set_event_loop(loop)
 
-    app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-    app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyqt5'))
+    with profiler.step('stylesheet load_stylesheet_pyqt5'):
+        app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
+    with profiler.step('stylesheet load_stylesheet'):
+        app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyqt5'))
 
     app.setOrganizationName('Dramco')
     app.setApplicationName('IWAST Configurator')
-    w = RemoteWidget()
+    with profiler.step('RemoteWidget'):
+        w = RemoteWidget()
+    profiler.watch_first_paint(w)
     w.show()
-
-    exit_code = appctxt.app.exec_()  # 2. Invoke appctxt.app.exec_()
-    sys.exit(exit_code)
+    if os.environ.get(ENV_PREWARM, '1') != '0':
+        QTimer.singleShot(PREWARM_DELAY, prewarm_imports)
 
     with loop:
-        loop.run_forever()
+        exit_code = loop.run_forever()  # 2. Run appctxt.app through the asyncio event loop
+    sys.exit(exit_code)
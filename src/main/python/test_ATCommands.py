@@ -0,0 +1,299 @@
+"""Tests of the AT protocol against an emulated motherboard (see Emulator), run with python -m pytest"""
+import asyncio
+
+import pytest
+
+import ATCommands as Motherboard
+from AsyncSerial import AsyncSerial
+from Emulator import EmulatedBoard, EmulatorSerial, Link
+
+SENSORS = ["0101", "0202", "0303", "0404"]
+
+
+class NullDebug:
+    """Debug output that is dropped, same interface as CustomDebug"""
+
+    def write(self, *args):
+        pass
+
+
+def learned_policy(latency=0.003):
+    """TimeoutPolicy that knows the latencies of the commands of the tests, so a missed response is retried"""
+    _policy = Motherboard.TimeoutPolicy()
+    for _cmd in (Motherboard.AT_POLL_REQ, Motherboard.AT_TH_REQ, Motherboard.AT_PING_REQ, Motherboard.AT_DUMP_REQ,
+                 Motherboard.AT_POLL_CMD, Motherboard.AT_TH_E_CMD, Motherboard.AT_TH_L_CMD, Motherboard.AT_TH_H_CMD):
+        for _ in range(_policy.min_samples):
+            _policy.record(_cmd, latency)
+    return _policy
+
+
+def distinct_board(dump=False):
+    """Board whose settings all differ, so a response matched to the wrong command is noticed"""
+    _board = EmulatedBoard(sensors=SENSORS, dump=dump)
+    for _addr, (_id, _poll, _metrics) in _board.sensors.items():
+        _board.sensors[_addr][1] = 600 + int(_addr)
+        for _idx, _metric in enumerate(_metrics):
+            _metric[:] = [_idx % 2, 100 * int(_addr) + 10 * _idx + 1, 100 * int(_addr) + 10 * _idx + 2]
+    return _board
+
+
+def expected_response(board, _cmd):
+    return board.handle(_cmd)[0]
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    Motherboard.stats.reset()
+
+
+def test_answers():
+    assert Motherboard.answers("AT+TH? 01 01", "+TH: 1 10 20")
+    assert Motherboard.answers("AT+TLL=01 01 10", "OK")
+    assert Motherboard.answers("AT+TLL=01 01 10", "ERROR 2")
+    assert not Motherboard.answers("AT+TH? 01 01", "+POL: 600")
+    assert not Motherboard.answers("AT+TH? 01 01", "OK")
+
+
+def test_pipeline_in_order():
+    _board = distinct_board()
+    _cmds = Motherboard.load_all_cmds([Motherboard.Sensor(_id) for _id in SENSORS])
+    _ser = EmulatorSerial(_board, Link(), timeout=1)
+
+    _responses = Motherboard.pipeline(_ser, NullDebug(), _cmds, depth=4, policy=learned_policy())
+
+    assert _responses == [expected_response(_board, _cmd) for _cmd in _cmds]
+    assert Motherboard.stats.timeouts == 0
+    # the window is refilled as the responses come in, it only drains at the end
+    assert Motherboard.stats.round_trips == 1
+
+
+@pytest.mark.parametrize("seed", range(1, 10))
+def test_pipeline_never_shifts_responses(seed):
+    _board = distinct_board()
+    _cmds = Motherboard.load_all_cmds([Motherboard.Sensor(_id) for _id in SENSORS])
+    _link = Link(latency=0.002, drop_rate=0.1, seed=seed)
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+
+    _responses = Motherboard.pipeline(_ser, NullDebug(), _cmds, policy=learned_policy())
+
+    assert _link.stats['dropped'] > 0
+    assert _link.stats['commands'] > len(_cmds)
+    # after a lost line a response is either that of its own command or missing, never that of an other one
+    for _cmd, response in zip(_cmds, _responses):
+        assert response in (None, expected_response(_board, _cmd))
+
+
+def test_pipeline_retries_lost_responses():
+    _board = distinct_board()
+    _cmds = Motherboard.load_all_cmds([Motherboard.Sensor(_id) for _id in SENSORS])
+    _link = Link(latency=0.002, drop_rate=0.1, seed=3)
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+
+    _responses = Motherboard.pipeline(_ser, NullDebug(), _cmds, policy=learned_policy())
+
+    assert _link.stats['dropped'] == 3
+    assert Motherboard.stats.round_trips > 1
+    assert _responses == [expected_response(_board, _cmd) for _cmd in _cmds]
+
+
+def test_pipeline_gives_up_after_retries():
+    _cmds = Motherboard.load_all_cmds([Motherboard.Sensor(_id) for _id in SENSORS])
+    _policy = learned_policy()
+    _link = Link(drop_rate=1.0)
+    _ser = EmulatorSerial(distinct_board(), _link, timeout=1)
+
+    _responses = Motherboard.pipeline(_ser, NullDebug(), _cmds, policy=_policy)
+
+    assert _responses == [None] * len(_cmds)
+    # every retry pass sends one command at a time and stops at its missed response
+    assert _link.stats['commands'] == len(_cmds) + _policy.retries
+    assert Motherboard.stats.timeouts == 1 + _policy.retries
+    assert _ser.timeout == 1
+
+
+def test_pipeline_does_not_retry_unlearned(monkeypatch):
+    monkeypatch.setattr(Motherboard, "LONG_TIMEOUT", 0.2)
+    _cmds = Motherboard.load_all_cmds([Motherboard.Sensor(_id) for _id in SENSORS])
+    _link = Link(drop_rate=1.0)
+    _ser = EmulatorSerial(distinct_board(), _link, timeout=1)
+
+    _responses = Motherboard.pipeline(_ser, NullDebug(), _cmds, policy=Motherboard.TimeoutPolicy())
+
+    assert _responses == [None] * len(_cmds)
+    assert _link.stats['commands'] == len(_cmds)
+    assert Motherboard.stats.timeouts == 1
+
+
+def test_timeout_policy_deadline():
+    _policy = Motherboard.TimeoutPolicy(percentile=1.0, margin=2.0, min_samples=3)
+    assert _policy.deadline("AT+TH? 01 01") == Motherboard.LONG_TIMEOUT
+
+    for _latency in (0.01, 0.02, 0.04):
+        _policy.record("AT+TH? 01 01", _latency)
+
+    assert _policy.learned("AT+TH? 02 03")
+    assert not _policy.learned("AT+POL? 01 01")
+    assert _policy.deadline("AT+TH? 02 03") == pytest.approx(0.08)
+    assert _policy.deadline("AT+TH? 02 03", attempt=2) == pytest.approx(0.32)
+    assert _policy.deadline("AT+TH? 02 03", attempt=10) == Motherboard.LONG_TIMEOUT
+
+
+def test_read_response_skips_unsolicited_and_stale():
+    _ser = EmulatorSerial(distinct_board(), Link(), timeout=1)
+    _ser.write(b"AT+PNG?\r\n")
+    _ser.write(b"AT+LS?\r\n")
+
+    assert Motherboard.read_response(_ser, NullDebug(), 0.5, Motherboard.AT_LIST_REQ).startswith(
+        Motherboard.AT_LIST_RES)
+    assert Motherboard.read_response(_ser, NullDebug(), 0.1) is None
+
+
+def test_upload_sends_only_changes():
+    _board = distinct_board()
+    _link = Link()
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+    _policy = learned_policy()
+    sensor = Motherboard.Sensor("0303")
+    assert not Motherboard.load_data(sensor, NullDebug(), _ser, _policy)
+
+    _sent = _link.stats['commands']
+    assert not Motherboard.upload_sensor(sensor, _ser, NullDebug(), _policy)
+    assert _link.stats['commands'] == _sent
+
+    sensor._thresholds_low[2] = 4242
+    assert Motherboard.upload_cmds(sensor) == ["AT+TLL=03 03 4242"]
+    assert not Motherboard.upload_sensor(sensor, _ser, NullDebug(), _policy)
+    assert _link.stats['commands'] == _sent + 1
+    assert _board.sensors["03"][2][2][1] == 4242
+    assert Motherboard.upload_cmds(sensor) == []
+
+
+def test_upload_keeps_rejected_changes():
+    _board = distinct_board()
+    _ser = EmulatorSerial(_board, Link(), timeout=1)
+    _policy = learned_policy()
+    sensor = Motherboard.Sensor("0101")
+    assert not Motherboard.load_data(sensor, NullDebug(), _ser, _policy)
+
+    sensor._polling_interval_sec = 70000  # out of range, the board answers ERROR
+    sensor._thresholds_high[0] = 7
+    assert Motherboard.upload_sensor(sensor, _ser, NullDebug(), _policy)
+
+    assert _board.sensors["01"][2][0][2] == 7
+    assert Motherboard.upload_cmds(sensor) == ["AT+POL=01 01 70000"]
+
+
+def test_load_all_with_dump():
+    _board = distinct_board(dump=True)
+    _link = Link()
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+    sensors = [Motherboard.Sensor(_id) for _id in SENSORS]
+
+    assert Motherboard.load_all(sensors, NullDebug(), _ser, policy=learned_policy()) == (False, True)
+
+    assert _link.stats['commands'] == 1
+    assert sensors[2]._polling_interval_sec == 603
+    assert sensors[2]._thresholds_low == ["301", "311", "321", "331"]
+    assert all(sensor._loaded_at is not None for sensor in sensors)
+
+
+def test_load_all_falls_back_without_dump():
+    _board = distinct_board(dump=False)
+    _link = Link()
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+    sensors = [Motherboard.Sensor(_id) for _id in SENSORS]
+    _cmds = Motherboard.load_all_cmds(sensors)
+
+    assert Motherboard.load_all(sensors, NullDebug(), _ser, policy=learned_policy()) == (False, False)
+    assert _link.stats['commands'] == 1 + len(_cmds)
+    assert sensors[3]._thresholds_high == ["402", "412"]
+
+    # once known to be unsupported, AT+DMP? is not sent anymore
+    assert Motherboard.load_all(sensors, NullDebug(), _ser, dump=False, policy=learned_policy()) == (False, False)
+    assert _link.stats['commands'] == 1 + 2 * len(_cmds)
+
+
+def test_load_all_incomplete_dump_keeps_dump():
+    _board = distinct_board(dump=True)
+    _link = Link()
+    _ser = EmulatorSerial(_board, _link, timeout=1)
+    sensors = [Motherboard.Sensor(_id) for _id in SENSORS + ["0501"]]  # the board has no sensor 05
+
+    _err, _dump = Motherboard.load_all(sensors, NullDebug(), _ser, policy=learned_policy())
+
+    assert _err
+    assert _dump
+    assert _link.stats['commands'] == 1 + len(Motherboard.load_all_cmds(sensors))
+    assert sensors[0]._loaded_at is not None
+    assert sensors[4]._loaded_at is None
+
+
+def test_dump_support():
+    assert Motherboard.dump_support("ERROR 1", True) is False
+    assert Motherboard.dump_support("+DMP: 0101 600 0,0,0", None) is True
+    assert Motherboard.dump_support(None, None) is None
+    assert Motherboard.dump_support(None, True) is True
+
+
+def test_parse_dump_rejects_malformed():
+    sensors = [Motherboard.Sensor("0101"), Motherboard.Sensor("0404")]
+
+    assert Motherboard.parse_dump(sensors, "+DMP: 0101 600 1,2,3; 0404 60 0,1,2")
+    assert Motherboard.parse_dump(sensors, "+DMP: 0101 600 1,2,3; 0404 60 0,1,2 0,1")
+    assert not Motherboard.parse_dump(sensors, "+DMP: 0101 600 1,2,3; 0404 60 0,1,2 1,3,4")
+    assert sensors[1]._thresholds_enabled == [False, True]
+
+
+def run_async(coroutine_function, _ser):
+    """Run coroutine_function(AsyncSerial) on a new event loop, as RemoteWidget does on the quamash loop"""
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _aser = AsyncSerial(_ser)
+    _aser.start()
+    try:
+        return _loop.run_until_complete(coroutine_function(_aser))
+    finally:
+        _aser.stop()
+        _loop.close()
+        asyncio.set_event_loop(None)
+
+
+def wrong_settings(board, sensor) -> bool:
+    """True if the sensor was loaded with settings that are not those of the board"""
+    if sensor._loaded_at is None:
+        return False
+    _id, _poll, _metrics = board.sensors[sensor.get_addr()]
+    _thresholds = [[str(_metric[1]), str(_metric[2])] for _metric in _metrics]
+    return sensor._polling_interval_sec != _poll or _thresholds != [list(_pair) for _pair in zip(
+        sensor._thresholds_low, sensor._thresholds_high)]
+
+
+@pytest.mark.parametrize("seed", range(2, 6))
+def test_concurrent_async_loads(monkeypatch, seed):
+    monkeypatch.setattr(Motherboard, "timeouts", learned_policy())
+    _board = distinct_board()
+    _ser = EmulatorSerial(_board, Link(latency=0.002, drop_rate=0.1, seed=seed), timeout=1)
+    sensors = [Motherboard.Sensor(_id) for _id in SENSORS]
+    _others = [Motherboard.Sensor(_id) for _id in SENSORS[1:]]
+
+    async def load(_aser):
+        await asyncio.gather(Motherboard.load_all_async(sensors, NullDebug(), _aser, dump=False),
+                             *[Motherboard.load_data_async(sensor, NullDebug(), _aser) for sensor in _others])
+
+    run_async(load, _ser)
+
+    # the pipelines take turns on the port, or their responses get mixed up
+    assert not any(wrong_settings(_board, sensor) for sensor in sensors + _others)
+
+
+def test_async_load_all_falls_back_without_dump(monkeypatch):
+    monkeypatch.setattr(Motherboard, "timeouts", learned_policy())
+    _board = distinct_board(dump=False)
+    _ser = EmulatorSerial(_board, Link(), timeout=1)
+    sensors = [Motherboard.Sensor(_id) for _id in SENSORS]
+
+    async def load(_aser):
+        return await Motherboard.load_all_async(sensors, NullDebug(), _aser)
+
+    assert run_async(load, _ser) == (False, False)
+    assert sensors[1]._polling_interval_sec == 602
@@ -0,0 +1,47 @@
+"""Tests of the LoRa air time of the energy model, run with python -m pytest"""
+import numpy as np
+import pytest
+
+import EnergyModel
+
+
+@pytest.mark.parametrize("spreading_factor", [EnergyModel.MIN_SF - 1, EnergyModel.MAX_SF + 1, 0, -3])
+def test_airtime_rejects_spreading_factor(spreading_factor):
+    with pytest.raises(ValueError):
+        EnergyModel.airtime(spreading_factor, 10)
+    with pytest.raises(ValueError):
+        EnergyModel.airtime_lora(spreading_factor, 10)
+
+
+def test_airtime_rejects_spreading_factor_array():
+    with pytest.raises(ValueError):
+        EnergyModel.airtime(np.array([7, 9, 13]), 10)
+
+
+@pytest.mark.parametrize("data_acc, status", [(False, False), (True, False), (True, True)])
+def test_airtime_table(data_acc, status):
+    sf = np.arange(EnergyModel.MIN_SF, EnergyModel.MAX_SF + 1)[:, np.newaxis]
+    payload = np.arange(EnergyModel.MAX_PAYLOAD + 1)
+
+    table = EnergyModel.airtime(sf, payload, data_acc=data_acc, status=status)
+
+    assert table.shape == (EnergyModel.MAX_SF - EnergyModel.MIN_SF + 1, EnergyModel.MAX_PAYLOAD + 1)
+    np.testing.assert_allclose(table, EnergyModel.airtime_lora(sf, payload, data_acc=data_acc, status=status))
+    assert not EnergyModel.airtime_table(data_acc, status).flags.writeable
+
+
+def test_airtime_values():
+    assert EnergyModel.airtime(7, 10) == pytest.approx(65.336)
+    # a higher spreading factor takes longer on air
+    times = EnergyModel.airtime(np.arange(EnergyModel.MIN_SF, EnergyModel.MAX_SF + 1), 30)
+    assert np.all(times[1:] > times[:-1])
+    # the TX error of accumulated data only applies to data messages
+    assert EnergyModel.airtime(9, 30, data_acc=True) != EnergyModel.airtime(9, 30)
+    assert EnergyModel.airtime(9, 30, data_acc=True, status=True) == EnergyModel.airtime(9, 30)
+
+
+def test_airtime_long_payload():
+    payload = EnergyModel.MAX_PAYLOAD + 45
+
+    assert EnergyModel.airtime(12, payload) == pytest.approx(EnergyModel.airtime_lora(12, payload))
+    assert EnergyModel.airtime(12, payload) > EnergyModel.airtime(12, EnergyModel.MAX_PAYLOAD)
@@ -0,0 +1,113 @@
+"""Tests of the measurement table parser and cache, run with python -m pytest"""
+import math
+
+import pytest
+
+import MeasurementTable
+from MeasurementTable import SchemaError, parse_csv
+
+WIDTH = MeasurementTable.NUMERIC_COLUMNS.stop + 1
+
+
+def make_csv(rows=MeasurementTable.MIN_ROWS, width=WIDTH, cell=None, preamble=None):
+    """Raw measurement csv with `rows` board configurations, cell(row, col) overrides the value of a cell"""
+    lines = preamble if preamble is not None else ["IWAST Power Data;;;"] + [""] * (
+        MeasurementTable.PREAMBLE_LINES - 1)
+    lines = lines + [";".join("Col" + str(col) for col in range(width))]
+    for row in range(rows):
+        cells = []
+        for col in range(width):
+            value = cell(row, col) if cell is not None else None
+            if value is None:
+                value = "Board " + str(row) if col in MeasurementTable.TEXT_COLUMNS else str(row + col / 100)
+            cells.append(value)
+        lines.append(";".join(cells))
+    return ("\r\n".join(lines) + "\r\n").encode('utf-8')
+
+
+def test_parse():
+    table = parse_csv(make_csv(cell=lambda row, col: "No data" if (row, col) == (1, 7) else None))
+
+    assert table.shape == (MeasurementTable.MIN_ROWS, WIDTH)
+    assert table.columns[5] == "Col5"
+    assert table.is_numeric("Col5")
+    assert not table.is_numeric(4)
+    assert table.iat[2, 4] == "Board 2"
+    assert table.iat[3, 6] == pytest.approx(3.06)
+    assert table.iat[1, 7] == MeasurementTable.NO_DATA
+    assert math.isnan(table.column(7)[1])
+
+
+def test_parse_quoted_separator():
+    table = parse_csv(make_csv(cell=lambda row, col: '"Power; no thresh"' if (row, col) == (2, 4) else None))
+
+    assert table.shape == (MeasurementTable.MIN_ROWS, WIDTH)
+    assert table.iat[2, 4] == "Power; no thresh"
+    assert table.iat[2, 5] == pytest.approx(2.05)
+
+
+def test_parse_latin1():
+    content = make_csv(cell=lambda row, col: "Température" if (row, col) == (0, 4) else None)
+    table = parse_csv(content.decode('utf-8').encode('latin-1'))
+
+    assert table.iat[0, 4] == "Température"
+
+
+def test_parse_short_rows_are_padded():
+    content = make_csv(cell=lambda row, col: None)
+    lines = content.decode('utf-8').split("\r\n")
+    lines[-2] = ";".join(lines[-2].split(";")[:10])
+
+    table = parse_csv("\r\n".join(lines).encode('utf-8'))
+
+    assert table.iat[MeasurementTable.MIN_ROWS - 1, 20] == MeasurementTable.NO_DATA
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"", "Empty"),
+    (make_csv(rows=MeasurementTable.MIN_ROWS - 1), "rows"),
+    (make_csv(width=MeasurementTable.NUMERIC_COLUMNS.stop - 1), "columns"),
+    (make_csv(cell=lambda row, col: "12,5" if (row, col) == (3, 9) else None), "Col9"),
+    (make_csv(cell=lambda row, col: "" if (row, col) == (5, 2) else None), "Col2"),
+])
+def test_parse_schema_errors(content, message):
+    with pytest.raises(SchemaError, match=message):
+        parse_csv(content)
+
+
+def reject_all(table):
+    raise SchemaError("rejected")
+
+
+def test_cache(tmp_path):
+    path = tmp_path / "Power_Data.csv"
+    path.write_bytes(make_csv())
+    cache = MeasurementTable.MeasurementCache(MeasurementTable.FileSource(str(path)), str(tmp_path / "cache"))
+
+    table = cache.load(revalidate=False)
+
+    path.write_bytes(b"gone")
+    assert cache.load(revalidate=False).iat[0, 4] == table.iat[0, 4]
+
+
+def test_cache_validate(tmp_path):
+    path = tmp_path / "Power_Data.csv"
+    path.write_bytes(make_csv())
+    source = MeasurementTable.FileSource(str(path))
+    cache_dir = str(tmp_path / "cache")
+
+    with pytest.raises(SchemaError):
+        MeasurementTable.MeasurementCache(source, cache_dir, validate=reject_all).load(revalidate=False)
+    MeasurementTable.MeasurementCache(source, cache_dir).load(revalidate=False)
+
+    # a cached table that fails validate is not used
+    with pytest.raises(SchemaError):
+        MeasurementTable.MeasurementCache(source, cache_dir, validate=reject_all).load(revalidate=False)
+
+
+def test_cache_unavailable(tmp_path):
+    cache = MeasurementTable.MeasurementCache(MeasurementTable.FileSource(str(tmp_path / "missing.csv")),
+                                              str(tmp_path / "cache"))
+
+    with pytest.raises(MeasurementTable.DataUnavailableError):
+        cache.load()